@@ -0,0 +1,67 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compares two result files saved by load_test.py.
+
+Example:
+
+    python compare_results.py baseline.json results.json --threshold 0.1
+
+Exits with status 1 if the throughput of any configuration decreased, or its p99 latency increased,
+by more than the threshold fraction.
+"""
+
+from __future__ import print_function, division
+
+import argparse
+import json
+import sys
+
+
+def load_results(path):
+    with open(path, 'r') as f:
+        return dict((r['name'], r) for r in json.load(f)['results'])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('baseline')
+    ap.add_argument('candidate')
+    ap.add_argument('--threshold', type=float, default=0.1,
+                    help='Relative change considered a regression.')
+    args = ap.parse_args()
+
+    baseline = load_results(args.baseline)
+    candidate = load_results(args.candidate)
+    regressions = []
+    print('%-28s %12s %12s %12s %12s' % ('config', 'req/s', 'change', 'p99 ms', 'change'))
+    for name in sorted(set(baseline) & set(candidate)):
+        a = baseline[name]
+        b = candidate[name]
+        throughput_change = b['requests_per_second'] / a['requests_per_second'] - 1
+        latency_change = b['latency_p99_ms'] / a['latency_p99_ms'] - 1
+        flag = ''
+        if throughput_change < -args.threshold or latency_change > args.threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print('%-28s %12.1f %+11.1f%% %12.2f %+11.1f%%%s' %
+              (name, b['requests_per_second'], throughput_change * 100, b['latency_p99_ms'],
+               latency_change * 100, flag))
+    for name in sorted(set(baseline) ^ set(candidate)):
+        print('%-28s only in %s' % (name, args.baseline if name in baseline else args.candidate))
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compares the equivalence map implementations on the operations used by viewer transactions.
+
+For each implementation, measures building a map by pairwise unions, copying it, serializing it
+with `to_json`, and a sequence of transactions that each copy the map and apply a few unions, as a
+proofreading session does.  Since `TrackableState` stores the raw state as JSON, each
+`viewer.txn()` also serializes the equivalences and rebuilds them, so `to_json` and `build` count
+towards the cost of every transaction as well.  The default type of
+`SegmentationLayer.equivalences` should only be changed if the total favors the alternative at
+realistic sizes.
+
+Example:
+
+    python equivalence_map_benchmark.py --members 1000000 --transactions 100
+"""
+
+from __future__ import print_function, division
+
+import argparse
+import copy
+import time
+
+import numpy as np
+
+from neuroglancer import equivalence_map
+
+MAP_TYPES = {
+    'EquivalenceMap': equivalence_map.EquivalenceMap,
+    'PersistentEquivalenceMap': equivalence_map.PersistentEquivalenceMap,
+}
+
+
+def timed(func):
+    start_time = time.time()
+    result = func()
+    return time.time() - start_time, result
+
+
+def run(map_type, pairs, transaction_pairs):
+    def build():
+        m = map_type()
+        for a, b in pairs:
+            m.union(a, b)
+        return m
+
+    build_seconds, m = timed(build)
+    copy_seconds, _ = timed(lambda: copy.deepcopy(m))
+    to_json_seconds, _ = timed(m.to_json)
+
+    def transactions():
+        current = m
+        for txn_pairs in transaction_pairs:
+            current = copy.deepcopy(current)
+            for a, b in txn_pairs:
+                current.union(a, b)
+
+    transactions_seconds, _ = timed(transactions)
+    return dict(build=build_seconds, copy=copy_seconds, to_json=to_json_seconds,
+                transactions=transactions_seconds)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--members', type=int, default=100000,
+                    help='Number of elements in the equivalence map.')
+    ap.add_argument('--transactions', type=int, default=100)
+    ap.add_argument('--unions-per-transaction', type=int, default=1)
+    args = ap.parse_args()
+
+    rs = np.random.RandomState(0)
+    ids = rs.permutation(args.members) + 1
+    pairs = [(int(a), int(b)) for a, b in zip(ids[0::2], ids[1::2])]
+    transaction_pairs = [[(int(a), int(b)) for a, b in rs.choice(ids, size=(
+        args.unions_per_transaction, 2))] for _ in range(args.transactions)]
+
+    print('%-26s %9s %9s %9s %14s' % ('type', 'build s', 'copy s', 'to_json s', 'transactions s'))
+    for name, map_type in sorted(MAP_TYPES.items()):
+        result = run(map_type, pairs, transaction_pairs)
+        print('%-26s %9.3f %9.3f %9.3f %14.3f' % (name, result['build'], result['copy'],
+                                                  result['to_json'], result['transactions']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Measures the time to import neuroglancer in a new process.
+
+Compares `import neuroglancer` followed by URL manipulation, which does not import the server, with
+additionally importing the server and viewer.
+
+Example:
+
+    python import_time_benchmark.py --runs 20
+"""
+
+from __future__ import print_function, division
+
+import argparse
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+SCRIPTS = [
+    ('state only', 'import neuroglancer; neuroglancer.parse_url(neuroglancer.to_url('
+     'neuroglancer.ViewerState()))'),
+    ('with server', 'import neuroglancer; neuroglancer.Viewer; import PIL.Image'),
+]
+
+
+def time_script(script):
+    start_time = time.time()
+    subprocess.check_call([sys.executable, '-c', script])
+    return time.time() - start_time
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--runs', type=int, default=10)
+    args = ap.parse_args()
+    baseline = np.median([time_script('pass') for _ in range(args.runs)])
+    print('Interpreter startup: %.1f ms' % (baseline * 1000))
+    for name, script in SCRIPTS:
+        times = [time_script(script) for _ in range(args.runs)]
+        print('%-12s median %.1f ms (%.1f ms excluding startup)' %
+              (name, np.median(times) * 1000, (np.median(times) - baseline) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Load test of the built-in server using synthetic volumes and replayed chunk-request traces.
+
+The server runs in a separate process, so that the reported CPU time and peak RSS are those of the
+server alone, where the CPU time includes any chunk encoding processes started by the server.  For
+each combination of volume type, downsampling mode and encoding, a number of concurrent clients
+each replay a trace that pans across the XY plane at every scale, from the coarsest to the finest,
+as the slice views do when zooming in.
+
+Example:
+
+    python load_test.py --size 512 --clients 8 --output results.json
+    python compare_results.py baseline.json results.json
+"""
+
+from __future__ import print_function, division
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+
+import numpy as np
+import requests
+
+import neuroglancer
+
+ENCODINGS = {
+    'image': ['raw', 'npz', 'jpeg'],
+    'segmentation': ['raw', 'npz'],
+}
+
+DOWNSAMPLING_MODES = ['3d', '2d']
+
+
+def make_volume_data(volume_type, size, depth):
+    rs = np.random.RandomState(0)
+    shape = (depth, size, size)
+    if volume_type == 'image':
+        # Smooth gradients plus noise, so that the encodings compress realistically.
+        z, y, x = np.ogrid[:shape[0], :shape[1], :shape[2]]
+        data = (np.sin(x / 17.0) + np.cos(y / 23.0) + np.sin(z / 7.0)) * 40 + 128
+        data = data + rs.randint(-20, 20, size=shape)
+        return np.clip(data, 0, 255).astype(np.uint8)
+    # Blocky labels, similar to a segmentation.
+    block = 16
+    labels = rs.randint(1, 1 << 20, size=tuple(-(-s // block) for s in shape)).astype(np.uint32)
+    data = labels.repeat(block, 0).repeat(block, 1).repeat(block, 2)
+    return np.ascontiguousarray(data[:shape[0], :shape[1], :shape[2]])
+
+
+def get_live_process_cpu_seconds(pid):
+    """Returns the CPU time of a running process, or 0 if it is not available (Linux only)."""
+    try:
+        with open('/proc/%d/stat' % pid) as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+    except (IOError, OSError, IndexError):
+        return 0.0
+    # Fields 14 and 15, utime and stime, in clock ticks.
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def get_rusage():
+    """Returns the CPU time and peak RSS of the server process.
+
+    The CPU time includes that of the child processes (e.g. the chunk encoding processes started
+    with `--processes`): `RUSAGE_CHILDREN` covers the children that have exited, and the CPU time
+    of the running children is read from `/proc`.
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    max_rss = usage.ru_maxrss
+    if sys.platform != 'darwin':
+        # Reported in kilobytes on Linux, and in bytes on macOS.
+        max_rss *= 1024
+    cpu_seconds = (usage.ru_utime + usage.ru_stime + children_usage.ru_utime +
+                   children_usage.ru_stime)
+    cpu_seconds += sum(
+        get_live_process_cpu_seconds(p.pid) for p in multiprocessing.active_children())
+    return dict(cpu_seconds=cpu_seconds, peak_rss_bytes=max_rss)
+
+
+def run_server(conn, args):
+    if args.processes is not None:
+        neuroglancer.set_chunk_encoding_processes(args.processes)
+    if args.prefetch:
+        neuroglancer.set_chunk_prefetch()
+    viewer = neuroglancer.Viewer()
+    configs = []
+    with viewer.txn() as s:
+        for volume_type in ENCODINGS:
+            data = make_volume_data(volume_type, args.size, args.depth)
+            for downsampling in DOWNSAMPLING_MODES:
+                vol = neuroglancer.LocalVolume(data, volume_type=volume_type,
+                                               downsampling=downsampling)
+                name = '%s-%s' % (volume_type, downsampling)
+                layer_type = (neuroglancer.ImageLayer
+                              if volume_type == 'image' else neuroglancer.SegmentationLayer)
+                s.layers[name] = layer_type(source=vol)
+                key = viewer.volume_manager.register_volume(vol)[len('python://'):]
+                scales = [(info.key, info.downsample_factor, [int(x) for x in info.shape])
+                          for info in vol.downsampling_scale_info.values()]
+                for encoding in ENCODINGS[volume_type]:
+                    configs.append(dict(name='%s-%s' % (name, encoding), key=key,
+                                        encoding=encoding, downsampling=downsampling,
+                                        scales=scales))
+    conn.send(dict(server_url=neuroglancer.server.get_server_url(), configs=configs))
+    while True:
+        command = conn.recv()
+        if command == 'rusage':
+            conn.send(get_rusage())
+        elif command == 'stop':
+            break
+    neuroglancer.stop()
+
+
+def make_pan_trace(scales, downsampling, chunk_size, viewport_size, pan_steps, offset):
+    """Returns a list of `(scale_key, start, end)` requests.
+
+    At each scale, from the coarsest to the finest, the chunks of a viewport centered in the volume
+    are requested, followed by the newly exposed chunks as the viewport pans along x.
+
+    With '2d' downsampling, the XY scales (those not downsampled along z) are used, and the chunks
+    are single z-slices.  With '3d' downsampling, every scale is used, and the chunks extend
+    `chunk_size` voxels along z, in the downsampled coordinates of the scale.
+    """
+    trace = []
+    if downsampling == '2d':
+        trace_scales = [s for s in scales if s[1][2] == 1]
+        chunk_depth = 1
+    else:
+        trace_scales = list(scales)
+        chunk_depth = chunk_size
+    trace_scales.sort(key=lambda s: -s[1][0] * s[1][1] * s[1][2])
+    for scale_key, factor, shape in trace_scales:
+        z_start = shape[2] // 2 // chunk_depth * chunk_depth
+        z_end = min(z_start + chunk_depth, shape[2])
+        num_chunks = [max(1, viewport_size // factor[i] // chunk_size) for i in range(2)]
+        chunk_origin = [
+            max(0, (shape[i] // 2 // chunk_size) - num_chunks[i] // 2 + offset[i]) for i in range(2)
+        ]
+        seen = set()
+        for step in range(pan_steps + 1):
+            for cx in range(chunk_origin[0] + step, chunk_origin[0] + step + num_chunks[0]):
+                for cy in range(chunk_origin[1], chunk_origin[1] + num_chunks[1]):
+                    if (cx, cy) in seen:
+                        continue
+                    seen.add((cx, cy))
+                    start = (cx * chunk_size, cy * chunk_size, z_start)
+                    if start[0] >= shape[0] or start[1] >= shape[1]:
+                        continue
+                    end = (min(start[0] + chunk_size, shape[0]),
+                           min(start[1] + chunk_size, shape[1]), z_end)
+                    trace.append((scale_key, start, end))
+    return trace
+
+
+def run_client(session, server_url, config, trace, latencies, counts):
+    for scale_key, start, end in trace:
+        url = '%s/neuroglancer/%s/%s/%s/%d,%d/%d,%d/%d,%d' % (
+            server_url, config['encoding'], config['key'], scale_key, start[0], end[0], start[1],
+            end[1], start[2], end[2])
+        start_time = time.time()
+        r = session.get(url)
+        latencies.append(time.time() - start_time)
+        if r.status_code == 200:
+            counts['bytes'] += len(r.content)
+        else:
+            counts['errors'] += 1
+
+
+def run_config(server_url, config, args):
+    traces = [
+        make_pan_trace(config['scales'], config['downsampling'], args.chunk_size,
+                       args.viewport_size, args.pan_steps, offset=(i % 3 - 1, i // 3 % 3 - 1))
+        for i in range(args.clients)
+    ]
+    latencies = [[] for _ in range(args.clients)]
+    counts = [dict(bytes=0, errors=0) for _ in range(args.clients)]
+    sessions = [requests.Session() for _ in range(args.clients)]
+    threads = [
+        threading.Thread(target=run_client,
+                         args=(sessions[i], server_url, config, traces[i], latencies[i], counts[i]))
+        for i in range(args.clients)
+    ]
+    start_time = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - start_time
+    all_latencies = np.array([x for client_latencies in latencies for x in client_latencies])
+    num_requests = len(all_latencies)
+    total_bytes = sum(c['bytes'] for c in counts)
+    return dict(
+        name=config['name'],
+        requests=num_requests,
+        errors=sum(c['errors'] for c in counts),
+        seconds=elapsed,
+        requests_per_second=num_requests / elapsed,
+        megabytes_per_second=total_bytes / elapsed / 1e6,
+        latency_p50_ms=float(np.percentile(all_latencies, 50) * 1000),
+        latency_p99_ms=float(np.percentile(all_latencies, 99) * 1000),
+    )
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--size', type=int, default=512, help='XY size of the synthetic volumes.')
+    ap.add_argument('--depth', type=int, default=64, help='Z size of the synthetic volumes.')
+    ap.add_argument('--clients', type=int, default=4, help='Number of concurrent clients.')
+    ap.add_argument('--chunk-size', type=int, default=64,
+                    help='Size of the requested chunks (XY only, for 2d downsampling).')
+    ap.add_argument('--viewport-size', type=int, default=512,
+                    help='Viewport size in full-resolution voxels.')
+    ap.add_argument('--pan-steps', type=int, default=4)
+    ap.add_argument('--processes', type=int, default=None,
+                    help='Number of chunk encoding processes (default: thread pool).')
+    ap.add_argument('--prefetch', action='store_true', help='Enable chunk prefetching.')
+    ap.add_argument('--filter', default=None,
+                    help='Only run configurations whose name contains this string.')
+    ap.add_argument('--output', default=None, help='Path of JSON file to save the results.')
+    args = ap.parse_args()
+
+    parent_conn, child_conn = multiprocessing.Pipe()
+    server_process = multiprocessing.Process(target=run_server, args=(child_conn, args))
+    server_process.start()
+    try:
+        server_info = parent_conn.recv()
+        server_url = server_info['server_url']
+        results = []
+        print('%-28s %9s %9s %9s %9s %9s %9s' % ('config', 'requests', 'req/s', 'MB/s', 'p50 ms',
+                                                   'p99 ms', 'cpu s'))
+        for config in server_info['configs']:
+            if args.filter is not None and args.filter not in config['name']:
+                continue
+            parent_conn.send('rusage')
+            usage_before = parent_conn.recv()
+            result = run_config(server_url, config, args)
+            parent_conn.send('rusage')
+            usage_after = parent_conn.recv()
+            result['server_cpu_seconds'] = (usage_after['cpu_seconds'] -
+                                            usage_before['cpu_seconds'])
+            result['server_peak_rss_bytes'] = usage_after['peak_rss_bytes']
+            results.append(result)
+            print('%-28s %9d %9.1f %9.2f %9.2f %9.2f %9.2f' %
+                  (result['name'], result['requests'], result['requests_per_second'],
+                   result['megabytes_per_second'], result['latency_p50_ms'],
+                   result['latency_p99_ms'], result['server_cpu_seconds']))
+            if result['errors']:
+                print('  %d requests failed' % result['errors'])
+        parent_conn.send('rusage')
+        final_usage = parent_conn.recv()
+        print('Server peak RSS: %.1f MB' % (final_usage['peak_rss_bytes'] / 1e6))
+    finally:
+        parent_conn.send('stop')
+        server_process.join()
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(
+                dict(args=vars(args), python=platform.python_version(),
+                     platform=platform.platform(), cpu_count=multiprocessing.cpu_count(),
+                     numpy=np.__version__, time=time.time(), results=results,
+                     server_peak_rss_bytes=final_usage['peak_rss_bytes']),
+                f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Measures LocalVolume chunk encoding throughput with threads and with worker processes.
+
+Example:
+
+    python process_pool_benchmark.py --size 256 --chunk-size 32 --scale 2,2,2 --processes 1,2,4,8
+"""
+
+from __future__ import print_function, division
+
+import argparse
+import concurrent.futures
+import multiprocessing
+import time
+
+import numpy as np
+
+import neuroglancer
+from neuroglancer import process_pool
+
+
+def get_chunk_requests(vol, scale_key, chunk_size):
+    shape = vol.get_scale_info(scale_key).shape
+    requests = []
+    for x in range(0, shape[0], chunk_size):
+        for y in range(0, shape[1], chunk_size):
+            for z in range(0, shape[2], chunk_size):
+                start = (x, y, z)
+                end = tuple(min(s + chunk_size, n) for s, n in zip(start, shape))
+                requests.append((start, end))
+    return requests
+
+
+def run(submit, requests, data_format, scale_key):
+    start_time = time.time()
+    futures = [submit(data_format, start, end, scale_key) for start, end in requests]
+    total_bytes = 0
+    for f in futures:
+        total_bytes += len(f.result()[0])
+    elapsed = time.time() - start_time
+    return len(requests) / elapsed, total_bytes / elapsed / 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--size', type=int, default=256, help='Edge length of the cubic volume.')
+    ap.add_argument('--chunk-size', type=int, default=32)
+    ap.add_argument('--scale', default='2,2,2', help='Scale key of the requested chunks.')
+    ap.add_argument('--format', default='npz', choices=['npz', 'raw', 'jpeg'])
+    ap.add_argument('--processes', default=None,
+                    help='Comma-separated list of worker process counts to test.')
+    ap.add_argument('--repeat', type=int, default=3)
+    args = ap.parse_args()
+
+    data = np.random.RandomState(0).randint(0, 255, size=(args.size, ) * 3).astype(np.uint8)
+    vol = neuroglancer.LocalVolume(data, volume_type='image')
+    requests = get_chunk_requests(vol, args.scale, args.chunk_size)
+
+    if args.processes is None:
+        cpu_count = multiprocessing.cpu_count()
+        process_counts = [n for n in (1, 2, 4, 8, 16, 32) if n <= cpu_count]
+    else:
+        process_counts = [int(x) for x in args.processes.split(',')]
+
+    print('%d chunks of %d^3 at scale %s, format %s, %d cores' %
+          (len(requests), args.chunk_size, args.scale, args.format, multiprocessing.cpu_count()))
+
+    def report(name, submit):
+        # The first run warms up worker processes and shared memory.
+        run(submit, requests[:1], args.format, args.scale)
+        results = [run(submit, requests, args.format, args.scale) for _ in range(args.repeat)]
+        requests_per_second, mb_per_second = max(results)
+        print('%-12s %10.1f requests/s %10.1f MB/s' % (name, requests_per_second, mb_per_second))
+
+    thread_executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=multiprocessing.cpu_count())
+    report('threads', lambda *a: thread_executor.submit(vol.get_encoded_subvolume, *a))
+
+    for num_processes in process_counts:
+        encoder = process_pool.ProcessPoolChunkEncoder(num_processes=num_processes)
+        try:
+            report('%d processes' % num_processes, lambda *a: encoder.submit(vol, *a))
+        finally:
+            encoder.shutdown()
+    thread_executor.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -42,7 +42,7 @@ class Annotator(object):
             s.input_event_bindings.viewer['control+keys'] = 'anno-save'
             s.input_event_bindings.viewer['control+keya'] = 'anno-show-all'
 
-        viewer.shared_state.add_changed_callback(self.on_state_changed)
+        viewer.shared_state.add_changed_callback(self.on_state_changed, batched=True)
         self.cur_message = None
         if not self.load():
             self.set_state_index(None)
@@ -12,13 +12,62 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+"""Python interface to Neuroglancer.
+
+The server, the viewers and the static content sources are imported on first use, so that scripts
+that only manipulate viewer states and URLs do not pay the cost of importing tornado and sockjs.
+"""
+
 from __future__ import absolute_import
-from .server import set_static_content_source, set_server_bind_address, is_server_running, stop
-from .static import dist_dev_static_content_source
-from .viewer import Viewer, UnsynchronizedViewer
+
+import importlib
+import sys
+
 from .local_volume import LocalVolume
 from .viewer_state import *
 from .viewer_config_state import MapEntry
-from .equivalence_map import EquivalenceMap
+from .equivalence_map import EquivalenceMap, ArrayEquivalenceMap, PersistentEquivalenceMap
+from .point_list import LocalPointList, PointList
+from .segment_set import SegmentSet
 from .url_state import to_url, parse_url
-from . import server
+
+# Maps the name of each lazily-imported attribute to the name of the submodule that defines it.
+_LAZY_ATTRIBUTES = {
+    'set_static_content_source': 'server',
+    'set_server_bind_address': 'server',
+    'set_chunk_encoding_processes': 'server',
+    'set_chunk_prefetch': 'server',
+    'is_server_running': 'server',
+    'stop': 'server',
+    'server': 'server',
+    'dist_dev_static_content_source': 'static',
+    'Viewer': 'viewer',
+    'UnsynchronizedViewer': 'viewer',
+}
+
+
+def __getattr__(name):
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError('module %r has no attribute %r' % (__name__, name))
+    module = importlib.import_module('.' + module_name, __name__)
+    value = module if name == module_name else getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES))
+
+
+# Since `__getattr__` is not consulted by `from neuroglancer import *` unless the names are listed
+# explicitly, the lazily-imported attributes are included here, along with the public names
+# defined above.
+__all__ = sorted((set(name for name in globals() if not name.startswith('_')) -
+                  set(['absolute_import', 'importlib', 'sys'])) | set(_LAZY_ATTRIBUTES))
+
+if sys.version_info < (3, 7):
+    # Module `__getattr__` (PEP 562) is not supported.
+    for _name in _LAZY_ATTRIBUTES:
+        __getattr__(_name)
+    del _name
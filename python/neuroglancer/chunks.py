@@ -16,10 +16,11 @@ import io
 import zlib
 
 import numpy as np
-from PIL import Image
 
 
 def encode_jpeg(subvol):
+    # PIL is imported on first use, since it is slow to import and is not needed for other encodings.
+    from PIL import Image
     shape = subvol.shape
     reshaped = subvol.reshape(shape[0] * shape[1], shape[2])
     img = Image.fromarray(reshaped)
@@ -38,4 +39,4 @@ def encode_npz(subvol):
 
 
 def encode_raw(subvol):
-    return subvol.tostring('C')
+    return subvol.tobytes('C')
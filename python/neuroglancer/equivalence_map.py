@@ -15,9 +15,13 @@
 from __future__ import absolute_import
 
 import copy
+import itertools
 
+import numpy as np
 import six
 
+from .persistent_map import PersistentMap
+
 
 class EquivalenceMap(object):
     """Union-find data structure"""
@@ -143,17 +147,50 @@ class EquivalenceMap(object):
             if cur_x == x:
                 break
 
+    def _classes(self):
+        """Returns the equivalence classes as `(min_values, sizes, members)` lists.
+
+        Each representative is visited once, and its members are enumerated by walking its
+        circular list.
+        """
+        prev_next = self._prev_next
+        min_values = self._min_values
+        weights = self._weights
+        class_min_values = []
+        sizes = []
+        members = []
+        append_member = members.append
+        for x, parent in six.iteritems(self._parents):
+            if parent != x:
+                continue
+            class_min_values.append(min_values[x])
+            sizes.append(weights[x])
+            append_member(x)
+            cur_x = prev_next[x][1]
+            while cur_x != x:
+                append_member(cur_x)
+                cur_x = prev_next[cur_x][1]
+        return class_min_values, sizes, members
+
     def sets(self):
         """Returns the equivalence classes as a set of sets."""
-        sets = {}
-        for x in self._parents:
-            sets.setdefault(self[x], set()).add(x)
-        return frozenset(frozenset(v) for v in six.viewvalues(sets))
+        _, sizes, members = self._classes()
+        return frozenset(frozenset(x) for x in _split_classes(sizes, members))
+
+    def to_packed(self):
+        """Returns the equivalence classes in packed form.
+
+        Only supported if all elements are uint64 values.
+
+        @returns: A tuple `(offsets, members)`, where `members` is a uint64 array containing the
+            sorted members of each class, ordered by the minimum element of each class, and
+            `offsets` is an int64 array such that class `i` is `members[offsets[i]:offsets[i+1]]`.
+        """
+        return _pack_classes(*self._classes())
 
     def to_json(self):
         """Returns the equivalence classes a sorted list of sorted lists."""
-        sets = self.sets()
-        return sorted(sorted(x) for x in sets)
+        return _classes_to_json(*self._classes())
 
     def __copy__(self):
         """Does not preserve _readonly attribute."""
@@ -188,3 +225,521 @@ class EquivalenceMap(object):
         members = list(self.members(x))
         self.delete_set(x)
         self.union(*(v for v in members if v != x))
+
+
+def _is_uint64_value(x):
+    return isinstance(x, six.integer_types + (np.integer, )) and 0 <= x <= 0xffffffffffffffff
+
+
+def _to_uint64_array(values):
+    """Converts `values` to a uint64 array.
+
+    Raises `ValueError` if not all elements are integers in the uint64 range, since a plain
+    conversion to uint64 would silently wrap negative values and truncate floats.  The dtype and
+    range are checked once on the converted array; only lists containing integers beyond the int64
+    range, which NumPy converts to float64 or object arrays, are checked element by element.
+    """
+    array = np.asarray(values)
+    kind = array.dtype.kind
+    if kind == 'u' or (kind == 'i' and (array.size == 0 or array.min() >= 0)):
+        return array.astype(np.uint64, copy=False)
+    if kind in 'fO':
+        elements = np.array(values, dtype=object).ravel().tolist()
+        if all(_is_uint64_value(x) for x in elements):
+            return np.array(elements, dtype=np.uint64).reshape(array.shape)
+    raise ValueError('Not all elements are uint64 values')
+
+
+def _pack_classes(min_values, sizes, members):
+    """Converts flat class lists to the `(offsets, members)` form returned by `to_packed`.
+
+    @param min_values: Minimum element of each class.
+    @param sizes: Number of members of each class.
+    @param members: Concatenated members of all classes, in the same order as `sizes`.
+
+    Raises `ValueError` if not all elements are integers in the uint64 range.
+    """
+    members = _to_uint64_array(members)
+    min_values = np.array(min_values, dtype=np.uint64)
+    sizes = np.array(sizes, dtype=np.int64)
+    order = np.lexsort((members, np.repeat(min_values, sizes)))
+    offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+    np.cumsum(sizes[np.argsort(min_values)], out=offsets[1:])
+    return offsets, members[order]
+
+
+def _split_classes(sizes, members):
+    result = []
+    offset = 0
+    for size in sizes:
+        result.append(members[offset:offset + size])
+        offset += size
+    return result
+
+
+def _classes_to_json(min_values, sizes, members):
+    try:
+        offsets, members = _pack_classes(min_values, sizes, members)
+    except ValueError:
+        # Not all elements are uint64 values.
+        return sorted(sorted(x) for x in _split_classes(sizes, members))
+    members = members.tolist()
+    offsets = offsets.tolist()
+    return [members[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+
+def _compress_labels(labels):
+    """Repeatedly replaces `labels[i]` by `labels[labels[i]]` until every label is a root."""
+    while True:
+        new_labels = labels[labels]
+        if np.array_equal(new_labels, labels):
+            return labels
+        labels = new_labels
+
+
+def _rebuild_rings(labels):
+    """Returns a `next` array linking the members of each class into a circular list."""
+    order = np.argsort(labels, kind='mergesort')
+    sorted_labels = labels[order]
+    next_indices = np.empty_like(order)
+    if len(order) == 0:
+        return next_indices
+    starts = np.flatnonzero(np.concatenate([[True], sorted_labels[1:] != sorted_labels[:-1]]))
+    ends = np.concatenate([starts[1:] - 1, [len(order) - 1]])
+    next_indices[order[:-1]] = order[1:]
+    next_indices[order[ends]] = order[starts]
+    return next_indices
+
+
+class ArrayEquivalenceMap(object):
+    """Union-find data structure over uint64 values, backed by NumPy arrays.
+
+    Elements are remapped to dense indices into a sorted array of the known values.  The
+    representative of each class is always the element with the smallest index, which is also the
+    minimum value in the class.  In addition to the `EquivalenceMap` interface, supports bulk
+    `union_edges` and vectorized `__getitem__` over arrays of values.
+    """
+
+    supports_readonly = True
+
+    def __init__(self, existing=None, _readonly=False):
+        """Create a new union-find structure, optionally initialized from `existing`."""
+        self._readonly = False
+        self.clear()
+        if isinstance(existing, ArrayEquivalenceMap):
+            self._ids = existing._ids.copy()
+            self._parents = existing._parents.copy()
+            self._next = existing._next.copy()
+        elif existing is not None:
+            if isinstance(existing, EquivalenceMap):
+                existing = existing.to_json()
+            if isinstance(existing, dict):
+                existing = six.viewitems(existing)
+            groups = [list(group) for group in existing]
+            flat = _to_uint64_array(list(itertools.chain.from_iterable(groups)))
+            if len(flat) > 0:
+                group_ids = np.repeat(np.arange(len(groups)), [len(g) for g in groups])
+                same = group_ids[1:] == group_ids[:-1]
+                self._get_indices(flat)
+                self.union_edges(flat[:-1][same], flat[1:][same])
+        self._readonly = _readonly
+
+    def _lookup(self, obj):
+        """Returns the index of `obj`, or -1 if it is not known."""
+        ids = self._ids
+        if not _is_uint64_value(obj):
+            return -1
+        value = np.uint64(obj)
+        i = int(np.searchsorted(ids, value))
+        if i < len(ids) and ids[i] == value:
+            return i
+        return -1
+
+    def _get_indices(self, values):
+        """Returns the indices of `values`, adding any values that are not yet known."""
+        values = _to_uint64_array(values)
+        order = np.argsort(values, axis=None)
+        sorted_values = values.ravel()[order]
+        is_first = np.concatenate([[True], sorted_values[1:] != sorted_values[:-1]])
+        unique_values = sorted_values[is_first]
+        inverse = np.empty(len(order), dtype=np.intp)
+        inverse[order] = np.cumsum(is_first) - 1
+        old_ids = self._ids
+        if len(old_ids) == 0:
+            new_ids = unique_values
+        else:
+            positions = np.minimum(np.searchsorted(old_ids, unique_values), len(old_ids) - 1)
+            new_ids = unique_values[old_ids[positions] != unique_values]
+        if len(new_ids) > 0:
+            # Inserts the new ids in place, rather than re-sorting, so that adding a few ids costs
+            # a linear-time copy.  Both `new_ids` and `old_ids` are sorted.
+            insert_positions = np.searchsorted(old_ids, new_ids)
+            shift = np.cumsum(np.bincount(insert_positions, minlength=len(old_ids) + 1))
+            old_positions = np.arange(len(old_ids)) + shift[:len(old_ids)]
+            new_positions = insert_positions + np.arange(len(new_ids))
+            self._ids = np.insert(old_ids, insert_positions, new_ids)
+            self._parents = np.insert(old_positions[self._parents], insert_positions, new_positions)
+            self._next = np.insert(old_positions[self._next], insert_positions, new_positions)
+        return np.searchsorted(self._ids, unique_values)[inverse].reshape(values.shape)
+
+    def _find(self, i):
+        """Finds and returns the index of the root of the set containing index `i`."""
+        parents = self._parents
+        path = [i]
+        root = parents[i]
+        while root != path[-1]:
+            path.append(root)
+            root = parents[root]
+
+        # compress the path and return
+        for ancestor in path:
+            parents[ancestor] = root
+        return int(root)
+
+    def _find_all(self):
+        """Returns the array of root indices, fully compressing all paths."""
+        parents = self._parents = _compress_labels(self._parents)
+        return parents
+
+    def __getitem__(self, obj):
+        """Returns the minimum element in the set containing `obj`.
+
+        If `obj` is an array or list, returns a uint64 array of the minimum elements.
+        """
+        if isinstance(obj, (np.ndarray, list)):
+            values = _to_uint64_array(obj)
+            ids = self._ids
+            result = values.copy()
+            if len(ids) == 0:
+                return result
+            indices = np.minimum(np.searchsorted(ids, values), len(ids) - 1)
+            found = ids[indices] == values
+            result[found] = ids[self._find_all()[indices[found]]]
+            return result
+        i = self._lookup(obj)
+        if i == -1:
+            return obj
+        return int(self._ids[self._find(i)])
+
+    def __iter__(self):
+        """Iterates over all elements known to this equivalence map."""
+        return iter(self._ids.tolist())
+
+    def __len__(self):
+        return len(self._ids)
+
+    def items(self):
+        return list(zip(self._ids.tolist(), self._ids[self._parents].tolist()))
+
+    def keys(self):
+        return self._ids.tolist()
+
+    def clear(self):
+        self._ids = np.zeros(0, dtype=np.uint64)
+        self._parents = np.zeros(0, dtype=np.intp)
+        self._next = np.zeros(0, dtype=np.intp)
+
+    def union(self, *args):
+        """Unions the equivalence classes containing the elements in `*args`."""
+        if self._readonly:
+            raise AttributeError
+
+        if len(args) == 0:
+            return None
+        if len(args) == 1:
+            return self[args[0]]
+        indices = self._get_indices(_to_uint64_array(args)).tolist()
+        for a, b in zip(indices[:-1], indices[1:]):
+            result = self._union_pair(a, b)
+        return int(self._ids[result])
+
+    def _union_pair(self, a, b):
+        a = self._find(a)
+        b = self._find(b)
+        if a == b:
+            return a
+        if b < a:
+            a, b = (b, a)
+        next_indices = self._next
+        self._parents[b] = a
+        # Swapping the successors of `a` and `b` splices the two circular lists together.
+        next_indices[a], next_indices[b] = next_indices[b], next_indices[a]
+        return a
+
+    def union_edges(self, a, b):
+        """Unions the classes of `a[i]` and `b[i]` for all `i`.
+
+        @param a: Array of uint64 values.
+        @param b: Array of uint64 values, of the same shape as `a`.
+        """
+        if self._readonly:
+            raise AttributeError
+        a = _to_uint64_array(a).ravel()
+        b = _to_uint64_array(b).ravel()
+        if a.shape != b.shape:
+            raise ValueError('Expected arrays of the same shape, but received: %r and %r' %
+                             (a.shape, b.shape))
+        indices = self._get_indices(np.concatenate([a, b]))
+        u = indices[:len(a)]
+        v = indices[len(a):]
+        labels = self._find_all()
+        while True:
+            label_u = labels[u]
+            label_v = labels[v]
+            mask = label_u != label_v
+            if not np.any(mask):
+                break
+            u = u[mask]
+            v = v[mask]
+            label_u = label_u[mask]
+            label_v = label_v[mask]
+            # Hook the larger root onto the smaller root, then fully compress.
+            np.minimum.at(labels, np.maximum(label_u, label_v), np.minimum(label_u, label_v))
+            labels = _compress_labels(labels)
+        self._parents = labels
+        self._next = _rebuild_rings(labels)
+
+    def members(self, x):
+        """Yields the members of the equivalence class containing `x`."""
+        i = self._lookup(x)
+        if i == -1:
+            yield x
+            return
+        ids = self._ids
+        next_indices = self._next
+        cur = i
+        while True:
+            yield int(ids[cur])
+            cur = next_indices[cur]
+            if cur == i:
+                break
+
+    def to_packed(self):
+        """Returns the equivalence classes in packed form.
+
+        @returns: A tuple `(offsets, members)`, where `members` is a uint64 array containing the
+            sorted members of each class, ordered by the minimum element of each class, and
+            `offsets` is an int64 array such that class `i` is `members[offsets[i]:offsets[i+1]]`.
+        """
+        labels = self._find_all()
+        order = np.argsort(labels, kind='mergesort')
+        sorted_labels = labels[order]
+        starts = np.flatnonzero(np.concatenate([[True], sorted_labels[1:] != sorted_labels[:-1]]))
+        offsets = np.concatenate([starts, [len(order)]]).astype(np.int64)
+        return offsets, self._ids[order]
+
+    def sets(self):
+        """Returns the equivalence classes as a set of sets."""
+        offsets, members = self.to_packed()
+        members = members.tolist()
+        return frozenset(
+            frozenset(members[offsets[i]:offsets[i + 1]]) for i in range(len(offsets) - 1))
+
+    def to_json(self):
+        """Returns the equivalence classes a sorted list of sorted lists."""
+        offsets, members = self.to_packed()
+        members = members.tolist()
+        offsets = offsets.tolist()
+        return [members[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+    def __copy__(self):
+        """Does not preserve _readonly attribute."""
+        return ArrayEquivalenceMap(self)
+
+    def __deepcopy__(self, memo):
+        """Does not preserve _readonly attribute."""
+        return ArrayEquivalenceMap(self)
+
+    def copy(self):
+        """Returns a copy of the equivalence map."""
+        return ArrayEquivalenceMap(self)
+
+    def delete_set(self, x):
+        """Removes the equivalence class containing `x`."""
+        i = self._lookup(x)
+        if i == -1:
+            return
+        root = self._find(i)
+        labels = self._find_all()
+        keep = labels != root
+        remap = np.cumsum(keep) - 1
+        self._ids = self._ids[keep]
+        self._parents = remap[labels[keep]]
+        self._next = remap[self._next[keep]]
+
+    def isolate_element(self, x):
+        """Isolates `x` from its equivalence class."""
+        members = list(self.members(x))
+        self.delete_set(x)
+        self.union(*(v for v in members if v != x))
+
+
+class PersistentEquivalenceMap(object):
+    """Union-find data structure with O(1) copies.
+
+    The state is stored in a `PersistentMap` from each element to a `(parent, weight, next,
+    min_value)` record, where `next` links the members of each class into a circular list, and
+    `weight` and `min_value` are only meaningful for representatives.  Copies share all structure;
+    each union allocates O(log n) new nodes.  Paths are not compressed, since that would require
+    modifying the shared structure, but union by weight keeps them O(log n) long.
+    """
+
+    supports_readonly = True
+
+    def __init__(self, existing=None, _readonly=False):
+        """Create a new union-find structure, optionally initialized from `existing`."""
+        self._readonly = False
+        if isinstance(existing, PersistentEquivalenceMap):
+            self._records = existing._records
+        else:
+            self._records = PersistentMap()
+            if existing is not None:
+                if isinstance(existing, (EquivalenceMap, ArrayEquivalenceMap)):
+                    existing = existing.to_json()
+                if isinstance(existing, dict):
+                    existing = six.viewitems(existing)
+                for group in existing:
+                    self.union(*group)
+        self._readonly = _readonly
+
+    def _get_representative(self, obj):
+        """Returns the `(root, record)` of the set containing `obj`, or `(obj, None)`."""
+        records = self._records
+        record = records.get(obj)
+        if record is None:
+            return obj, None
+        while record[0] != obj:
+            obj = record[0]
+            record = records[obj]
+        return obj, record
+
+    def __getitem__(self, obj):
+        """Returns the minimum element in the set containing `obj`."""
+        root, record = self._get_representative(obj)
+        if record is None:
+            return obj
+        return record[3]
+
+    def __iter__(self):
+        """Iterates over all elements known to this equivalence map."""
+        return iter(self._records)
+
+    def __len__(self):
+        return len(self._records)
+
+    def items(self):
+        return [(k, record[0]) for k, record in self._records.items()]
+
+    def keys(self):
+        return list(self._records)
+
+    def clear(self):
+        self._records = PersistentMap()
+
+    def union(self, *args):
+        """Unions the equivalence classes containing the elements in `*args`."""
+        if self._readonly:
+            raise AttributeError
+
+        if len(args) == 0:
+            return None
+        if len(args) == 1:
+            return self[args[0]]
+        for a, b in zip(args[:-1], args[1:]):
+            result = self._union_pair(a, b)
+        return result
+
+    def _union_pair(self, a, b):
+        records = self._records
+        a, a_record = self._get_representative(a)
+        if a_record is None:
+            a_record = (a, 1, a, a)
+        b, b_record = self._get_representative(b)
+        if b_record is None:
+            b_record = (b, 1, b, b)
+        if a == b:
+            if a not in records:
+                self._records = records.set(a, a_record)
+            return a_record[3]
+        if a_record[1] < b_record[1]:
+            a, b = (b, a)
+            a_record, b_record = (b_record, a_record)
+        min_value = min(a_record[3], b_record[3])
+        # Swapping the successors of `a` and `b` splices the two circular lists together.
+        records = records.set(a, (a, a_record[1] + b_record[1], b_record[2], min_value))
+        records = records.set(b, (a, b_record[1], a_record[2], b_record[3]))
+        self._records = records
+        return min_value
+
+    def members(self, x):
+        """Yields the members of the equivalence class containing `x`."""
+        records = self._records
+        if x not in records:
+            yield x
+            return
+        cur_x = x
+        while True:
+            yield cur_x
+            cur_x = records[cur_x][2]
+            if cur_x == x:
+                break
+
+    def _classes(self):
+        """Returns the equivalence classes as `(min_values, sizes, members)` lists."""
+        records = self._records
+        min_values = []
+        sizes = []
+        members = []
+        append_member = members.append
+        for x, record in records.items():
+            if record[0] != x:
+                continue
+            min_values.append(record[3])
+            sizes.append(record[1])
+            append_member(x)
+            cur_x = record[2]
+            while cur_x != x:
+                append_member(cur_x)
+                cur_x = records[cur_x][2]
+        return min_values, sizes, members
+
+    def sets(self):
+        """Returns the equivalence classes as a set of sets."""
+        _, sizes, members = self._classes()
+        return frozenset(frozenset(x) for x in _split_classes(sizes, members))
+
+    def to_packed(self):
+        """Returns the equivalence classes in packed form.
+
+        See `EquivalenceMap.to_packed`.
+        """
+        return _pack_classes(*self._classes())
+
+    def to_json(self):
+        """Returns the equivalence classes a sorted list of sorted lists."""
+        return _classes_to_json(*self._classes())
+
+    def __copy__(self):
+        """Does not preserve _readonly attribute."""
+        return PersistentEquivalenceMap(self)
+
+    def __deepcopy__(self, memo):
+        """Does not preserve _readonly attribute."""
+        return PersistentEquivalenceMap(self)
+
+    def copy(self):
+        """Returns a copy of the equivalence map."""
+        return PersistentEquivalenceMap(self)
+
+    def delete_set(self, x):
+        """Removes the equivalence class containing `x`."""
+        records = self._records
+        for v in list(self.members(x)):
+            records = records.delete(v)
+        self._records = records
+
+    def isolate_element(self, x):
+        """Isolates `x` from its equivalence class."""
+        members = list(self.members(x))
+        self.delete_set(x)
+        self.union(*(v for v in members if v != x))
@@ -15,15 +15,20 @@
 
 from __future__ import absolute_import
 
+import copy
 import unittest
 
-from . import equivalence_map
+import numpy as np
+
+from . import equivalence_map, trackable_state, viewer_state
 
 
 class EquivalenceMapTest(unittest.TestCase):
+    equivalence_map_type = equivalence_map.EquivalenceMap
+
     def test_basic(self):
 
-        m = equivalence_map.EquivalenceMap()
+        m = self.equivalence_map_type()
 
         for i in range(24):
             self.assertEqual(0, m[i])
@@ -58,7 +63,7 @@ class EquivalenceMapTest(unittest.TestCase):
             self.assertEqual(set([i]), set(m.members(i)))
 
     def test_init_simple(self):
-        m = equivalence_map.EquivalenceMap([[1, 2, 3], [4, 5]])
+        m = self.equivalence_map_type([[1, 2, 3], [4, 5]])
         self.assertEqual(1, m[1])
         self.assertEqual(1, m[2])
         self.assertEqual(1, m[3])
@@ -68,12 +73,24 @@ class EquivalenceMapTest(unittest.TestCase):
         self.assertEqual([[1, 2, 3], [4, 5]], m.to_json())
 
     def test_delete_set(self):
-        m = equivalence_map.EquivalenceMap([[1, 2, 3], [4, 5]])
+        m = self.equivalence_map_type([[1, 2, 3], [4, 5]])
         m.delete_set(5)
         self.assertEqual([[1, 2, 3]], m.to_json())
 
+    def test_to_packed(self):
+        m = self.equivalence_map_type([[5, 4], [3, 1, 2], [6, 6]])
+        offsets, members = m.to_packed()
+        self.assertEqual([0, 3, 5, 6], offsets.tolist())
+        self.assertEqual([1, 2, 3, 4, 5, 6], members.tolist())
+
+    def test_non_uint64_elements(self):
+        self.assertEqual([[-1, 3]], self.equivalence_map_type([[-1, 3]]).to_json())
+        self.assertEqual([[1.5, 2.5]], self.equivalence_map_type([[2.5, 1.5]]).to_json())
+        with self.assertRaises(ValueError):
+            self.equivalence_map_type([[-1, 3]]).to_packed()
+
     def test_isolate_element(self):
-        m = equivalence_map.EquivalenceMap([[1, 2, 3], [4, 5]])
+        m = self.equivalence_map_type([[1, 2, 3], [4, 5]])
         m.isolate_element(1)
         self.assertEqual([[2, 3], [4, 5]], m.to_json())
 
@@ -81,5 +98,101 @@ class EquivalenceMapTest(unittest.TestCase):
         self.assertEqual([[2, 3], [4, 5]], m.to_json())
 
 
+class ArrayEquivalenceMapTest(EquivalenceMapTest):
+    equivalence_map_type = equivalence_map.ArrayEquivalenceMap
+
+    def test_union_edges(self):
+        m = self.equivalence_map_type([[10, 11]])
+        m.union_edges(
+            np.array([1, 3, 5, 11], dtype=np.uint64), np.array([2, 4, 3, 20], dtype=np.uint64))
+        self.assertEqual([[1, 2], [3, 4, 5], [10, 11, 20]], m.to_json())
+        self.assertEqual(set([3, 4, 5]), set(m.members(4)))
+        self.assertEqual([1, 3, 10, 7], m[np.array([2, 5, 20, 7], dtype=np.uint64)].tolist())
+        self.assertEqual(3, m.union(4, 30))
+        self.assertEqual(set([3, 4, 5, 30]), set(m.members(30)))
+
+    def test_large_values(self):
+        m = self.equivalence_map_type()
+        m.union(18446744073709551615, 9223372036854775808)
+        self.assertEqual([[9223372036854775808, 18446744073709551615]], m.to_json())
+
+    def test_non_uint64_elements(self):
+        # Elements are stored in a uint64 array, so negative and non-integer elements are rejected
+        # rather than wrapped or truncated.
+        for existing in ([[-1, 3]], [[1.5, 2]], [[2**64, 3]]):
+            with self.assertRaises(ValueError):
+                self.equivalence_map_type(existing)
+        m = self.equivalence_map_type([[1, 2]])
+        with self.assertRaises(ValueError):
+            m.union(-1, 2)
+        with self.assertRaises(ValueError):
+            m.union_edges(np.array([-1]), np.array([2]))
+        with self.assertRaises(ValueError):
+            m[[1.5, 2]]
+        self.assertEqual(-1, m[-1])
+        self.assertEqual([[1, 2]], m.to_json())
+
+    def test_large_elements(self):
+        m = self.equivalence_map_type([[2**64 - 1, 2**63, 5]])
+        self.assertEqual([[5, 2**63, 2**64 - 1]], m.to_json())
+        self.assertEqual(5, m[2**64 - 1])
+
+    def test_convert(self):
+        m = equivalence_map.EquivalenceMap([[1, 2, 3], [4, 5]])
+        self.assertEqual(m.to_json(), self.equivalence_map_type(m).to_json())
+
+    def test_incremental_union(self):
+        rs = np.random.RandomState(0)
+        m = self.equivalence_map_type()
+        expected = equivalence_map.EquivalenceMap()
+        for a, b in rs.randint(0, 200, size=(150, 2)):
+            self.assertEqual(expected.union(int(a), int(b)), m.union(int(a), int(b)))
+        self.assertEqual(expected.to_json(), m.to_json())
+        for x in expected:
+            self.assertEqual(set(expected.members(x)), set(m.members(x)))
+
+
+class PersistentEquivalenceMapTest(EquivalenceMapTest):
+    equivalence_map_type = equivalence_map.PersistentEquivalenceMap
+
+    def test_copy(self):
+        m = self.equivalence_map_type([[1, 2, 3], [4, 5]])
+        c = copy.deepcopy(m)
+        c.union(3, 4)
+        m.union(5, 6)
+        self.assertEqual([[1, 2, 3], [4, 5, 6]], m.to_json())
+        self.assertEqual([[1, 2, 3, 4, 5]], c.to_json())
+
+    def test_layer_copy(self):
+        layer = viewer_state.SegmentationLayer()
+        layer.equivalences = self.equivalence_map_type([[1, 2]])
+        layer_copy = copy.deepcopy(layer)
+        self.assertIsInstance(layer_copy.equivalences, self.equivalence_map_type)
+        layer_copy.equivalences.union(2, 3)
+        self.assertEqual([[1, 2]], layer.to_json()['equivalences'])
+        self.assertEqual([[1, 2, 3]], layer_copy.to_json()['equivalences'])
+
+    def test_state_copy(self):
+        state = viewer_state.ViewerState()
+        state.layers['a'] = viewer_state.SegmentationLayer(
+            equivalences=self.equivalence_map_type([[1, 2], [3, 4]]))
+        equivalences = state.layers['a'].equivalences
+        state_copy = copy.deepcopy(state)
+        copied_equivalences = state_copy.layers['a'].equivalences
+        self.assertIsInstance(copied_equivalences, self.equivalence_map_type)
+        # The copy shares the structure of the map.
+        self.assertIs(equivalences._records, copied_equivalences._records)
+        copied_equivalences.union(4, 5)
+        self.assertEqual([[1, 2], [3, 4]], equivalences.to_json())
+
+    def test_default_type(self):
+        # The persistent map is opt-in, since its unions and serialization are slower.
+        state = trackable_state.TrackableState(viewer_state.ViewerState)
+        with state.txn() as s:
+            s.layers['a'] = viewer_state.SegmentationLayer(equivalences=[[1, 2]])
+        self.assertIsInstance(state.state.layers['a'].equivalences,
+                              equivalence_map.EquivalenceMap)
+
+
 if __name__ == '__main__':
     unittest.main()
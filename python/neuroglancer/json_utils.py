@@ -21,6 +21,8 @@ import numbers
 import numpy as np
 
 from . import local_volume
+from .point_list import LocalPointList, PointList
+from .segment_set import SegmentSet
 
 min_safe_integer = -9007199254740991
 max_safe_integer = 9007199254740991
@@ -37,11 +39,15 @@ def json_encoder_default(obj):
         return list(obj)
     elif isinstance(obj, (set, frozenset)):
         return list(obj)
+    elif isinstance(obj, (SegmentSet, PointList)):
+        return obj.to_json()
     raise TypeError
 
 def json_encoder_default_for_repr(obj):
     if isinstance(obj, local_volume.LocalVolume):
         return '<LocalVolume>'
+    if isinstance(obj, LocalPointList):
+        return '<LocalPointList>'
     return json_encoder_default(obj)
 
 def decode_json(x):
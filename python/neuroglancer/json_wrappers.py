@@ -65,7 +65,27 @@ class JsonObjectWrapper(object):
             return r
 
     def __deepcopy__(self, memo):
-        return type(self)(copy.deepcopy(self.to_json(), memo))
+        """Returns a non-readonly copy.
+
+        Cached wrapped values that support the readonly protocol are deep copied directly, which
+        preserves their type and allows them to share structure with the original (e.g. a
+        `PersistentEquivalenceMap`).  Other values are copied via their JSON representation.
+        """
+        result = object.__new__(type(self))
+        cached_wrappers = dict()
+        with self._lock:
+            json_data = self._json_data.copy()
+            for k, (wrapper, _) in six.iteritems(self._cached_wrappers):
+                if hasattr(wrapper, 'supports_readonly'):
+                    cached_wrappers[k] = (copy.deepcopy(wrapper, memo), None)
+                    json_data[k] = None  # placeholder
+                else:
+                    json_data[k] = to_json(wrapper)
+        object.__setattr__(result, '_json_data', copy.deepcopy(json_data, memo))
+        object.__setattr__(result, '_cached_wrappers', cached_wrappers)
+        object.__setattr__(result, '_lock', threading.RLock())
+        object.__setattr__(result, '_readonly', False)
+        return result
 
     def __repr__(self):
         return u'%s(%s)' % (type(self).__name__, encode_json_for_repr(self.to_json()))
@@ -234,10 +254,32 @@ def typed_list(wrapped_type, validator=None):
             if not isinstance(json_data, (list, tuple, np.ndarray)):
                 raise ValueError
             self._readonly = _readonly
-            self._data = [validator(x) for x in json_data]
+            self._lock = threading.Lock()
+            if _readonly:
+                # Elements of a readonly list are only converted when first accessed.  Since a
+                # readonly list may be shared between threads, `_json_data` is retained after the
+                # conversion, and the conversion is done under `_lock`.
+                self._json_data = json_data
+                self._wrapped_data = None
+            else:
+                self._json_data = None
+                self._wrapped_data = [validator(x) for x in json_data]
+
+        @property
+        def _data(self):
+            data = self._wrapped_data
+            if data is None:
+                with self._lock:
+                    data = self._wrapped_data
+                    if data is None:
+                        data = self._wrapped_data = [validator(x) for x in self._json_data]
+            return data
 
         def __len__(self):
-            return len(self._data)
+            data = self._wrapped_data
+            if data is None:
+                return len(self._json_data)
+            return len(data)
 
         def __getitem__(self, key):
             return self._data[key]
@@ -0,0 +1,75 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests that `import neuroglancer` does not import the server."""
+
+from __future__ import absolute_import
+
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+HEAVY_MODULES = ['tornado', 'sockjs.tornado', 'PIL', 'neuroglancer.server', 'neuroglancer.viewer']
+
+CHECK_SCRIPT = '''
+import json, sys
+import neuroglancer
+state = neuroglancer.ViewerState()
+state.layers['a'] = neuroglancer.SegmentationLayer(source='precomputed://gs://a', segments=[1, 2])
+assert neuroglancer.parse_url(neuroglancer.to_url(state)).to_json() == state.to_json()
+imported = [m for m in %r if m in sys.modules]
+neuroglancer.Viewer
+sys.stdout.write(json.dumps(dict(imported=imported, viewer_imported='neuroglancer.viewer' in sys.modules)))
+''' % (HEAVY_MODULES, )
+
+
+STAR_IMPORT_SCRIPT = '''
+import json, sys
+import neuroglancer
+namespace = dict()
+exec('from neuroglancer import *', namespace)
+sys.stdout.write(json.dumps(sorted(name for name in namespace
+                                   if getattr(neuroglancer, name, None) is namespace[name])))
+'''
+
+
+def run_script(script):
+    env = dict(os.environ)
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    python_path = [package_dir]
+    if env.get('PYTHONPATH'):
+        python_path.append(env['PYTHONPATH'])
+    env['PYTHONPATH'] = os.pathsep.join(python_path)
+    output = subprocess.check_output([sys.executable, '-c', script], env=env)
+    return json.loads(output.decode('utf-8'))
+
+
+@unittest.skipIf(sys.version_info < (3, 7), 'Lazy imports require Python 3.7')
+class LazyImportTest(unittest.TestCase):
+    def test_lazy_import(self):
+        result = run_script(CHECK_SCRIPT)
+        self.assertEqual([], result['imported'])
+        self.assertTrue(result['viewer_imported'])
+
+    def test_star_import(self):
+        exported = run_script(STAR_IMPORT_SCRIPT)
+        for name in ['Viewer', 'UnsynchronizedViewer', 'server', 'set_server_bind_address',
+                     'set_static_content_source', 'is_server_running', 'stop', 'LocalVolume',
+                     'ViewerState', 'to_url', 'parse_url', 'viewer_state']:
+            self.assertIn(name, exported)
+        self.assertNotIn('importlib', exported)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -18,12 +18,18 @@ import collections
 import threading
 
 import numpy as np
+import six
 
-from . import downsample, downsample_scales
+from . import (downsample, downsample_scales, lru_cache, metrics, min_max_pyramid,
+               segment_statistics)
 from .chunks import encode_jpeg, encode_npz, encode_raw
 from . import trackable_state
+from .futures import run_on_new_thread
 from .random_token import make_random_token
 
+# Maximum total size of the cached encodings of uniform subvolumes of each volume.
+UNIFORM_SUBVOLUME_CACHE_BYTES = 1 << 20
+
 
 class MeshImplementationNotAvailable(Exception):
     pass
@@ -34,6 +40,9 @@ class MeshesNotSupportedForVolume(Exception):
 class InvalidObjectIdForMesh(Exception):
     pass
 
+class SegmentStatisticsNotSupportedForVolume(Exception):
+    pass
+
 DownsamplingScaleInfo = collections.namedtuple('DownsamplingScaleInfo', ['key',
                                                                          'downsample_factor',
                                                                          'voxel_size',
@@ -44,6 +53,105 @@ def get_scale_key(scale):
     return '%d,%d,%d' % scale
 
 
+def check_subvolume_bounds(scale_info, start, end):
+    shape = scale_info.shape
+    for i in range(3):
+        if end[i] < start[i] or start[i] < 0 or end[i] > shape[i]:
+            raise ValueError('Out of bounds data request.')
+
+
+def encode_array(subvol, data_format):
+    """Encodes a 3-d [z, y, x] or 4-d [channel, z, y, x] array.
+
+    @returns: Tuple `(data, content_type)`.
+    """
+    if data_format == 'jpeg':
+        return encode_jpeg(subvol), 'image/jpeg'
+    if data_format == 'npz':
+        return encode_npz(subvol), 'application/octet-stream'
+    if data_format == 'raw':
+        return encode_raw(subvol), 'application/octet-stream'
+    raise ValueError('Invalid data format requested.')
+
+
+def _is_exact_average(value, downsample_factor):
+    """Returns True if `downsample_with_averaging` maps a uniform block of `value` to `value`.
+
+    The sums are computed in float32, which is exact for small enough integers.
+    """
+    value = float(value)
+    return value == int(value) and abs(value) * np.prod(downsample_factor) <= (1 << 24)
+
+
+def encode_subvolume(data, volume_type, downsample_factor, data_format, start, end,
+                     stage_times=None):
+    """Extracts, downsamples and encodes a subvolume.
+
+    This depends only on its arguments, so that it may also be called from worker processes that
+    have access to the volume data.
+
+    @param data: 3-d [z, y, x] or 4-d [channel, z, y, x] array.
+    @param downsample_factor: Tuple [x, y, z] specifying the downsampling factor.
+    @param start: Tuple [x, y, z] specifying the start of the subvolume in downsampled voxels.
+    @param end: Tuple [x, y, z] specifying the end of the subvolume in downsampled voxels.
+    @param stage_times: Optional dict into which the time in seconds spent in each of the 'slice',
+        'downsample' and 'encode' stages is stored.
+
+    @returns: Tuple `(data, content_type)`.
+    """
+    start_time = metrics.default_timer()
+    indexing_expr = tuple(np.s_[start[i] * downsample_factor[i]:end[i] * downsample_factor[i]]
+                          for i in (2, 1, 0))
+    if len(data.shape) == 3:
+        full_downsample_factor = downsample_factor[::-1]
+        subvol = data[indexing_expr]
+    else:
+        full_downsample_factor = (1, ) + downsample_factor[::-1]
+        subvol = data[(np.s_[:], ) + indexing_expr]
+    if subvol.dtype == 'float64':
+        subvol = np.cast[np.float32](subvol)
+    slice_time = metrics.default_timer()
+
+    if downsample_factor != (1, 1, 1):
+        if volume_type == 'image':
+            subvol = downsample.downsample_with_averaging(subvol, full_downsample_factor)
+        else:
+            subvol = downsample.downsample_with_striding(subvol, full_downsample_factor)
+    downsample_time = metrics.default_timer()
+    data, content_type = encode_array(subvol, data_format)
+    if stage_times is not None:
+        stage_times['slice'] = slice_time - start_time
+        stage_times['downsample'] = downsample_time - slice_time
+        stage_times['encode'] = metrics.default_timer() - downsample_time
+    return data, content_type
+
+
+class _ChannelView(object):
+    """Read-only view of the first channel of a 4-d [channel, z, y, x] array-like object.
+
+    Unlike `data[0]`, creating the view does not read any data, so that array-like objects such
+    as HDF5 datasets are only read one slab at a time by `min_max_pyramid.MinMaxPyramid` and
+    `segment_statistics.compute_segment_statistics`.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.shape = tuple(data.shape[1:])
+        self.dtype = data.dtype
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key, )
+        return self.data[(0, ) + key]
+
+
+def _get_first_channel(data):
+    """Returns `data` if it is 3-d, or a lazily-sliced view of its first channel if it is 4-d."""
+    if len(data.shape) == 4:
+        return _ChannelView(data)
+    return data
+
+
 class LocalVolume(trackable_state.ChangeNotifier):
     def __init__(self,
                  data,
@@ -58,7 +166,9 @@ class LocalVolume(trackable_state.ChangeNotifier):
                  downsampling='3d',
                  max_downsampling=downsample_scales.DEFAULT_MAX_DOWNSAMPLING,
                  max_downsampled_size=downsample_scales.DEFAULT_MAX_DOWNSAMPLED_SIZE,
-                 max_downsampling_scales=downsample_scales.DEFAULT_MAX_DOWNSAMPLING_SCALES):
+                 max_downsampling_scales=downsample_scales.DEFAULT_MAX_DOWNSAMPLING_SCALES,
+                 batch_requests=False,
+                 uniform_chunk_index=False):
         """Initializes a LocalVolume.
 
         @param data: 3-d [z, y, x] array or 4-d [channel, z, y, x] array.
@@ -88,6 +198,17 @@ class LocalVolume(trackable_state.ChangeNotifier):
 
                 - lock_boundary_vertices: bool.  Retain all vertices along mesh surface boundaries,
                   which can only occur at the boundary of the volume.  Defaults to true.
+
+        @param batch_requests: If True, the client fetches chunks that it needs at the same time in
+            a single POST request to the batch endpoint, rather than one GET request per chunk.
+            This reduces the per-request overhead when many small chunks are needed, but the
+            batched chunks bypass the HTTP cache of the browser, so that they are encoded and sent
+            again after the page is reloaded, even if the volume has not changed.
+
+        @param uniform_chunk_index: If True, a min/max pyramid over blocks of the data is built in
+            the background on first use, and chunks that it shows to be uniform are encoded without
+            reading the data.  Building the pyramid reads the entire volume once more after each
+            invalidation, which only pays off if the volume has large uniform regions.
         """
         super(LocalVolume, self).__init__()
         if hasattr(data, 'attrs'):
@@ -114,6 +235,8 @@ class LocalVolume(trackable_state.ChangeNotifier):
         if self.data_type == 'float64':
             self.data_type = 'float32'
         self.encoding = encoding
+        self.batch_requests = batch_requests
+        self.uniform_chunk_index = uniform_chunk_index
         if len(data.shape) == 3:
             self.num_channels = 1
             original_shape = data.shape[::-1]
@@ -137,6 +260,15 @@ class LocalVolume(trackable_state.ChangeNotifier):
         self._mesh_generator_lock = threading.Condition()
         self._mesh_options = mesh_options.copy() if mesh_options is not None else dict()
 
+        self._segment_statistics = None
+        self._segment_statistics_lock = threading.Lock()
+
+        self._min_max_pyramid = None
+        self._min_max_pyramid_pending = None
+        self._min_max_pyramid_lock = threading.Lock()
+        self._uniform_subvolume_cache = lru_cache.LruCache(UNIFORM_SUBVOLUME_CACHE_BYTES,
+                                                           get_size=lambda x: len(x[0]))
+
 
         voxel_size = np.array(voxel_size)
         self.voxel_size = voxel_size
@@ -180,6 +312,8 @@ class LocalVolume(trackable_state.ChangeNotifier):
         )
         if self.max_voxels_per_chunk_log2 is not None:
             info['maxVoxelsPerChunkLog2'] = self.max_voxels_per_chunk_log2
+        if self.batch_requests:
+            info['batchRequests'] = True
 
         def get_scale_info(s):
             info = self.downsampling_scale_info[get_scale_key(s)]
@@ -196,47 +330,129 @@ class LocalVolume(trackable_state.ChangeNotifier):
                                               for s in self.three_dimensional_scales]
         return info
 
-    def get_encoded_subvolume(self, data_format, start, end, scale_key='1,1,1'):
+    def get_scale_info(self, scale_key):
         scale_info = self.downsampling_scale_info.get(scale_key)
         if scale_info is None:
             raise ValueError('Invalid scale.')
-        shape = scale_info.shape
-        downsample_factor = scale_info.downsample_factor
-        for i in range(3):
-            if end[i] < start[i] or start[i] < 0 or end[i] > shape[i]:
-                raise ValueError('Out of bounds data request.')
-
-        indexing_expr = tuple(np.s_[start[i] * downsample_factor[i]:end[i] * downsample_factor[i]]
-                              for i in (2, 1, 0))
-        if len(self.data.shape) == 3:
-            full_downsample_factor = downsample_factor[::-1]
-            subvol = self.data[indexing_expr]
-        else:
-            full_downsample_factor = (1, ) + downsample_factor[::-1]
-            subvol = self.data[(np.s_[:], ) + indexing_expr]
-        if subvol.dtype == 'float64':
-            subvol = np.cast[np.float32](subvol)
-
-        if downsample_factor != (1, 1, 1):
-            if self.volume_type == 'image':
-                subvol = downsample.downsample_with_averaging(subvol, full_downsample_factor)
-            else:
-                subvol = downsample.downsample_with_striding(subvol, full_downsample_factor)
-        content_type = 'application/octet-stream'
-        if data_format == 'jpeg':
-            data = encode_jpeg(subvol)
-            content_type = 'image/jpeg'
-        elif data_format == 'npz':
-            data = encode_npz(subvol)
-        elif data_format == 'raw':
-            data = encode_raw(subvol)
-        else:
-            raise ValueError('Invalid data format requested.')
-        return data, content_type
+        return scale_info
+
+    def _get_min_max_pyramid(self):
+        """Returns the min/max pyramid of the current data, or None if it is not yet available.
+
+        The first call starts building the pyramid on a new thread, so that it does not delay the
+        request that triggered it.  Returns None if `uniform_chunk_index` is not enabled.
+        """
+        if not self.uniform_chunk_index or self.num_channels != 1:
+            return None
+        change_count = self.change_count
+        cached = self._min_max_pyramid
+        if cached is not None and cached[0] == change_count:
+            return cached[1]
+        with self._min_max_pyramid_lock:
+            if self._min_max_pyramid_pending == change_count:
+                return None
+            self._min_max_pyramid_pending = change_count
+
+        def build():
+            with metrics.min_max_pyramid_build_seconds.time():
+                pyramid = min_max_pyramid.MinMaxPyramid(_get_first_channel(self.data))
+            self._min_max_pyramid = (change_count, pyramid)
+
+        run_on_new_thread(build)
+        return None
+
+    def get_uniform_encoded_subvolume(self, data_format, start, end, scale_key='1,1,1'):
+        """Returns the encoded subvolume if it is known to be uniform, without reading the data.
+
+        Uniform subvolumes are detected using a min/max pyramid over blocks of the full-resolution
+        data, and their encodings are cached by value and shape.
+
+        @returns: Tuple `(data, content_type)` as for `get_encoded_subvolume`, or None if the
+            subvolume is not known to be uniform.
+        """
+        pyramid = self._get_min_max_pyramid()
+        if pyramid is None:
+            return None
+        downsample_factor = self.get_scale_info(scale_key).downsample_factor
+        full_start = [start[i] * downsample_factor[i] for i in range(3)]
+        full_end = [min(end[i] * downsample_factor[i], self.data.shape[-1 - i]) for i in range(3)]
+        value = pyramid.get_uniform_value(full_start, full_end)
+        if value is None:
+            return None
+        if (self.volume_type == 'image' and downsample_factor != (1, 1, 1) and
+                not _is_exact_average(value, downsample_factor)):
+            return None
+        dtype = np.dtype(self.data.dtype)
+        if dtype == np.float64:
+            dtype = np.dtype(np.float32)
+        value = dtype.type(value)
+        shape = tuple(-(-(full_end[i] - full_start[i]) // downsample_factor[i])
+                      for i in (2, 1, 0))
+        if len(self.data.shape) == 4:
+            shape = (1, ) + shape
+        key = (data_format, dtype.str, shape, value.tobytes())
+        result = self._uniform_subvolume_cache.get(key)
+        if result is None:
+            result = encode_array(np.full(shape, value, dtype=dtype), data_format)
+            self._uniform_subvolume_cache.set(key, result)
+        metrics.uniform_subvolumes.inc()
+        return result
+
+    def get_encoded_subvolume(self, data_format, start, end, scale_key='1,1,1'):
+        scale_info = self.get_scale_info(scale_key)
+        check_subvolume_bounds(scale_info, start, end)
+        result = self.get_uniform_encoded_subvolume(data_format, start, end, scale_key=scale_key)
+        if result is not None:
+            return result
+        stage_times = {}
+        result = encode_subvolume(self.data, self.volume_type, scale_info.downsample_factor,
+                                  data_format, start, end, stage_times=stage_times)
+        for stage, seconds in six.iteritems(stage_times):
+            metrics.subvolume_stage_seconds.observe(seconds, stage=stage)
+        return result
+
+    def _is_segmentation_data(self):
+        return self.num_channels == 1 and np.issubdtype(np.dtype(self.data.dtype), np.integer)
+
+    def get_segment_statistics(self):
+        """Returns the voxel count, bounding box and centroid of every non-zero segment.
+
+        The statistics are computed in a single pass over the volume on first use, and cached until
+        the volume is invalidated.  Concurrent callers wait for a single computation.
+
+        @returns: A `segment_statistics.SegmentStatistics` object.
+        """
+        change_count = self.change_count
+        cached = self._segment_statistics
+        if cached is not None and cached[0] == change_count:
+            return cached[1]
+        if not self._is_segmentation_data():
+            raise SegmentStatisticsNotSupportedForVolume()
+        with self._segment_statistics_lock:
+            cached = self._segment_statistics
+            if cached is not None and cached[0] == change_count:
+                return cached[1]
+            with metrics.segment_statistics_seconds.time():
+                statistics = segment_statistics.compute_segment_statistics(
+                    _get_first_channel(self.data))
+            self._segment_statistics = (change_count, statistics)
+            return statistics
+
+    def get_cached_segment_statistics(self):
+        """Returns the segment statistics if they are cached and current, or `None` otherwise."""
+        cached = self._segment_statistics
+        if cached is not None and cached[0] == self.change_count:
+            return cached[1]
+        return None
 
     def get_object_mesh(self, object_id):
+        statistics = self.get_cached_segment_statistics()
+        if statistics is not None and object_id not in statistics:
+            # Avoids building the mesh generator, or searching the volume, for absent objects.
+            raise InvalidObjectIdForMesh()
         mesh_generator = self._get_mesh_generator()
-        data = mesh_generator.get_mesh(object_id)
+        with metrics.mesh_seconds.time():
+            data = mesh_generator.get_mesh(object_id)
         if data is None:
             raise InvalidObjectIdForMesh()
         return data
@@ -267,8 +483,9 @@ class LocalVolume(trackable_state.ChangeNotifier):
                 data = self.data[0, :, :, :]
             else:
                 data = self.data
-            new_mesh_generator = _neuroglancer.OnDemandObjectMeshGenerator(
-                data, self.voxel_size, self.offset / self.voxel_size, **self._mesh_options)
+            with metrics.mesh_generator_build_seconds.time():
+                new_mesh_generator = _neuroglancer.OnDemandObjectMeshGenerator(
+                    data, self.voxel_size, self.offset / self.voxel_size, **self._mesh_options)
             with self._mesh_generator_lock:
                 if self._mesh_generator_pending is not pending_obj:
                     continue
@@ -285,8 +502,19 @@ class LocalVolume(trackable_state.ChangeNotifier):
         return self
 
     def invalidate(self):
-        """Mark the data invalidated.  Clients will refetch the volume."""
+        """Mark the data invalidated.
+
+        This increments `change_count`, which changes the ETag of all responses for the volume, so
+        that clients will refetch the volume rather than reuse cached responses.  Encoded skeletons
+        cached by `skeletons`, the segment statistics and the min/max pyramid used to detect
+        uniform subvolumes are also discarded.
+        """
         with self._mesh_generator_lock:
             self._mesh_generator_pending = None
             self._mesh_generator = None
+        self._segment_statistics = None
+        self._min_max_pyramid = None
+        invalidate_skeletons = getattr(self.skeletons, 'invalidate', None)
+        if invalidate_skeletons is not None:
+            invalidate_skeletons()
         self._dispatch_changed_callbacks()
@@ -0,0 +1,293 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Counters and latency histograms for the built-in server.
+
+All metrics are registered in the module-level `registry`, which can be exported in the Prometheus
+text exposition format with `to_prometheus_text`, or as a dict with `get_metrics`.  The server
+exposes the former at `/neuroglancer/metrics`.
+
+Label values must come from small fixed sets, such as handler names, rather than per-volume or
+per-request tokens, since the series of each distinct combination is retained for the lifetime of
+the process.
+"""
+
+from __future__ import absolute_import
+
+import bisect
+import contextlib
+import math
+import threading
+import timeit
+
+import six
+
+default_timer = timeit.default_timer
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _format_value(value):
+    if value == math.floor(value) and abs(value) < 1e15:
+        return '%d' % value
+    return repr(float(value))
+
+
+def _escape_label_value(value):
+    return six.text_type(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape_label_value(value))
+                             for name, value in pairs)
+
+
+class Metric(object):
+    metric_type = None
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _get_label_values(self, labels):
+        if sorted(labels) != sorted(self.label_names):
+            raise ValueError('Expected labels %r, but received %r' %
+                             (self.label_names, sorted(labels.keys())))
+        return tuple(labels[name] for name in self.label_names)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def _get_samples(self):
+        raise NotImplementedError
+
+    def to_prometheus_text(self):
+        lines = ['# HELP %s %s' % (self.name, self.documentation),
+                 '# TYPE %s %s' % (self.name, self.metric_type)]
+        for name, label_values, extra_labels, value in self._get_samples():
+            lines.append('%s%s %s' % (name, _format_labels(self.label_names, label_values,
+                                                           extra_labels), _format_value(value)))
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    """Monotonically increasing count, optionally partitioned by labels."""
+
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._get_label_values(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        with self._lock:
+            return self._values.get(self._get_label_values(labels), 0)
+
+    def _get_samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, key, (), value) for key, value in items]
+
+    def to_json(self):
+        with self._lock:
+            return [dict(labels=dict(zip(self.label_names, key)), value=value)
+                    for key, value in sorted(self._values.items())]
+
+
+class Gauge(Metric):
+    """Value computed by calling `function` at the time the metrics are exported."""
+
+    metric_type = 'gauge'
+
+    def __init__(self, name, documentation, function):
+        super(Gauge, self).__init__(name, documentation)
+        self.function = function
+
+    def get(self):
+        return self.function()
+
+    def _get_samples(self):
+        return [(self.name, (), (), self.function())]
+
+    def to_json(self):
+        return [dict(labels={}, value=self.function())]
+
+
+class _HistogramValue(object):
+    __slots__ = ('bucket_counts', 'count', 'sum')
+
+    def __init__(self, num_buckets):
+        self.bucket_counts = [0] * num_buckets
+        self.count = 0
+        self.sum = 0.0
+
+
+class Histogram(Metric):
+    """Distribution of observed values, such as latencies in seconds."""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super(Histogram, self).__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._get_label_values(labels)
+        bucket_index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = _HistogramValue(len(self.buckets) + 1)
+            entry.bucket_counts[bucket_index] += 1
+            entry.count += 1
+            entry.sum += value
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Context manager that observes the time in seconds spent in its body."""
+        start_time = default_timer()
+        try:
+            yield
+        finally:
+            self.observe(default_timer() - start_time, **labels)
+
+    def get(self, **labels):
+        """Returns `(count, sum)` for the specified labels."""
+        with self._lock:
+            entry = self._values.get(self._get_label_values(labels))
+            if entry is None:
+                return 0, 0.0
+            return entry.count, entry.sum
+
+    def _get_samples(self):
+        samples = []
+        with self._lock:
+            for key, entry in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'), ), entry.bucket_counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else _format_value(bound)
+                    samples.append((self.name + '_bucket', key, (('le', le), ), cumulative))
+                samples.append((self.name + '_sum', key, (), entry.sum))
+                samples.append((self.name + '_count', key, (), entry.count))
+        return samples
+
+    def to_json(self):
+        with self._lock:
+            return [dict(labels=dict(zip(self.label_names, key)), count=entry.count, sum=entry.sum,
+                         buckets=list(zip(self.buckets, entry.bucket_counts)))
+                    for key, entry in sorted(self._values.items())]
+
+
+class Registry(object):
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def unregister(self, metric):
+        with self._lock:
+            self._metrics.remove(metric)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._metrics))
+
+    def to_prometheus_text(self):
+        return ''.join(metric.to_prometheus_text() + '\n' for metric in self)
+
+    def to_json(self):
+        return dict((metric.name, dict(type=metric.metric_type, values=metric.to_json()))
+                    for metric in self)
+
+    def clear(self):
+        for metric in self:
+            metric.clear()
+
+
+registry = Registry()
+
+
+def to_prometheus_text():
+    """Returns all metrics in the Prometheus text exposition format."""
+    return registry.to_prometheus_text()
+
+
+def get_metrics():
+    """Returns all metrics as a JSON-compatible dict, indexed by metric name."""
+    return registry.to_json()
+
+
+def clear():
+    """Resets all counters and histograms."""
+    registry.clear()
+
+
+http_requests = registry.register(
+    Counter('neuroglancer_http_requests_total', 'Number of HTTP requests handled.',
+            ['handler', 'status']))
+
+http_request_seconds = registry.register(
+    Histogram('neuroglancer_http_request_duration_seconds',
+              'Time from receiving an HTTP request to finishing the response.', ['handler']))
+
+http_write_seconds = registry.register(
+    Histogram('neuroglancer_http_write_duration_seconds',
+              'Time to write a finished response to the socket.', ['handler']))
+
+response_bytes = registry.register(
+    Counter('neuroglancer_response_bytes_total', 'Number of response body bytes sent.',
+            ['handler', 'encoding']))
+
+executor_wait_seconds = registry.register(
+    Histogram('neuroglancer_executor_wait_duration_seconds',
+              'Time that tasks wait in the server thread pool queue before starting.'))
+
+subvolume_stage_seconds = registry.register(
+    Histogram('neuroglancer_subvolume_stage_duration_seconds',
+              'Time spent in each stage of computing an encoded subvolume.', ['stage']))
+
+mesh_generator_build_seconds = registry.register(
+    Histogram('neuroglancer_mesh_generator_build_duration_seconds',
+              'Time to build the on-demand mesh generator of a volume.'))
+
+mesh_seconds = registry.register(
+    Histogram('neuroglancer_mesh_duration_seconds', 'Time to generate the mesh of an object.'))
+
+action_seconds = registry.register(
+    Histogram('neuroglancer_action_duration_seconds',
+              'Time to run the Python handlers of an action invoked by the client.', ['action']))
+
+segment_statistics_seconds = registry.register(
+    Histogram('neuroglancer_segment_statistics_duration_seconds',
+              'Time to compute the segment statistics of a volume.'))
+
+min_max_pyramid_build_seconds = registry.register(
+    Histogram('neuroglancer_min_max_pyramid_build_duration_seconds',
+              'Time to build the min/max pyramid used to detect uniform subvolumes of a volume.'))
+
+uniform_subvolumes = registry.register(
+    Counter('neuroglancer_uniform_subvolumes_total',
+            'Number of subvolume requests answered from the min/max pyramid without reading data.'))
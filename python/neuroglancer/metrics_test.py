@@ -0,0 +1,65 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for metrics.py"""
+
+from __future__ import absolute_import
+
+import unittest
+
+from . import metrics
+
+
+class MetricsTest(unittest.TestCase):
+    def test_counter(self):
+        counter = metrics.Counter('requests_total', 'Requests.', ['handler'])
+        counter.inc(handler='a')
+        counter.inc(2, handler='a')
+        counter.inc(handler='b"')
+        self.assertEqual(3, counter.get(handler='a'))
+        self.assertRaises(ValueError, counter.inc, status=200)
+        self.assertEqual(
+            '# HELP requests_total Requests.\n'
+            '# TYPE requests_total counter\n'
+            'requests_total{handler="a"} 3\n'
+            'requests_total{handler="b\\""} 1', counter.to_prometheus_text())
+
+    def test_histogram(self):
+        histogram = metrics.Histogram('seconds', 'Seconds.', buckets=(0.1, 1))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+        self.assertEqual((3, 5.55), histogram.get())
+        self.assertEqual(
+            '# HELP seconds Seconds.\n'
+            '# TYPE seconds histogram\n'
+            'seconds_bucket{le="0.1"} 1\n'
+            'seconds_bucket{le="1"} 2\n'
+            'seconds_bucket{le="+Inf"} 3\n'
+            'seconds_sum 5.55\n'
+            'seconds_count 3', histogram.to_prometheus_text())
+
+    def test_registry(self):
+        registry = metrics.Registry()
+        counter = registry.register(metrics.Counter('c', 'C.'))
+        registry.register(metrics.Gauge('g', 'G.', lambda: 7))
+        counter.inc()
+        self.assertEqual({'c': dict(type='counter', values=[dict(labels={}, value=1)]),
+                          'g': dict(type='gauge', values=[dict(labels={}, value=7)])},
+                         registry.to_json())
+        registry.clear()
+        self.assertEqual(0, counter.get())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Coarse index of the minimum and maximum values of blocks of a volume, used to detect uniform
+regions without reading the data."""
+
+from __future__ import absolute_import, division
+
+import numpy as np
+
+DEFAULT_BLOCK_SIZE = 16
+
+# Maximum number of blocks examined by `MinMaxPyramid.get_uniform_value`.  Coarser levels are used
+# for larger regions.
+MAX_QUERY_BLOCKS = 512
+
+
+def _reduce_blocks(array, block_shape):
+    """Returns the minimum and maximum of each block of `array`, including partial blocks."""
+    mins = maxs = array
+    for axis, block_size in enumerate(block_shape):
+        indices = np.arange(0, array.shape[axis], block_size)
+        mins = np.minimum.reduceat(mins, indices, axis=axis)
+        maxs = np.maximum.reduceat(maxs, indices, axis=axis)
+    return mins, maxs
+
+
+class MinMaxPyramid(object):
+    """Minimum and maximum values of the blocks of a 3-d volume, at successively coarser levels.
+
+    Level 0 has one entry per `block_size`^3 block of voxels, and each subsequent level halves the
+    number of blocks along each dimension.  A region whose covering blocks all have the same minimum
+    and maximum is known to be uniform.
+    """
+
+    def __init__(self, data, block_size=DEFAULT_BLOCK_SIZE):
+        """Builds the pyramid in a single pass over `data`, one slab of blocks at a time.
+
+        @param data: 3-d [z, y, x] array, or other array-like object that supports slicing.
+        """
+        self.block_size = block_size
+        self.shape = tuple(data.shape)
+        if len(self.shape) != 3:
+            raise ValueError('Expected 3-d array, but received shape %r' % (self.shape, ))
+        slab_mins = []
+        slab_maxs = []
+        for z_start in range(0, self.shape[0], block_size):
+            slab = np.asarray(data[z_start:z_start + block_size])
+            if slab.size == 0:
+                continue
+            mins, maxs = _reduce_blocks(slab, (block_size, ) * 3)
+            slab_mins.append(mins)
+            slab_maxs.append(maxs)
+        if not slab_mins:
+            self.levels = []
+            return
+        levels = [(np.concatenate(slab_mins), np.concatenate(slab_maxs))]
+        while max(levels[-1][0].shape) > 1:
+            mins, maxs = levels[-1]
+            levels.append((_reduce_blocks(mins, (2, 2, 2))[0], _reduce_blocks(maxs, (2, 2, 2))[1]))
+        self.levels = levels
+
+    def get_uniform_value(self, start, end):
+        """Returns the value of the region `[start, end)` if it is known to be uniform.
+
+        The check is conservative: `None` is returned if the region is not uniform, but may also be
+        returned for a uniform region that shares a block with other values.
+
+        @param start: Sequence `[x, y, z]` of voxel coordinates.
+        @param end: Sequence `[x, y, z]` of voxel coordinates, clipped to the volume bounds.
+        """
+        start = [int(start[i]) for i in (2, 1, 0)]
+        end = [min(int(end[i]), self.shape[2 - i]) for i in (2, 1, 0)]
+        if not self.levels or any(e <= s for s, e in zip(start, end)):
+            return None
+        level = 0
+        while True:
+            block_size = self.block_size << level
+            region = tuple(np.s_[s // block_size:-(-e // block_size)] for s, e in zip(start, end))
+            num_blocks = np.prod([r.stop - r.start for r in region])
+            if num_blocks <= MAX_QUERY_BLOCKS or level + 1 == len(self.levels):
+                break
+            level += 1
+        mins, maxs = self.levels[level]
+        value = mins[region].min()
+        if value == maxs[region].max():
+            return value
+        return None
@@ -0,0 +1,99 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for min_max_pyramid.py"""
+
+from __future__ import absolute_import
+
+import itertools
+import time
+import unittest
+
+import numpy as np
+
+from . import local_volume, min_max_pyramid
+
+
+def wait_for_pyramid(vol):
+    deadline = time.time() + 10
+    while vol._get_min_max_pyramid() is None:
+        if time.time() > deadline:
+            raise RuntimeError('Timed out building min/max pyramid')
+        time.sleep(0.01)
+
+
+class MinMaxPyramidTest(unittest.TestCase):
+    def test_get_uniform_value(self):
+        data = np.zeros((40, 50, 70), dtype=np.uint32)
+        data[20:, :, 32:] = 7
+        data[39, 49, 69] = 8
+        pyramid = min_max_pyramid.MinMaxPyramid(data, block_size=4)
+        self.assertEqual(0, pyramid.get_uniform_value((0, 0, 0), (32, 50, 40)))
+        self.assertEqual(7, pyramid.get_uniform_value((32, 0, 20), (60, 50, 40)))
+        self.assertIsNone(pyramid.get_uniform_value((32, 0, 20), (70, 50, 40)))
+        self.assertIsNone(pyramid.get_uniform_value((0, 0, 0), (70, 50, 40)))
+        self.assertIsNone(pyramid.get_uniform_value((0, 0, 0), (0, 50, 40)))
+
+    def test_uniform_subvolumes_match_encoding(self):
+        data = np.zeros((48, 64, 64), dtype=np.uint8)
+        data[:, 32:, :] = 200
+        data[40:, 40:50, 3:7] = 5
+        for volume_type, downsampling in itertools.product(['image', 'segmentation'],
+                                                           ['3d', '2d']):
+            vol = local_volume.LocalVolume(data, volume_type=volume_type,
+                                           downsampling=downsampling, uniform_chunk_index=True)
+            wait_for_pyramid(vol)
+            for scale_info in vol.downsampling_scale_info.values():
+                shape = scale_info.shape
+                for data_format in ['raw', 'npz']:
+                    for start in itertools.product(*[range(0, s, 16) for s in shape]):
+                        end = tuple(min(s + 16, n) for s, n in zip(start, shape))
+                        expected = local_volume.encode_subvolume(
+                            data, volume_type, scale_info.downsample_factor, data_format, start,
+                            end)
+                        self.assertEqual(
+                            expected,
+                            vol.get_encoded_subvolume(data_format, start, end,
+                                                      scale_key=scale_info.key))
+            self.assertIsNotNone(vol.get_uniform_encoded_subvolume('raw', (0, 0, 0), (16, 16, 16)))
+            self.assertIsNone(vol.get_uniform_encoded_subvolume('raw', (0, 0, 0), (64, 64, 48)))
+
+    def test_disabled_by_default(self):
+        vol = local_volume.LocalVolume(np.zeros((16, 16, 16), dtype=np.uint8))
+        self.assertIsNone(vol._get_min_max_pyramid())
+        self.assertIsNone(vol.get_uniform_encoded_subvolume('raw', (0, 0, 0), (16, 16, 16)))
+
+    def test_single_channel(self):
+        data = np.zeros((1, 32, 16, 16), dtype=np.uint8)
+        data[0, 16:] = 3
+        sliced_keys = []
+
+        class SlicingData(object):
+            shape = data.shape
+            dtype = data.dtype
+
+            def __getitem__(self, key):
+                sliced_keys.append(key)
+                return data[key]
+
+        vol = local_volume.LocalVolume(SlicingData(), uniform_chunk_index=True)
+        wait_for_pyramid(vol)
+        # The pyramid is built from one slab of the first channel at a time.
+        self.assertEqual([(0, slice(0, 16)), (0, slice(16, 32))], sliced_keys)
+        self.assertEqual(
+            local_volume.encode_array(np.full((1, 16, 16, 16), 3, dtype=np.uint8), 'raw'),
+            vol.get_uniform_encoded_subvolume('raw', (0, 0, 16), (16, 16, 32)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,245 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Immutable hash map with structural sharing (hash array mapped trie)."""
+
+from __future__ import absolute_import
+
+_BITS = 5
+_MASK = (1 << _BITS) - 1
+_HASH_BITS = 64
+_HASH_MASK = (1 << _HASH_BITS) - 1
+
+
+def _popcount(x):
+    return bin(x).count('1')
+
+
+class _Leaf(object):
+    __slots__ = ('hash', 'key', 'value')
+
+    def __init__(self, h, key, value):
+        self.hash = h
+        self.key = key
+        self.value = value
+
+
+class _Collision(object):
+    """Entries whose keys have identical full hashes."""
+    __slots__ = ('hash', 'leaves')
+
+    def __init__(self, h, leaves):
+        self.hash = h
+        self.leaves = leaves
+
+
+class _Node(object):
+    __slots__ = ('bitmap', 'entries')
+
+    def __init__(self, bitmap, entries):
+        self.bitmap = bitmap
+        self.entries = entries
+
+
+_empty_node = _Node(0, ())
+
+
+def _make_pair(shift, a, b):
+    """Returns a node containing the two leaf/collision entries `a` and `b`."""
+    if a.hash == b.hash:
+        leaves = a.leaves if isinstance(a, _Collision) else (a, )
+        return _Collision(a.hash, leaves + (b, ))
+    a_index = (a.hash >> shift) & _MASK
+    b_index = (b.hash >> shift) & _MASK
+    if a_index == b_index:
+        return _Node(1 << a_index, (_make_pair(shift + _BITS, a, b), ))
+    if a_index > b_index:
+        a, b = b, a
+        a_index, b_index = b_index, a_index
+    return _Node((1 << a_index) | (1 << b_index), (a, b))
+
+
+def _get(node, shift, h, key, default):
+    while True:
+        bit = 1 << ((h >> shift) & _MASK)
+        if not node.bitmap & bit:
+            return default
+        entry = node.entries[_popcount(node.bitmap & (bit - 1))]
+        if isinstance(entry, _Node):
+            node = entry
+            shift += _BITS
+            continue
+        if isinstance(entry, _Leaf):
+            if entry.hash == h and entry.key == key:
+                return entry.value
+            return default
+        if entry.hash == h:
+            for leaf in entry.leaves:
+                if leaf.key == key:
+                    return leaf.value
+        return default
+
+
+def _set(node, shift, leaf):
+    """Returns `(new_node, added)`."""
+    h = leaf.hash
+    bit = 1 << ((h >> shift) & _MASK)
+    index = _popcount(node.bitmap & (bit - 1))
+    entries = node.entries
+    if not node.bitmap & bit:
+        return _Node(node.bitmap | bit, entries[:index] + (leaf, ) + entries[index:]), True
+    entry = entries[index]
+    added = True
+    if isinstance(entry, _Node):
+        new_entry, added = _set(entry, shift + _BITS, leaf)
+    elif isinstance(entry, _Leaf):
+        if entry.hash == h and entry.key == leaf.key:
+            new_entry = leaf
+            added = False
+        else:
+            new_entry = _make_pair(shift + _BITS, entry, leaf)
+    elif entry.hash == h:
+        leaves = entry.leaves
+        for i, existing in enumerate(leaves):
+            if existing.key == leaf.key:
+                new_entry = _Collision(h, leaves[:i] + (leaf, ) + leaves[i + 1:])
+                added = False
+                break
+        else:
+            new_entry = _Collision(h, leaves + (leaf, ))
+    else:
+        new_entry = _make_pair(shift + _BITS, entry, leaf)
+    return _Node(node.bitmap, entries[:index] + (new_entry, ) + entries[index + 1:]), added
+
+
+def _delete(node, shift, h, key):
+    """Returns the new node, or `node` itself if `key` is not present."""
+    bit = 1 << ((h >> shift) & _MASK)
+    if not node.bitmap & bit:
+        return node
+    index = _popcount(node.bitmap & (bit - 1))
+    entries = node.entries
+    entry = entries[index]
+    if isinstance(entry, _Node):
+        new_entry = _delete(entry, shift + _BITS, h, key)
+        if new_entry is entry:
+            return node
+        if not new_entry.entries:
+            new_entry = None
+        elif len(new_entry.entries) == 1 and not isinstance(new_entry.entries[0], _Node):
+            new_entry = new_entry.entries[0]
+    elif isinstance(entry, _Leaf):
+        if entry.hash != h or entry.key != key:
+            return node
+        new_entry = None
+    else:
+        if entry.hash != h:
+            return node
+        leaves = tuple(leaf for leaf in entry.leaves if leaf.key != key)
+        if len(leaves) == len(entry.leaves):
+            return node
+        new_entry = leaves[0] if len(leaves) == 1 else _Collision(h, leaves)
+    if new_entry is None:
+        return _Node(node.bitmap & ~bit, entries[:index] + entries[index + 1:])
+    return _Node(node.bitmap, entries[:index] + (new_entry, ) + entries[index + 1:])
+
+
+def _iter_leaves(node):
+    for entry in node.entries:
+        if isinstance(entry, _Node):
+            for leaf in _iter_leaves(entry):
+                yield leaf
+        elif isinstance(entry, _Leaf):
+            yield entry
+        else:
+            for leaf in entry.leaves:
+                yield leaf
+
+
+class PersistentMap(object):
+    """Immutable mapping.
+
+    `set` and `delete` return a new map in O(log n) time, sharing all unmodified structure with the
+    original map.
+    """
+
+    __slots__ = ('_root', '_size')
+
+    def __init__(self, items=None):
+        self._root = _empty_node
+        self._size = 0
+        if items is not None:
+            if isinstance(items, dict):
+                items = items.items()
+            root = self._root
+            size = 0
+            for key, value in items:
+                root, added = _set(root, 0, _Leaf(hash(key) & _HASH_MASK, key, value))
+                size += added
+            self._root = root
+            self._size = size
+
+    @classmethod
+    def _make(cls, root, size):
+        result = cls.__new__(cls)
+        result._root = root
+        result._size = size
+        return result
+
+    def get(self, key, default=None):
+        return _get(self._root, 0, hash(key) & _HASH_MASK, key, default)
+
+    def __getitem__(self, key):
+        missing = _missing
+        value = _get(self._root, 0, hash(key) & _HASH_MASK, key, missing)
+        if value is missing:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return _get(self._root, 0, hash(key) & _HASH_MASK, key, _missing) is not _missing
+
+    def set(self, key, value):
+        """Returns a new map with `key` mapped to `value`."""
+        root, added = _set(self._root, 0, _Leaf(hash(key) & _HASH_MASK, key, value))
+        return PersistentMap._make(root, self._size + added)
+
+    def delete(self, key):
+        """Returns a new map without `key`."""
+        root = _delete(self._root, 0, hash(key) & _HASH_MASK, key)
+        if root is self._root:
+            return self
+        return PersistentMap._make(root, self._size - 1)
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for leaf in _iter_leaves(self._root):
+            yield leaf.key
+
+    def keys(self):
+        return iter(self)
+
+    def items(self):
+        for leaf in _iter_leaves(self._root):
+            yield leaf.key, leaf.value
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+_missing = object()
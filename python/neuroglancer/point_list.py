@@ -0,0 +1,245 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compact lists of 3-d points backed by a single `(N, 3)` float32 NumPy array."""
+
+from __future__ import absolute_import
+
+import numpy as np
+
+from . import trackable_state
+from .random_token import make_random_token
+
+_empty = np.zeros((0, 3), dtype=np.float32)
+_empty.setflags(write=False)
+
+_MIN_CAPACITY = 16
+
+
+def _to_points_array(values):
+    if isinstance(values, PointList):
+        return values.array
+    if isinstance(values, LocalPointList):
+        return values.points
+    values = np.array(values, dtype=np.float32)
+    if values.size == 0:
+        return _empty
+    if values.ndim != 2 or values.shape[1] != 3:
+        raise ValueError('expected shape', (None, 3))
+    return values
+
+
+def _to_point(value):
+    value = np.asarray(value, dtype=np.float32)
+    if value.shape != (3, ):
+        raise ValueError('expected shape', (3, ))
+    return value
+
+
+class PointList(object):
+    """List of 3-d points stored as a single contiguous `(N, 3)` float32 NumPy array.
+
+    Supports the usual `list` interface, where each element is a read-only float32 array of shape
+    `(3,)`, as well as vectorized bulk operations: `extend` and slice assignment accept `(N, 3)`
+    arrays, and `del` accepts slices, index arrays and boolean masks.  Appending is amortized
+    constant time, since the array is over-allocated.
+
+    Unlike a list of lists, the elements are read-only, so `points[0][1] = 5` raises `ValueError`;
+    assign `points[0, 1] = 5` instead.  Assignment modifies the underlying array in place, unless it
+    may be referenced by an array returned by `array` or by iteration, in which case it is copied
+    first, so that those arrays remain valid after the list is modified.
+    """
+
+    supports_readonly = True
+    supports_validation = True
+
+    __slots__ = ('_data', '_length', '_readonly', '_shared')
+
+    def __init__(self, json_data=None, _readonly=False):
+        self._readonly = False
+        data = _empty if json_data is None else _to_points_array(json_data)
+        self._data = data
+        self._length = len(data)
+        # True if `_data` may be referenced by arrays returned by `array`.
+        self._shared = False
+        self._readonly = _readonly
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Creates a list from a buffer of little-endian float32 `[x, y, z]` triples."""
+        return cls(np.frombuffer(data, dtype='<f4').reshape(-1, 3))
+
+    def _check_writable(self):
+        if self._readonly:
+            raise AttributeError
+
+    def _set(self, data):
+        self._data = data
+        self._length = len(data)
+        self._shared = False
+
+    def _reserve(self, length):
+        """Returns the underlying array, reallocated if necessary to hold `length` points."""
+        data = self._data
+        if len(data) < length or not data.flags.writeable:
+            new_data = np.empty((max(_MIN_CAPACITY, 2 * length), 3), dtype=np.float32)
+            new_data[:self._length] = data[:self._length]
+            data = self._data = new_data
+        return data
+
+    def _view(self):
+        """Returns the points as a view of `_data`, for use only within this class."""
+        return self._data[:self._length]
+
+    @property
+    def array(self):
+        """Read-only `(N, 3)` float32 array of the points.
+
+        The array is not affected by later modifications of the list.
+        """
+        data = self._view()
+        data.setflags(write=False)
+        self._shared = True
+        return data
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        return iter(self.array)
+
+    def __getitem__(self, key):
+        result = self._view()[key]
+        if isinstance(result, np.ndarray):
+            # Returns a copy rather than a view, so that `__setitem__` can still modify `_data` in
+            # place.
+            result = result.copy()
+            result.setflags(write=False)
+        return result
+
+    def __setitem__(self, key, value):
+        self._check_writable()
+        data = self._data
+        if self._shared or not data.flags.writeable:
+            data = self._view().copy()
+            self._set(data)
+        data[:self._length][key] = value
+
+    def __delitem__(self, key):
+        self._check_writable()
+        self._set(np.delete(self._view(), key, axis=0))
+
+    def append(self, x):
+        self._check_writable()
+        x = _to_point(x)
+        length = self._length
+        self._reserve(length + 1)[length] = x
+        self._length = length + 1
+
+    def extend(self, values):
+        self._check_writable()
+        values = _to_points_array(values)
+        length = self._length
+        new_length = length + len(values)
+        self._reserve(new_length)[length:new_length] = values
+        self._length = new_length
+
+    def insert(self, index, x):
+        self._check_writable()
+        x = _to_point(x)
+        length = self._length
+        if index < 0:
+            index = max(0, index + length)
+        self._set(np.insert(self._view(), min(index, length), x, axis=0))
+
+    def pop(self, index=-1):
+        self._check_writable()
+        if self._length == 0:
+            raise IndexError('pop from empty list')
+        x = self._view()[index].copy()
+        del self[index]
+        return x
+
+    def clear(self):
+        self._check_writable()
+        self._set(_empty)
+
+    def __eq__(self, other):
+        if not isinstance(other, PointList):
+            try:
+                other = PointList(other)
+            except (TypeError, ValueError):
+                return NotImplemented
+        return np.array_equal(self._view(), other._view())
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def copy(self):
+        """Returns a (writable) copy of the list."""
+        return PointList(self.array)
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        """Does not preserve _readonly attribute."""
+        return self.copy()
+
+    def to_json(self):
+        """Returns the points as a list of `[x, y, z]` lists."""
+        return self._view().tolist()
+
+    def to_bytes(self):
+        """Returns the points as a buffer of little-endian float32 `[x, y, z]` triples."""
+        return self._view().astype('<f4', copy=False).tobytes()
+
+    def __repr__(self):
+        return u'PointList(%s)' % (self._view().tolist(), )
+
+
+class LocalPointList(trackable_state.ChangeNotifier):
+    """Immutable list of points that is served to the client in binary form.
+
+    When used as the `points` of a `PointAnnotationLayer`, the viewer state contains only a
+    `python://` reference, and the client fetches the points from the `/neuroglancer/points/`
+    endpoint of the server, which avoids sending large point sets with every state update.  To
+    change the points, assign a new `LocalPointList`.
+    """
+
+    def __init__(self, points):
+        super(LocalPointList, self).__init__()
+        self.token = make_random_token()
+        points = _to_points_array(points)
+        if points.flags.writeable:
+            points.setflags(write=False)
+        self.points = points
+
+    def __len__(self):
+        return len(self.points)
+
+    def to_bytes(self):
+        """Returns the points as a buffer of little-endian float32 `[x, y, z]` triples."""
+        return self.points.astype('<f4', copy=False).tobytes()
+
+    def __deepcopy__(self, memo):
+        """Since this type is immutable, it is not copied, as for `LocalVolume`."""
+        return self
+
+    def __repr__(self):
+        return u'LocalPointList(<%d points>)' % len(self)
@@ -0,0 +1,99 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for point_list.py"""
+
+from __future__ import absolute_import
+
+import copy
+import unittest
+
+import numpy as np
+
+from . import viewer_state
+from .point_list import LocalPointList, PointList
+
+
+class PointListTest(unittest.TestCase):
+    def test_basic(self):
+        p = PointList([[1, 2, 3], [4, 5, 6]])
+        self.assertEqual(2, len(p))
+        self.assertEqual(np.float32, p.array.dtype)
+        np.testing.assert_array_equal([4, 5, 6], p[1])
+        p.append([7, 8, 9])
+        p.extend(np.arange(6).reshape(2, 3))
+        self.assertEqual([[1, 2, 3], [4, 5, 6], [7, 8, 9], [0, 1, 2], [3, 4, 5]], p.to_json())
+        del p[::2]
+        self.assertEqual([[4, 5, 6], [0, 1, 2]], p.to_json())
+        p.insert(0, [1, 1, 1])
+        np.testing.assert_array_equal([0, 1, 2], p.pop())
+        self.assertEqual([[1, 1, 1], [4, 5, 6]], p.to_json())
+        with self.assertRaises(ValueError):
+            p.append([1, 2])
+
+    def test_array_unaffected_by_modifications(self):
+        p = PointList()
+        for i in range(20):
+            p.append([i, i, i])
+        a = p.array
+        q = p.copy()
+        p.append([-1, -1, -1])
+        q.append([-2, -2, -2])
+        p[0] = [5, 5, 5]
+        self.assertEqual(20, len(a))
+        np.testing.assert_array_equal([0, 0, 0], a[0])
+        np.testing.assert_array_equal([-2, -2, -2], q[20])
+        np.testing.assert_array_equal([-1, -1, -1], p[20])
+
+    def test_setitem(self):
+        p = PointList(np.zeros((4, 3)))
+        data = p._data
+        for i in range(4):
+            p[i] = [i, i, i]
+        p[1, 2] = 7
+        # Modified in place, since the array was not shared.
+        self.assertIs(data, p._data)
+        self.assertEqual([[0, 0, 0], [1, 1, 7], [2, 2, 2], [3, 3, 3]], p.to_json())
+        a = p.array
+        p[0, 0] = 5
+        p[1:3] = 9
+        self.assertIsNot(data, p._data)
+        self.assertEqual([[5, 0, 0], [9, 9, 9], [9, 9, 9], [3, 3, 3]], p.to_json())
+        np.testing.assert_array_equal([[0, 0, 0], [1, 1, 7]], a[:2])
+        # Elements are read-only copies.
+        row = p[3]
+        with self.assertRaises(ValueError):
+            row[1] = 5
+        p[3] = [4, 4, 4]
+        np.testing.assert_array_equal([3, 3, 3], row)
+
+    def test_bytes(self):
+        p = PointList([[1.5, 2, 3], [4, 5, 6]])
+        self.assertEqual(24, len(p.to_bytes()))
+        self.assertEqual(p, PointList.from_bytes(p.to_bytes()))
+
+    def test_layer(self):
+        layer = viewer_state.PointAnnotationLayer(points=[[1, 2, 3]])
+        self.assertIsInstance(layer.points, PointList)
+        layer.points.append([4, 5, 6])
+        self.assertEqual([[1, 2, 3], [4, 5, 6]], layer.to_json()['points'])
+        readonly_layer = viewer_state.PointAnnotationLayer(layer.to_json(), _readonly=True)
+        with self.assertRaises(AttributeError):
+            readonly_layer.points.append([0, 0, 0])
+        local_points = LocalPointList(np.zeros((10, 3)))
+        layer.points = local_points
+        self.assertIs(local_points, copy.deepcopy(layer).points)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,239 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Speculative encoding of the volume chunks that are likely to be requested next."""
+
+from __future__ import absolute_import, division
+
+import collections
+import concurrent.futures
+import multiprocessing
+import threading
+
+from . import lru_cache
+
+DEFAULT_MAX_CACHE_BYTES = 256 * 1024 * 1024
+
+# Maximum number of chunks of the next finer scale that are prefetched for a single request.
+MAX_FINER_SCALE_CHUNKS = 8
+
+
+def get_finer_scale(vol, scale_key):
+    """Returns the scale info for the scale of `vol` that is next finer than `scale_key`, or None."""
+    factor = vol.downsampling_scale_info[scale_key].downsample_factor
+    best = None
+    for info in vol.downsampling_scale_info.values():
+        finer_factor = info.downsample_factor
+        if finer_factor == factor or any(f % g != 0 for f, g in zip(factor, finer_factor)):
+            continue
+        if best is None or (finer_factor[0] * finer_factor[1] * finer_factor[2] >
+                            best.downsample_factor[0] * best.downsample_factor[1] *
+                            best.downsample_factor[2]):
+            best = info
+    return best
+
+
+def get_prefetch_candidates(vol, scale_key, start, end):
+    """Returns a list of `(scale_key, start, end)` chunks likely to be requested after the specified
+    chunk.
+
+    These are the neighbors of the chunk within its plane, and the chunks of the next finer scale
+    covering the same region.  For chunks that are flat along one axis (as used by the 2-d slice
+    views), the plane consists of the other two axes; otherwise, neighbors along all three axes are
+    included.
+    """
+    shape = vol.downsampling_scale_info[scale_key].shape
+    size = [e - s for s, e in zip(start, end)]
+    if min(size) <= 0:
+        return []
+    max_size = max(size)
+    plane_axes = [i for i in range(3) if size[i] * 4 > max_size]
+    candidates = []
+    for i in plane_axes:
+        for direction in (-1, 1):
+            neighbor_start = list(start)
+            neighbor_end = list(end)
+            neighbor_start[i] = start[i] + direction * size[i]
+            if neighbor_start[i] < 0 or neighbor_start[i] >= shape[i]:
+                continue
+            neighbor_end[i] = min(neighbor_start[i] + size[i], shape[i])
+            candidates.append((scale_key, tuple(neighbor_start), tuple(neighbor_end)))
+
+    finer = get_finer_scale(vol, scale_key)
+    if finer is not None:
+        factor = vol.downsampling_scale_info[scale_key].downsample_factor
+        ranges = []
+        for i in range(3):
+            ratio = factor[i] // finer.downsample_factor[i]
+            region_start = start[i] * ratio
+            region_end = min(end[i] * ratio, finer.shape[i])
+            ranges.append(range((region_start // size[i]) * size[i], region_end, size[i]))
+        if len(ranges[0]) * len(ranges[1]) * len(ranges[2]) <= MAX_FINER_SCALE_CHUNKS:
+            for x in ranges[0]:
+                for y in ranges[1]:
+                    for z in ranges[2]:
+                        chunk_start = (x, y, z)
+                        chunk_end = tuple(
+                            min(s + n, m) for s, n, m in zip(chunk_start, size, finer.shape))
+                        candidates.append((finer.key, chunk_start, chunk_end))
+    return candidates
+
+
+def _get_chunk_key(vol, data_format, scale_key, start, end):
+    return (vol.token, vol.change_count, data_format, scale_key, tuple(start), tuple(end))
+
+
+def _get_result_size(result):
+    return len(result[0])
+
+
+class ChunkPrefetcher(object):
+    """Serves encoded chunk requests, speculatively encoding the chunks likely to be requested next.
+
+    Prefetches run only while no requests are being encoded, and prefetches that have not yet
+    started are cancelled when a new request arrives.  Prefetched chunks are kept in a cache bounded
+    by `max_cache_bytes`.  Entries are keyed by the volume `change_count`, so that they are not used
+    after the volume is invalidated.
+
+    @param submit: Function `(vol, data_format, start, end, scale_key)` that returns a future for the
+        result of `vol.get_encoded_subvolume`.
+    """
+
+    def __init__(self,
+                 submit,
+                 max_cache_bytes=DEFAULT_MAX_CACHE_BYTES,
+                 max_queued_prefetches=256,
+                 max_concurrent_prefetches=None):
+        if max_concurrent_prefetches is None:
+            max_concurrent_prefetches = max(1, multiprocessing.cpu_count() // 2)
+        self._submit = submit
+        self.max_queued_prefetches = max_queued_prefetches
+        self.max_concurrent_prefetches = max_concurrent_prefetches
+        self.cache = lru_cache.LruCache(max_cache_bytes, get_size=_get_result_size)
+        self._lock = threading.Lock()
+        self._active_requests = 0
+        # Maps chunk key to the future of each prefetch that has been submitted.
+        self._active_prefetches = {}
+        # Maps chunk key to the arguments of each queued prefetch, most recently requested last.
+        self._queue = collections.OrderedDict()
+        self._stats = collections.Counter()
+
+    def submit(self, vol, data_format, start, end, scale_key):
+        """Returns a future for the result of `vol.get_encoded_subvolume`."""
+        key = _get_chunk_key(vol, data_format, scale_key, start, end)
+        future = None
+        with self._lock:
+            self._stats['requests'] += 1
+            result = self.cache.get(key)
+            if result is not None:
+                self._stats['hits'] += 1
+                future = concurrent.futures.Future()
+                future.set_result(result)
+            else:
+                # A request for a chunk that is being prefetched takes over the prefetch.
+                future = self._active_prefetches.pop(key, None)
+                if future is not None:
+                    self._stats['pending_hits'] += 1
+                else:
+                    self._stats['misses'] += 1
+                    self._queue.pop(key, None)
+                    self._cancel_prefetches()
+                self._active_requests += 1
+            self._enqueue_candidates(vol, data_format, scale_key, start, end)
+        if result is not None:
+            self._start_prefetches()
+            return future
+        if future is None:
+            future = self._submit(vol, data_format, start, end, scale_key)
+        future.add_done_callback(self._handle_request_done)
+        return future
+
+    def _cancel_prefetches(self):
+        for key, future in list(self._active_prefetches.items()):
+            if future.cancel():
+                del self._active_prefetches[key]
+                self._stats['prefetches_cancelled'] += 1
+
+    def _enqueue_candidates(self, vol, data_format, scale_key, start, end):
+        if scale_key not in vol.downsampling_scale_info:
+            return
+        queue = self._queue
+        for candidate_scale_key, candidate_start, candidate_end in get_prefetch_candidates(
+                vol, scale_key, start, end):
+            key = _get_chunk_key(vol, data_format, candidate_scale_key, candidate_start,
+                                 candidate_end)
+            if key in self._active_prefetches or key in self.cache:
+                continue
+            queue.pop(key, None)
+            queue[key] = (vol, data_format, candidate_start, candidate_end, candidate_scale_key)
+        while len(queue) > self.max_queued_prefetches:
+            queue.popitem(last=False)
+
+    def _handle_request_done(self, future):
+        with self._lock:
+            self._active_requests -= 1
+        self._start_prefetches()
+
+    def _start_prefetches(self):
+        to_submit = []
+        with self._lock:
+            while (self._active_requests == 0 and self._queue and
+                   len(self._active_prefetches) + len(to_submit) < self.max_concurrent_prefetches):
+                key, args = self._queue.popitem(last=True)
+                if key in self.cache:
+                    continue
+                to_submit.append((key, args))
+                self._stats['prefetches'] += 1
+        # The futures are submitted without holding the lock, since callbacks of futures that are
+        # already done are invoked immediately.
+        for key, args in to_submit:
+            try:
+                future = self._submit(*args)
+            except RuntimeError:
+                # Executor has been shut down.
+                return
+            with self._lock:
+                self._active_prefetches[key] = future
+            future.add_done_callback(lambda f, key=key: self._handle_prefetch_done(key, f))
+
+    def _handle_prefetch_done(self, key, future):
+        if future.cancelled():
+            return
+        with self._lock:
+            if self._active_prefetches.get(key) is future:
+                del self._active_prefetches[key]
+        try:
+            result = future.result()
+        except ValueError:
+            with self._lock:
+                self._stats['prefetches_failed'] += 1
+        else:
+            self.cache.set(key, result)
+        self._start_prefetches()
+
+    def stats(self):
+        """Returns a dict of request and prefetch counts.
+
+        `hit_rate` is the fraction of requests that were served by a completed or in-progress
+        prefetch.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            for name in ('requests', 'hits', 'pending_hits', 'misses', 'prefetches',
+                         'prefetches_cancelled', 'prefetches_failed'):
+                stats.setdefault(name, 0)
+            stats['queued_prefetches'] = len(self._queue)
+        stats['cache_bytes'] = self.cache.total_bytes
+        requests = stats['requests']
+        stats['hit_rate'] = (stats['hits'] + stats['pending_hits']) / requests if requests else 0.0
+        return stats
@@ -0,0 +1,85 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for prefetch.py"""
+
+from __future__ import absolute_import
+
+import concurrent.futures
+import unittest
+
+import numpy as np
+
+from . import local_volume, lru_cache, prefetch
+
+
+class LruCacheTest(unittest.TestCase):
+    def test_eviction(self):
+        cache = lru_cache.LruCache(max_bytes=5)
+        cache.set('a', b'xx')
+        cache.set('b', b'yy')
+        self.assertEqual(b'xx', cache.get('a'))
+        cache.set('c', b'zz')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(b'xx', cache.get('a'))
+        self.assertEqual(4, cache.total_bytes)
+        cache.set('d', b'too long')
+        self.assertNotIn('d', cache)
+
+
+class PrefetchTest(unittest.TestCase):
+    def setUp(self):
+        data = np.zeros((16, 64, 64), dtype=np.uint8)
+        self.vol = local_volume.LocalVolume(
+            data, volume_type='image', downsampling='3d', max_downsampled_size=16)
+
+    def test_candidates(self):
+        candidates = prefetch.get_prefetch_candidates(self.vol, '1,1,1', (16, 16, 4), (32, 32, 5))
+        self.assertEqual(
+            set([('1,1,1', (0, 16, 4), (16, 32, 5)), ('1,1,1', (32, 16, 4), (48, 32, 5)),
+                 ('1,1,1', (16, 0, 4), (32, 16, 5)), ('1,1,1', (16, 32, 4), (32, 48, 5))]),
+            set(candidates))
+        candidates = prefetch.get_prefetch_candidates(self.vol, '2,2,2', (0, 0, 2), (16, 16, 3))
+        self.assertIn(('1,1,1', (16, 16, 4), (32, 32, 5)), candidates)
+        self.assertEqual(8, len([c for c in candidates if c[0] == '1,1,1']))
+
+    def test_prefetch(self):
+        submitted = []
+
+        def submit(vol, data_format, start, end, scale_key):
+            submitted.append((scale_key, start, end))
+            future = concurrent.futures.Future()
+            future.set_result(
+                vol.get_encoded_subvolume(data_format, start, end, scale_key=scale_key))
+            return future
+
+        prefetcher = prefetch.ChunkPrefetcher(submit, max_concurrent_prefetches=1)
+        vol = self.vol
+        self.assertEqual(
+            vol.get_encoded_subvolume('raw', (16, 16, 4), (32, 32, 5)),
+            prefetcher.submit(vol, 'raw', (16, 16, 4), (32, 32, 5), '1,1,1').result())
+        stats = prefetcher.stats()
+        self.assertEqual(1, stats['misses'])
+        self.assertEqual(4, stats['prefetches'])
+        self.assertEqual(5, len(submitted))
+        self.assertEqual(
+            vol.get_encoded_subvolume('raw', (32, 16, 4), (48, 32, 5)),
+            prefetcher.submit(vol, 'raw', (32, 16, 4), (48, 32, 5), '1,1,1').result())
+        self.assertEqual(1, prefetcher.stats()['hits'])
+        vol.invalidate()
+        prefetcher.submit(vol, 'raw', (16, 16, 4), (32, 32, 5), '1,1,1').result()
+        self.assertEqual(2, prefetcher.stats()['misses'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,262 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Encodes LocalVolume chunks in a pool of worker processes.
+
+The volume data is made available to the workers through shared memory (or a memory-mapped file),
+so that each request only needs to send the chunk coordinates to a worker.
+"""
+
+from __future__ import absolute_import
+
+import collections
+import concurrent.futures
+import mmap
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import weakref
+
+import numpy as np
+
+from . import local_volume, metrics
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+SharedArrayDescriptor = collections.namedtuple(
+    'SharedArrayDescriptor', ['token', 'generation', 'kind', 'name', 'offset', 'shape', 'dtype'])
+
+
+class SharedArray(object):
+    """Copy of an array that can be attached to from other processes.
+
+    If `array` is an `np.memmap` of a file, the file itself is shared and no copy is made.
+    """
+
+    def __init__(self, array, token, generation):
+        self._shm = None
+        self._temp_path = None
+        # Views of an np.memmap are also np.memmap instances, but their `offset` attribute refers to
+        # the original array.
+        if (isinstance(array, np.memmap) and isinstance(array.base, mmap.mmap) and
+                array.filename is not None and array.flags.c_contiguous):
+            array.flush()
+            kind = 'file'
+            name = array.filename
+            offset = array.offset
+        else:
+            array = np.asarray(array)
+            if array.dtype == np.float64:
+                array = array.astype(np.float32)
+            offset = 0
+            if shared_memory is not None:
+                self._shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+                kind = 'shm'
+                name = self._shm.name
+                shared = np.ndarray(array.shape, dtype=array.dtype, buffer=self._shm.buf)
+            else:
+                fd, self._temp_path = tempfile.mkstemp(prefix='neuroglancer-', suffix='.dat')
+                os.close(fd)
+                kind = 'file'
+                name = self._temp_path
+                shared = np.memmap(name, dtype=array.dtype, mode='w+', shape=array.shape)
+            shared[...] = array
+            if kind == 'file':
+                shared.flush()
+            del shared
+        self.descriptor = SharedArrayDescriptor(token=token, generation=generation, kind=kind,
+                                                name=name, offset=offset, shape=array.shape,
+                                                dtype=array.dtype.str)
+
+    def release(self):
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+        if self._temp_path is not None:
+            try:
+                os.remove(self._temp_path)
+            except OSError:
+                pass
+            self._temp_path = None
+
+
+def attach_shared_array(descriptor):
+    """Returns `(array, handle)` for a `SharedArrayDescriptor`.
+
+    The handle, if not None, must be closed once `array` is no longer used.
+    """
+    dtype = np.dtype(descriptor.dtype)
+    if descriptor.kind == 'shm':
+        shm = shared_memory.SharedMemory(name=descriptor.name)
+        array = np.ndarray(descriptor.shape, dtype=dtype, buffer=shm.buf)
+        array.setflags(write=False)
+        return array, shm
+    array = np.memmap(descriptor.name, dtype=dtype, mode='r', offset=descriptor.offset,
+                      shape=descriptor.shape)
+    return array, None
+
+
+# Maximum number of arrays that remain attached in each worker process.
+max_worker_arrays = 16
+
+# Arrays attached by a worker process, indexed by volume token, in least-recently-used order.
+_worker_arrays = collections.OrderedDict()
+
+
+def _get_worker_array(descriptor):
+    entry = _worker_arrays.pop(descriptor.token, None)
+    if entry is None or entry[0] != descriptor:
+        if entry is not None:
+            handle = entry[2]
+            entry = None
+            _close_handle(handle)
+        while len(_worker_arrays) >= max_worker_arrays:
+            _close_handle(_worker_arrays.popitem(last=False)[1][2])
+        array, handle = attach_shared_array(descriptor)
+        entry = (descriptor, array, handle)
+    _worker_arrays[descriptor.token] = entry
+    return entry[1]
+
+
+def _close_handle(handle):
+    if handle is None:
+        return
+    try:
+        handle.close()
+    except BufferError:
+        # Still referenced by an array that has not been garbage collected.
+        pass
+
+
+def _encode_subvolume(descriptor, volume_type, downsample_factor, data_format, start, end):
+    return local_volume.encode_subvolume(
+        _get_worker_array(descriptor), volume_type, downsample_factor, data_format, start, end)
+
+
+def _get_mp_context():
+    # Forking a process that runs the server IO loop and other threads is unsafe.
+    if sys.version_info >= (3, 7):
+        return dict(mp_context=multiprocessing.get_context('spawn'))
+    return dict()
+
+
+class ProcessPoolChunkEncoder(object):
+    """Encodes subvolumes of `LocalVolume` objects in a pool of worker processes.
+
+    The data of each volume is copied into shared memory the first time it is requested, and again
+    after each call to `LocalVolume.invalidate`, so that in-place modifications are picked up.
+    Volumes backed by an `np.memmap` are shared without copying.  Volumes whose data is not a NumPy
+    array (e.g. an HDF5 dataset) are encoded by `fallback_executor` instead.
+
+    Since the worker processes are started with the 'spawn' method, scripts that use this must
+    guard their main code with `if __name__ == '__main__':`.
+    """
+
+    def __init__(self, num_processes=None, fallback_executor=None):
+        if num_processes is None:
+            num_processes = multiprocessing.cpu_count()
+        self.num_processes = num_processes
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=num_processes, **_get_mp_context())
+        self.fallback_executor = fallback_executor
+        self._lock = threading.Lock()
+        self._shared_arrays = {}
+
+    def _get_descriptor(self, vol):
+        token = vol.token
+        generation = vol.change_count
+        with self._lock:
+            entry = self._shared_arrays.get(token)
+            if entry is not None:
+                if entry[0].descriptor.generation == generation:
+                    return entry[0].descriptor
+                entry[0].release()
+            shared = SharedArray(vol.data, token=token, generation=generation)
+            self._shared_arrays[token] = (shared,
+                                          weakref.ref(vol, lambda _: self._release(token, shared)))
+            return shared.descriptor
+
+    def _release(self, token, shared):
+        with self._lock:
+            entry = self._shared_arrays.get(token)
+            if entry is not None and entry[0] is shared:
+                del self._shared_arrays[token]
+        shared.release()
+
+    def submit(self, vol, data_format, start, end, scale_key='1,1,1'):
+        """Returns a future for the result of `vol.get_encoded_subvolume`.
+
+        Since this is normally called from the server IO loop, the work that may block, namely the
+        check for a uniform subvolume and the copy of the volume data into shared memory, is done
+        by `fallback_executor`, which then submits the encoding to the process pool.
+        """
+        if not isinstance(vol.data, np.ndarray):
+            return self.fallback_executor.submit(
+                vol.get_encoded_subvolume, data_format, start, end, scale_key=scale_key)
+        future = concurrent.futures.Future()
+
+        def prepare():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                scale_info = vol.get_scale_info(scale_key)
+                local_volume.check_subvolume_bounds(scale_info, start, end)
+                uniform_result = vol.get_uniform_encoded_subvolume(
+                    data_format, start, end, scale_key=scale_key)
+                if uniform_result is not None:
+                    future.set_result(uniform_result)
+                    return
+                descriptor = self._get_descriptor(vol)
+                start_time = metrics.default_timer()
+                pool_future = self.executor.submit(_encode_subvolume, descriptor, vol.volume_type,
+                                                   scale_info.downsample_factor, data_format,
+                                                   start, end)
+            except Exception as e:  # pylint: disable=broad-except
+                future.set_exception(e)
+                return
+
+            def handle_done(pool_future):
+                # The individual stages run in the worker process, so only the total time is
+                # recorded.
+                metrics.subvolume_stage_seconds.observe(
+                    metrics.default_timer() - start_time, stage='process_pool')
+                if pool_future.cancelled():
+                    future.set_exception(concurrent.futures.CancelledError())
+                    return
+                e = pool_future.exception()
+                if e is not None:
+                    future.set_exception(e)
+                else:
+                    future.set_result(pool_future.result())
+
+            pool_future.add_done_callback(handle_done)
+
+        if self.fallback_executor is None:
+            prepare()
+        else:
+            self.fallback_executor.submit(prepare)
+        return future
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+        with self._lock:
+            entries = list(self._shared_arrays.values())
+            self._shared_arrays.clear()
+        for shared, _ in entries:
+            shared.release()
@@ -0,0 +1,112 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for process_pool.py"""
+
+from __future__ import absolute_import
+
+import concurrent.futures
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from . import local_volume, process_pool
+
+
+class SharedArrayTest(unittest.TestCase):
+    def test_copy(self):
+        a = np.arange(60, dtype=np.uint16).reshape(3, 4, 5)
+        shared = process_pool.SharedArray(a, token='a', generation=0)
+        try:
+            b, handle = process_pool.attach_shared_array(shared.descriptor)
+            np.testing.assert_array_equal(a, b)
+            del b
+            if handle is not None:
+                handle.close()
+        finally:
+            shared.release()
+
+    def test_memmap(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, 'data')
+            a = np.memmap(path, dtype=np.uint8, mode='w+', shape=(2, 3, 4))
+            a[...] = np.arange(24).reshape(a.shape)
+            shared = process_pool.SharedArray(a, token='a', generation=0)
+            self.assertEqual('file', shared.descriptor.kind)
+            self.assertEqual(a.filename, shared.descriptor.name)
+            b, _ = process_pool.attach_shared_array(shared.descriptor)
+            np.testing.assert_array_equal(a, b)
+            del a, b
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+class ProcessPoolChunkEncoderTest(unittest.TestCase):
+    def test_encode(self):
+        data = np.arange(8 * 16 * 16, dtype=np.uint8).reshape(8, 16, 16)
+        vol = local_volume.LocalVolume(data, encoding='raw', volume_type='image',
+                                       downsampling=None)
+        encoder = process_pool.ProcessPoolChunkEncoder(num_processes=1)
+        try:
+            start = (0, 2, 1)
+            end = (16, 10, 7)
+            self.assertEqual(
+                vol.get_encoded_subvolume('raw', start, end),
+                encoder.submit(vol, 'raw', start, end).result())
+            data[...] = 0
+            vol.invalidate()
+            self.assertEqual(
+                vol.get_encoded_subvolume('raw', start, end),
+                encoder.submit(vol, 'raw', start, end).result())
+            self.assertRaises(ValueError,
+                              encoder.submit(vol, 'raw', start, (17, 10, 7)).result)
+        finally:
+            encoder.shutdown()
+
+    def test_prepare_on_fallback_executor(self):
+        data = np.zeros((8, 16, 16), dtype=np.uint8)
+        data[:4] = 1
+        vol = local_volume.LocalVolume(data, encoding='raw', volume_type='segmentation',
+                                       downsampling=None)
+        fallback_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        encoder = process_pool.ProcessPoolChunkEncoder(num_processes=1,
+                                                       fallback_executor=fallback_executor)
+        threads = []
+        get_descriptor = encoder._get_descriptor
+
+        def wrapped_get_descriptor(vol):
+            threads.append(threading.current_thread())
+            return get_descriptor(vol)
+
+        encoder._get_descriptor = wrapped_get_descriptor
+        try:
+            for start, end in [((0, 0, 0), (16, 16, 8)), ((0, 0, 0), (8, 8, 4))]:
+                self.assertEqual(
+                    vol.get_encoded_subvolume('raw', start, end),
+                    encoder.submit(vol, 'raw', start, end).result())
+            self.assertNotEqual([], threads)
+            self.assertNotIn(threading.current_thread(), threads)
+            self.assertRaises(ValueError,
+                              encoder.submit(vol, 'raw', (0, 0, 0), (17, 16, 8)).result)
+        finally:
+            encoder.shutdown()
+            fallback_executor.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
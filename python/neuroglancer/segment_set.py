@@ -0,0 +1,275 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Compact set of uint64 segment ids backed by a sorted NumPy array."""
+
+from __future__ import absolute_import
+
+import numpy as np
+import six
+
+_empty = np.zeros(0, dtype=np.uint64)
+
+
+def _to_uint64_array(values):
+    if isinstance(values, SegmentSet):
+        return values.array
+    if isinstance(values, np.ndarray):
+        return np.asarray(values, dtype=np.uint64).ravel()
+    if isinstance(values, (six.integer_types, np.integer) + six.string_types):
+        values = [values]
+    elif not isinstance(values, (list, tuple)):
+        values = list(values)
+    if not values:
+        return _empty
+    return np.array(values, dtype=np.uint64).ravel()
+
+
+def _to_uint64_scalar(x):
+    """Returns `x` as a `np.uint64`, or None if it is not an integer in the uint64 range.
+
+    Like membership in a `set` of integers, values of other types, such as floats, never match.
+    """
+    if not isinstance(x, six.integer_types + (np.integer, )):
+        return None
+    if x < 0 or x > 0xffffffffffffffff:
+        return None
+    return np.uint64(x)
+
+
+class SegmentSet(object):
+    """Set of uint64 segment ids stored as a sorted, duplicate-free NumPy array.
+
+    Supports the usual `set` interface, as well as vectorized bulk operations and direct conversion
+    to and from JSON (a list of decimal strings) and binary (little-endian uint64) representations.
+
+    Individual additions are buffered and merged into the sorted array in bulk the next time the
+    set is read, so that adding elements one at a time remains efficient.
+    """
+
+    supports_readonly = True
+    supports_validation = True
+
+    __slots__ = ('_data', '_pending', '_readonly')
+
+    def __init__(self, json_data=None, _readonly=False):
+        self._readonly = False
+        self._pending = []
+        if json_data is None:
+            self._data = _empty
+        elif isinstance(json_data, SegmentSet):
+            self._data = json_data.array
+        else:
+            self._data = np.unique(_to_uint64_array(json_data))
+        self._readonly = _readonly
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Creates a set from a buffer of little-endian uint64 values."""
+        return cls(np.frombuffer(data, dtype='<u8'))
+
+    def _flush(self):
+        pending = self._pending
+        if pending:
+            self._data = np.union1d(self._data, np.array(pending, dtype=np.uint64))
+            del pending[:]
+        return self._data
+
+    def _check_writable(self):
+        if self._readonly:
+            raise AttributeError
+
+    @property
+    def array(self):
+        """Read-only sorted uint64 array of the elements."""
+        data = self._flush()
+        if data.flags.writeable:
+            data.setflags(write=False)
+        return data
+
+    def __len__(self):
+        return len(self._flush())
+
+    def __iter__(self):
+        return iter(self._flush())
+
+    def __contains__(self, x):
+        data = self._flush()
+        x = _to_uint64_scalar(x)
+        if x is None:
+            return False
+        i = np.searchsorted(data, x)
+        return i < len(data) and data[i] == x
+
+    def contains(self, values):
+        """Vectorized membership test.  Returns a boolean array of the same shape as `values`."""
+        values = np.asarray(values, dtype=np.uint64)
+        data = self._flush()
+        if len(data) == 0:
+            return np.zeros(values.shape, dtype=bool)
+        i = np.minimum(np.searchsorted(data, values), len(data) - 1)
+        return data[i] == values
+
+    def add(self, x):
+        self._check_writable()
+        self._pending.append(np.uint64(x))
+
+    def update(self, *others):
+        self._check_writable()
+        data = self._flush()
+        for other in others:
+            data = np.union1d(data, _to_uint64_array(other))
+        self._data = data
+
+    def discard(self, x):
+        self._check_writable()
+        data = self._flush()
+        x = _to_uint64_scalar(x)
+        if x is None:
+            return
+        i = np.searchsorted(data, x)
+        if i < len(data) and data[i] == x:
+            self._data = np.delete(data, i)
+
+    def remove(self, x):
+        if x not in self:
+            raise KeyError(x)
+        self.discard(x)
+
+    def pop(self):
+        self._check_writable()
+        data = self._flush()
+        if len(data) == 0:
+            raise KeyError('pop from an empty set')
+        self._data = data[:-1]
+        return data[-1]
+
+    def clear(self):
+        self._check_writable()
+        del self._pending[:]
+        self._data = _empty
+
+    def difference_update(self, *others):
+        self._check_writable()
+        data = self._flush()
+        for other in others:
+            data = np.setdiff1d(data, _to_uint64_array(other))
+        self._data = data
+
+    def intersection_update(self, *others):
+        self._check_writable()
+        data = self._flush()
+        for other in others:
+            data = np.intersect1d(data, _to_uint64_array(other), assume_unique=False)
+        self._data = data
+
+    def symmetric_difference_update(self, other):
+        self._check_writable()
+        self._data = np.setxor1d(self._flush(), np.unique(_to_uint64_array(other)),
+                                 assume_unique=True)
+
+    def _new(self, data):
+        result = SegmentSet()
+        result._data = data
+        return result
+
+    def union(self, *others):
+        result = self.copy()
+        result.update(*others)
+        return result
+
+    def difference(self, *others):
+        result = self.copy()
+        result.difference_update(*others)
+        return result
+
+    def intersection(self, *others):
+        result = self.copy()
+        result.intersection_update(*others)
+        return result
+
+    def symmetric_difference(self, other):
+        result = self.copy()
+        result.symmetric_difference_update(other)
+        return result
+
+    def issubset(self, other):
+        return bool(np.all(SegmentSet(other).contains(self._flush())))
+
+    def issuperset(self, other):
+        return bool(np.all(self.contains(_to_uint64_array(other))))
+
+    __or__ = union
+    __sub__ = difference
+    __and__ = intersection
+    __xor__ = symmetric_difference
+    __le__ = issubset
+    __ge__ = issuperset
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __isub__(self, other):
+        self.difference_update(other)
+        return self
+
+    def __iand__(self, other):
+        self.intersection_update(other)
+        return self
+
+    def __ixor__(self, other):
+        self.symmetric_difference_update(other)
+        return self
+
+    def __eq__(self, other):
+        if not isinstance(other, SegmentSet):
+            if not isinstance(other, (set, frozenset)):
+                return NotImplemented
+            other = SegmentSet(other)
+        return np.array_equal(self._flush(), other._flush())
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    __hash__ = None
+
+    def __bool__(self):
+        return len(self) > 0
+
+    __nonzero__ = __bool__
+
+    def copy(self):
+        """Returns a (writable) copy of the set."""
+        return self._new(self._flush())
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        """Does not preserve _readonly attribute."""
+        return self.copy()
+
+    def to_json(self):
+        """Returns the elements as a sorted list of decimal strings."""
+        return self._flush().astype(str).tolist()
+
+    def to_bytes(self):
+        """Returns the elements as a buffer of sorted little-endian uint64 values."""
+        return self._flush().astype('<u8', copy=False).tobytes()
+
+    def __repr__(self):
+        return u'SegmentSet(%s)' % (self._flush().tolist(), )
@@ -0,0 +1,89 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for segment_set.py"""
+
+from __future__ import absolute_import
+
+import copy
+import unittest
+
+import numpy as np
+
+from . import segment_set, viewer_state
+
+
+class SegmentSetTest(unittest.TestCase):
+    def test_basic(self):
+        s = segment_set.SegmentSet()
+        self.assertEqual(0, len(s))
+        for x in [5, 3, 5, 18446744073709551615]:
+            s.add(x)
+        self.assertEqual(3, len(s))
+        self.assertIn(3, s)
+        self.assertIn(18446744073709551615, s)
+        self.assertNotIn(4, s)
+        self.assertNotIn(3.5, s)
+        self.assertNotIn(-1, s)
+        s.discard(3.5)
+        self.assertIn(3, s)
+        self.assertEqual([3, 5, 18446744073709551615], [int(x) for x in s])
+        s.discard(4)
+        s.remove(5)
+        self.assertRaises(KeyError, s.remove, 5)
+        self.assertEqual(set([3, 18446744073709551615]), set(s))
+        s.clear()
+        self.assertFalse(s)
+
+    def test_json(self):
+        s = segment_set.SegmentSet(['10', '2', 7])
+        self.assertEqual(['2', '7', '10'], s.to_json())
+        self.assertEqual(s, segment_set.SegmentSet(s.to_json()))
+        self.assertEqual(s, set([2, 7, 10]))
+
+    def test_bytes(self):
+        s = segment_set.SegmentSet([1, 2, 1 << 63])
+        self.assertEqual(s, segment_set.SegmentSet.from_bytes(s.to_bytes()))
+
+    def test_vectorized(self):
+        a = segment_set.SegmentSet(np.arange(10, dtype=np.uint64))
+        b = segment_set.SegmentSet([5, 20])
+        self.assertEqual(set(range(10)) | set([20]), set(int(x) for x in a | b))
+        self.assertEqual(set(range(10)) - set([5]), set(int(x) for x in a - b))
+        self.assertEqual(set([5]), set(int(x) for x in a & b))
+        self.assertEqual([True, False], a.contains([5, 20]).tolist())
+        a.update(np.array([100, 3], dtype=np.uint64))
+        self.assertEqual(11, len(a))
+        a.difference_update([0, 1, 1])
+        self.assertEqual(9, len(a))
+
+    def test_readonly(self):
+        s = segment_set.SegmentSet([1, 2], _readonly=True)
+        self.assertRaises(AttributeError, s.add, 3)
+        c = copy.deepcopy(s)
+        c.add(3)
+        self.assertEqual(3, len(c))
+        self.assertEqual(2, len(s))
+
+    def test_layer(self):
+        layer = viewer_state.SegmentationLayer()
+        layer.segments.add(5)
+        layer.segments.update([3, 4])
+        self.assertEqual(['3', '4', '5'], layer.to_json()['segments'])
+        layer.segments = [1]
+        self.assertIsInstance(layer.segments, segment_set.SegmentSet)
+        self.assertEqual(['1'], layer.to_json()['segments'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Per-segment voxel counts, bounding boxes and centroids of a segmentation volume."""
+
+from __future__ import absolute_import, division
+
+import collections
+
+import numpy as np
+
+# Maximum number of voxels read and sorted at once by `compute_segment_statistics`.
+DEFAULT_MAX_VOXELS_PER_SLAB = 1 << 20
+
+SegmentInfo = collections.namedtuple(
+    'SegmentInfo', ['voxel_count', 'bounding_box_start', 'bounding_box_end', 'centroid'])
+
+
+def _reduce_groups(ids, counts, starts, ends, sums):
+    """Combines the rows with equal ids.
+
+    @param ids: 1-d array of segment ids.
+    @param counts: 1-d array of voxel counts.
+    @param starts: `(N, 3)` array of inclusive lower bounds.
+    @param ends: `(N, 3)` array of inclusive upper bounds.
+    @param sums: `(N, 3)` float64 array of coordinate sums.
+    """
+    order = np.argsort(ids, kind='stable')
+    ids = ids[order]
+    group_starts = np.flatnonzero(np.concatenate([[True], ids[1:] != ids[:-1]]))
+    return (ids[group_starts], np.add.reduceat(counts[order], group_starts),
+            np.minimum.reduceat(starts[order], group_starts, axis=0),
+            np.maximum.reduceat(ends[order], group_starts, axis=0),
+            np.add.reduceat(sums[order], group_starts, axis=0))
+
+
+def _compute_slab_statistics(slab, z_offset):
+    labels = slab.ravel()
+    order = np.argsort(labels, kind='stable')
+    sorted_labels = labels[order]
+    group_starts = np.flatnonzero(
+        np.concatenate([[True], sorted_labels[1:] != sorted_labels[:-1]]))
+    ids = sorted_labels[group_starts]
+    counts = np.diff(np.append(group_starts, len(labels)))
+    z, y, x = np.unravel_index(order, slab.shape)
+    z += z_offset
+    coordinates = (x, y, z)
+    starts = np.stack([np.minimum.reduceat(c, group_starts) for c in coordinates], axis=1)
+    ends = np.stack([np.maximum.reduceat(c, group_starts) for c in coordinates], axis=1)
+    sums = np.stack([np.add.reduceat(c.astype(np.float64), group_starts) for c in coordinates],
+                    axis=1)
+    return ids, counts, starts, ends, sums
+
+
+def compute_segment_statistics(data, max_voxels_per_slab=DEFAULT_MAX_VOXELS_PER_SLAB):
+    """Computes the statistics of every non-zero label of a segmentation volume in a single pass.
+
+    The volume is processed in slabs along z, so that only `max_voxels_per_slab` voxels need to
+    be in memory at once, which also allows `data` to be an HDF5 dataset or similar array-like
+    object that supports slicing.
+
+    @param data: 3-d [z, y, x] integer array.
+    @returns: A `SegmentStatistics` object.
+    """
+    shape = data.shape
+    if len(shape) != 3:
+        raise ValueError('Expected 3-d array, but received shape %r' % (shape, ))
+    slab_depth = max(1, max_voxels_per_slab // max(1, shape[1] * shape[2]))
+    parts = []
+    for z_start in range(0, shape[0], slab_depth):
+        slab = np.asarray(data[z_start:z_start + slab_depth])
+        if slab.size == 0:
+            continue
+        parts.append(_compute_slab_statistics(slab, z_start))
+    if not parts:
+        return SegmentStatistics()
+    ids, counts, starts, ends, sums = _reduce_groups(
+        *[np.concatenate([part[i] for part in parts]) for i in range(5)])
+    nonzero = ids != 0
+    return SegmentStatistics(
+        ids=ids[nonzero],
+        voxel_counts=counts[nonzero],
+        bounding_box_start=starts[nonzero],
+        bounding_box_end=ends[nonzero] + 1,
+        centroids=sums[nonzero] / counts[nonzero, np.newaxis])
+
+
+class SegmentStatistics(object):
+    """Voxel counts, bounding boxes and centroids of the segments of a volume.
+
+    The statistics are stored as arrays indexed consistently with `ids`, which is sorted.  Spatial
+    quantities are in voxel coordinates `[x, y, z]` relative to the start of the volume data: each
+    bounding box is the half-open interval `[bounding_box_start, bounding_box_end)`, and each
+    centroid is the mean of the coordinates of the voxels of the segment.
+    """
+
+    def __init__(self, ids=None, voxel_counts=None, bounding_box_start=None,
+                 bounding_box_end=None, centroids=None):
+        if ids is None:
+            ids = np.zeros(0, dtype=np.uint64)
+            voxel_counts = np.zeros(0, dtype=np.int64)
+            bounding_box_start = bounding_box_end = np.zeros((0, 3), dtype=np.int64)
+            centroids = np.zeros((0, 3), dtype=np.float64)
+        ids = np.asarray(ids)
+        if ids.dtype != np.uint64:
+            # Negative labels of signed integer data become large uint64 values, which changes
+            # their order.
+            ids = ids.astype(np.uint64)
+            order = np.argsort(ids, kind='stable')
+            ids = ids[order]
+            voxel_counts = np.asarray(voxel_counts)[order]
+            bounding_box_start = np.asarray(bounding_box_start)[order]
+            bounding_box_end = np.asarray(bounding_box_end)[order]
+            centroids = np.asarray(centroids)[order]
+        self.ids = ids
+        self.voxel_counts = voxel_counts
+        self.bounding_box_start = bounding_box_start
+        self.bounding_box_end = bounding_box_end
+        self.centroids = centroids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get_indices(self, segment_ids):
+        """Returns the indices into the arrays of the specified segments, or -1 if not present."""
+        segment_ids = np.asarray(segment_ids, dtype=np.uint64)
+        ids = self.ids
+        if len(ids) == 0:
+            return np.full(segment_ids.shape, -1, dtype=np.intp)
+        indices = np.minimum(np.searchsorted(ids, segment_ids), len(ids) - 1)
+        return np.where(ids[indices] == segment_ids, indices, -1)
+
+    def __contains__(self, segment_id):
+        return bool(self.get_indices(segment_id) != -1)
+
+    def get(self, segment_id):
+        """Returns the `SegmentInfo` for `segment_id`, or `None` if it does not occur."""
+        index = int(self.get_indices(segment_id))
+        if index == -1:
+            return None
+        return SegmentInfo(voxel_count=int(self.voxel_counts[index]),
+                           bounding_box_start=self.bounding_box_start[index],
+                           bounding_box_end=self.bounding_box_end[index],
+                           centroid=self.centroids[index])
+
+    def to_json(self, segment_ids=None):
+        """Returns a JSON-compatible dict of parallel lists.
+
+        @param segment_ids: If specified, only these segments are included.  Segments that do not
+            occur are omitted.
+        """
+        if segment_ids is None:
+            indices = slice(None)
+        else:
+            indices = self.get_indices(segment_ids)
+            indices = indices[indices != -1]
+        return dict(
+            ids=self.ids[indices].astype(str).tolist(),
+            voxelCounts=self.voxel_counts[indices].tolist(),
+            boundingBoxStart=self.bounding_box_start[indices].tolist(),
+            boundingBoxEnd=self.bounding_box_end[indices].tolist(),
+            centroids=self.centroids[indices].tolist())
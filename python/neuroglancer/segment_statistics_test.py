@@ -0,0 +1,93 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for segment_statistics.py"""
+
+from __future__ import absolute_import
+
+import unittest
+
+import numpy as np
+
+from . import local_volume, segment_statistics
+
+
+class SegmentStatisticsTest(unittest.TestCase):
+    def test_matches_brute_force(self):
+        rs = np.random.RandomState(0)
+        data = rs.randint(0, 6, size=(7, 5, 9)).astype(np.uint32)
+        data[data == 5] = 1000
+        # Small slabs, so that statistics are merged across slabs.
+        statistics = segment_statistics.compute_segment_statistics(data, max_voxels_per_slab=90)
+        np.testing.assert_array_equal([1, 2, 3, 4, 1000], statistics.ids)
+        for segment_id in statistics.ids:
+            z, y, x = np.nonzero(data == segment_id)
+            xyz = np.stack([x, y, z], axis=1)
+            info = statistics.get(segment_id)
+            self.assertEqual(len(x), info.voxel_count)
+            np.testing.assert_array_equal(xyz.min(axis=0), info.bounding_box_start)
+            np.testing.assert_array_equal(xyz.max(axis=0) + 1, info.bounding_box_end)
+            np.testing.assert_allclose(xyz.mean(axis=0), info.centroid)
+        self.assertNotIn(0, statistics)
+        self.assertIsNone(statistics.get(7))
+        self.assertEqual(['1000'], statistics.to_json([7, 1000])['ids'])
+
+    def test_signed_labels(self):
+        data = np.array([-1, 0, 5, 5, -1, 3], dtype=np.int32).reshape(1, 2, 3)
+        statistics = segment_statistics.compute_segment_statistics(data)
+        np.testing.assert_array_equal([3, 5, 2**64 - 1], statistics.ids)
+        self.assertIn(5, statistics)
+        self.assertIn(3, statistics)
+        self.assertNotIn(4, statistics)
+        self.assertEqual(2, statistics.get(5).voxel_count)
+        np.testing.assert_array_equal([2, 1, 0], statistics.get(3).bounding_box_start)
+        self.assertEqual(2, statistics.get(2**64 - 1).voxel_count)
+        vol = local_volume.LocalVolume(data, volume_type='segmentation')
+        self.assertIn(5, vol.get_segment_statistics())
+
+    def test_local_volume_cache(self):
+        data = np.zeros((4, 4, 4), dtype=np.uint64)
+        data[1:3, 2, 0] = 5
+        vol = local_volume.LocalVolume(data)
+        self.assertIsNone(vol.get_cached_segment_statistics())
+        statistics = vol.get_segment_statistics()
+        self.assertIs(statistics, vol.get_segment_statistics())
+        self.assertEqual(2, statistics.get(5).voxel_count)
+        data[0, 0, 0] = 6
+        vol.invalidate()
+        self.assertIsNone(vol.get_cached_segment_statistics())
+        self.assertIn(6, vol.get_segment_statistics())
+        with self.assertRaises(local_volume.SegmentStatisticsNotSupportedForVolume):
+            local_volume.LocalVolume(np.zeros((2, 2, 2), dtype=np.float32)).get_segment_statistics()
+
+    def test_local_volume_single_channel(self):
+        data = np.zeros((1, 4, 4, 4), dtype=np.uint32)
+        data[0, 1:3, 2, 0] = 5
+        sliced_keys = []
+
+        class SlicingData(object):
+            shape = data.shape
+            dtype = data.dtype
+
+            def __getitem__(self, key):
+                sliced_keys.append(key)
+                return data[key]
+
+        vol = local_volume.LocalVolume(SlicingData())
+        self.assertEqual(2, vol.get_segment_statistics().get(5).voxel_count)
+        # The first channel is read one slab at a time, rather than all at once.
+        self.assertEqual([0], [key[0] for key in sliced_keys])
+
+
+if __name__ == '__main__':
+    unittest.main()
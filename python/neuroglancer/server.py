@@ -19,35 +19,56 @@ import json
 import multiprocessing
 import re
 import socket
+import struct
 import threading
 import weakref
 
+import tornado.concurrent
+import tornado.gen
 import tornado.httpserver
 import tornado.ioloop
+import tornado.iostream
 import tornado.netutil
 import tornado.web
 
 import sockjs.tornado
 
-from . import local_volume, static
+from . import local_volume, metrics, point_list, prefetch, process_pool, static
 from .json_utils import json_encoder_default
 from .random_token import make_random_token
-from .sockjs_handler import SOCKET_PATH_REGEX, SOCKET_PATH_REGEX_WITHOUT_GROUP, SockJSHandler
+from .sockjs_handler import (SOCKET_PATH_REGEX, SOCKET_PATH_REGEX_WITHOUT_GROUP,
+                             ActionSessionTable, SockJSHandler)
+from .websocket_handler import WEBSOCKET_PATH_REGEX, WebSocketHandler
 
 INFO_PATH_REGEX = r'^/neuroglancer/info/(?P<token>[^/]+)$'
 
 DATA_PATH_REGEX = r'^/neuroglancer/(?P<data_format>[^/]+)/(?P<token>[^/]+)/(?P<scale_key>[^/]+)/(?P<start_x>[0-9]+),(?P<end_x>[0-9]+)/(?P<start_y>[0-9]+),(?P<end_y>[0-9]+)/(?P<start_z>[0-9]+),(?P<end_z>[0-9]+)$'
 
+BATCH_PATH_REGEX = r'^/neuroglancer/batch/(?P<data_format>[^/]+)/(?P<token>[^/]+)/(?P<scale_key>[^/]+)$'
+
 SKELETON_PATH_REGEX = r'^/neuroglancer/skeleton/(?P<key>[^/]+)/(?P<object_id>[0-9]+)$'
 
 MESH_PATH_REGEX = r'^/neuroglancer/mesh/(?P<key>[^/]+)/(?P<object_id>[0-9]+)$'
 
+SEGMENT_STATISTICS_PATH_REGEX = r'^/neuroglancer/segment_statistics/(?P<key>[^/]+)$'
+
+POINTS_PATH_REGEX = r'^/neuroglancer/points/(?P<key>[^/]+)$'
+
+METRICS_PATH_REGEX = r'^/neuroglancer/metrics$'
+
 STATIC_PATH_REGEX = r'^/v/(?P<viewer_token>[^/]+)/(?P<path>(?:[a-zA-Z0-9_\-][a-zA-Z0-9_\-.]*)?)$'
 
+# Responses larger than this are written to the socket incrementally.
+WRITE_CHUNK_SIZE = 256 * 1024
+
 global_static_content_source = None
 
 global_server_args = dict(bind_address='127.0.0.1', bind_port=0)
 
+global_chunk_encoding_processes = 0
+
+global_chunk_prefetch_options = None
+
 debug = False
 
 class Server(object):
@@ -56,19 +77,34 @@ class Server(object):
         self.token = make_random_token()
         self.executor = concurrent.futures.ThreadPoolExecutor(
             max_workers=multiprocessing.cpu_count())
+        self.pending_tasks = 0
+        self._pending_tasks_lock = threading.Lock()
+        self.chunk_encoder = None
+        self.set_chunk_encoding_processes(global_chunk_encoding_processes)
+        self.chunk_prefetcher = None
+        self.set_chunk_prefetch_options(global_chunk_prefetch_options)
 
         self.ioloop = ioloop
+        self.action_sessions = ActionSessionTable()
         sockjs_router = sockjs.tornado.SockJSRouter(
             SockJSHandler, SOCKET_PATH_REGEX_WITHOUT_GROUP, io_loop=ioloop)
         sockjs_router.neuroglancer_server = self
         def log_function(request_handler):
-            pass
+            handler_name = type(request_handler).__name__
+            metrics.http_requests.inc(handler=handler_name, status=request_handler.get_status())
+            metrics.http_request_seconds.observe(
+                request_handler.request.request_time(), handler=handler_name)
         app = self.app = tornado.web.Application([
             (STATIC_PATH_REGEX, StaticPathHandler, dict(server=self)),
             (INFO_PATH_REGEX, VolumeInfoHandler, dict(server=self)),
             (DATA_PATH_REGEX, SubvolumeHandler, dict(server=self)),
+            (BATCH_PATH_REGEX, BatchSubvolumeHandler, dict(server=self)),
             (SKELETON_PATH_REGEX, SkeletonHandler, dict(server=self)),
             (MESH_PATH_REGEX, MeshHandler, dict(server=self)),
+            (SEGMENT_STATISTICS_PATH_REGEX, SegmentStatisticsHandler, dict(server=self)),
+            (POINTS_PATH_REGEX, PointsHandler, dict(server=self)),
+            (METRICS_PATH_REGEX, MetricsHandler, dict(server=self)),
+            (WEBSOCKET_PATH_REGEX, WebSocketHandler, dict(server=self)),
         ] + sockjs_router.urls, log_function=log_function)
         http_server = tornado.httpserver.HTTPServer(app)
         sockets = tornado.netutil.bind_sockets(port=bind_port, address=bind_address)
@@ -86,7 +122,61 @@ class Server(object):
 
         self.server_url = 'http://%s:%s' % (hostname, actual_port)
 
-    def get_volume(self, key):
+    def submit(self, fn, *args, **kwargs):
+        """Submits `fn(*args, **kwargs)` to the thread pool.
+
+        Records the number of pending tasks and the time each task waits before it starts.
+        """
+        submit_time = metrics.default_timer()
+        with self._pending_tasks_lock:
+            self.pending_tasks += 1
+
+        def run():
+            metrics.executor_wait_seconds.observe(metrics.default_timer() - submit_time)
+            with self._pending_tasks_lock:
+                self.pending_tasks -= 1
+            return fn(*args, **kwargs)
+
+        def handle_done(future):
+            if future.cancelled():
+                with self._pending_tasks_lock:
+                    self.pending_tasks -= 1
+
+        future = self.executor.submit(run)
+        future.add_done_callback(handle_done)
+        return future
+
+    def set_chunk_encoding_processes(self, num_processes):
+        old_chunk_encoder = self.chunk_encoder
+        if num_processes == 0:
+            self.chunk_encoder = None
+        else:
+            self.chunk_encoder = process_pool.ProcessPoolChunkEncoder(
+                num_processes, fallback_executor=self.executor)
+        if old_chunk_encoder is not None:
+            old_chunk_encoder.shutdown()
+
+    def set_chunk_prefetch_options(self, options):
+        if options is None:
+            self.chunk_prefetcher = None
+        else:
+            self.chunk_prefetcher = prefetch.ChunkPrefetcher(self._encode_subvolume, **options)
+
+    def submit_encoded_subvolume(self, vol, data_format, start, end, scale_key):
+        """Returns a future for the result of `vol.get_encoded_subvolume`."""
+        chunk_prefetcher = self.chunk_prefetcher
+        if chunk_prefetcher is not None:
+            return chunk_prefetcher.submit(vol, data_format, start, end, scale_key)
+        return self._encode_subvolume(vol, data_format, start, end, scale_key)
+
+    def _encode_subvolume(self, vol, data_format, start, end, scale_key):
+        chunk_encoder = self.chunk_encoder
+        if chunk_encoder is not None:
+            return chunk_encoder.submit(vol, data_format, start, end, scale_key=scale_key)
+        return self.submit(
+            vol.get_encoded_subvolume, data_format, start, end, scale_key=scale_key)
+
+    def _get_local_source(self, key, source_type):
         dot_index = key.find('.')
         if dot_index == -1:
             return None
@@ -95,25 +185,152 @@ class Server(object):
         viewer = self.viewers.get(viewer_token)
         if viewer is None:
             return None
-        return viewer.volume_manager.volumes.get(volume_token)
+        source = viewer.volume_manager.volumes.get(volume_token)
+        if not isinstance(source, source_type):
+            return None
+        return source
+
+    def get_volume(self, key):
+        return self._get_local_source(key, local_volume.LocalVolume)
+
+    def get_point_list(self, key):
+        return self._get_local_source(key, point_list.LocalPointList)
 
 
 class BaseRequestHandler(tornado.web.RequestHandler):
     def initialize(self, server):
         self.server = server
+        self.pending_futures = set()
+        self.write_start_time = None
+
+    def finish(self, chunk=None):
+        start_time = self.write_start_time
+        if start_time is None:
+            start_time = metrics.default_timer()
+        future = super(BaseRequestHandler, self).finish(chunk)
+        if future is not None:
+            handler_name = type(self).__name__
+            future.add_done_callback(lambda _: metrics.http_write_seconds.observe(
+                metrics.default_timer() - start_time, handler=handler_name))
+        return future
+
+    def record_response_bytes(self, data, encoding):
+        metrics.response_bytes.inc(len(data), handler=type(self).__name__, encoding=encoding)
+
+    def wait_for(self, future):
+        """Returns a Tornado future, resolved on the IOLoop, for the result of a concurrent future.
+
+        If the client disconnects first, `future` is cancelled and waiting on the returned future
+        raises `tornado.web.Finish`, which ends the request without a response.
+        """
+        pending_futures = self.pending_futures
+        pending_futures.add(future)
+        result = tornado.concurrent.Future()
+
+        def copy():
+            pending_futures.discard(future)
+            if future.cancelled():
+                result.set_exception(tornado.web.Finish())
+                # Mark the exception as retrieved, in case the request is already finished.
+                result.exception()
+                return
+            exception = future.exception()
+            if exception is not None:
+                result.set_exception(exception)
+            else:
+                result.set_result(future.result())
+
+        future.add_done_callback(lambda _: self.server.ioloop.add_callback(copy))
+        return result
+
+    def on_connection_close(self):
+        for future in list(self.pending_futures):
+            future.cancel()
+
+    @tornado.gen.coroutine
+    def finish_data(self, data):
+        """Writes `data` and finishes the response.
+
+        Responses larger than `WRITE_CHUNK_SIZE` are written in chunks, waiting for each chunk to be
+        sent before writing the next, so that slow clients do not cause entire responses to be
+        copied into the socket buffers at once.
+        """
+        if len(data) <= WRITE_CHUNK_SIZE:
+            self.finish(data)
+            return
+        self.write_start_time = metrics.default_timer()
+        self.set_header('Content-Length', len(data))
+        try:
+            for offset in range(0, len(data), WRITE_CHUNK_SIZE):
+                self.write(data[offset:offset + WRITE_CHUNK_SIZE])
+                yield self.flush()
+        except tornado.iostream.StreamClosedError:
+            return
+        self.finish()
+
+    def check_volume_cache(self, vol):
+        """Sets caching headers for a response determined by the volume generation.
+
+        Every volume response is a deterministic function of `vol.token`, `vol.change_count` and the
+        request path, so the pair serves as a strong ETag.  Responses must be revalidated before
+        reuse, unless the request URL specifies the current generation (`?generation=N`), in which
+        case they may be cached indefinitely.
+
+        @returns: True if the cached copy of the client is current.  In that case a 304 response has
+            already been sent and the caller must not do any further work.
+        """
+        generation = vol.change_count
+        self.set_header('Etag', '"%s-%d"' % (vol.token, generation))
+        if self.get_query_argument('generation', None) == str(generation):
+            self.set_header('Cache-Control', 'private, max-age=31536000, immutable')
+        else:
+            self.set_header('Cache-Control', 'no-cache')
+        if self.check_etag_header():
+            self.set_status(304)
+            self.finish()
+            return True
+        return False
 
 class StaticPathHandler(BaseRequestHandler):
+    @tornado.gen.coroutine
     def get(self, viewer_token, path):
         if viewer_token != self.server.token and viewer_token not in self.server.viewers:
             self.send_error(404)
             return
+        source = global_static_content_source
+        accepted_encodings = static.parse_accept_encoding(
+            self.request.headers.get('Accept-Encoding', ''))
+        # Sources that predate `get_encoded`, such as user-supplied `StaticContentSource`
+        # implementations that only define `get`, are served without compression.
+        get_encoded = getattr(source, 'get_encoded', None)
         try:
-            data, content_type = global_static_content_source.get(path)
+            # Retrieving and compressing the content may be slow the first time.
+            if get_encoded is not None:
+                content = yield self.wait_for(
+                    self.server.submit(get_encoded, path, accepted_encodings))
+            else:
+                data, content_type = yield self.wait_for(self.server.submit(source.get, path))
+                content = static.EncodedContent(data=data, content_type=content_type,
+                                                content_encoding=None,
+                                                etag=static.compute_etag(data))
         except ValueError as e:
             self.send_error(404, message=e.args[0])
             return
-        self.set_header('Content-type', content_type)
-        self.finish(data)
+        self.set_header('Content-type', content.content_type)
+        self.set_header('Vary', 'Accept-Encoding')
+        self.set_header('Etag', content.etag)
+        if getattr(source, 'immutable', False):
+            self.set_header('Cache-Control', 'public, max-age=31536000, immutable')
+        else:
+            self.set_header('Cache-Control', 'no-cache')
+        if content.content_encoding is not None:
+            self.set_header('Content-Encoding', content.content_encoding)
+        if self.check_etag_header():
+            self.set_status(304)
+            self.finish()
+            return
+        self.record_response_bytes(content.data, content.content_encoding or 'identity')
+        yield self.finish_data(content.data)
 
 
 class VolumeInfoHandler(BaseRequestHandler):
@@ -122,11 +339,13 @@ class VolumeInfoHandler(BaseRequestHandler):
         if vol is None:
             self.send_error(404)
             return
+        if self.check_volume_cache(vol):
+            return
         self.finish(json.dumps(vol.info(), default=json_encoder_default).encode())
 
 
 class SubvolumeHandler(BaseRequestHandler):
-    @tornado.web.asynchronous
+    @tornado.gen.coroutine
     def get(self, data_format, token, scale_key, start_x, end_x, start_y, end_y, start_z, end_z):
         start = (int(start_x), int(start_y), int(start_z))
         end = (int(end_x), int(end_y), int(end_z))
@@ -134,92 +353,246 @@ class SubvolumeHandler(BaseRequestHandler):
         if vol is None:
             self.send_error(404)
             return
+        if self.check_volume_cache(vol):
+            return
+        try:
+            data, content_type = yield self.wait_for(
+                self.server.submit_encoded_subvolume(
+                    vol, data_format, start, end, scale_key=scale_key))
+        except ValueError as e:
+            self.send_error(400, message=e.args[0])
+            return
+        self.set_header('Content-type', content_type)
+        self.record_response_bytes(data, data_format)
+        yield self.finish_data(data)
 
-        def handle_subvolume_result(f):
-            try:
-                data, content_type = f.result()
-            except ValueError as e:
-                self.send_error(400, message=e.args[0])
-                return
 
-            self.set_header('Content-type', content_type)
-            self.finish(data)
+_batch_record_header = struct.Struct('<III')
 
-        self.server.executor.submit(
-            vol.get_encoded_subvolume,
-            data_format, start, end, scale_key=scale_key).add_done_callback(
-                lambda f: self.server.ioloop.add_callback(lambda: handle_subvolume_result(f)))
 
+class BatchSubvolumeHandler(BaseRequestHandler):
+    """Encodes multiple chunks of a single volume and scale.
 
-class MeshHandler(BaseRequestHandler):
-    @tornado.web.asynchronous
-    def get(self, key, object_id):
-        object_id = int(object_id)
-        vol = self.server.get_volume(key)
+    The request body is a JSON list of chunk bounds, each specified as
+    `[start_x, end_x, start_y, end_y, start_z, end_z]`.
+
+    The response is a sequence of records, in the order in which the chunks finish encoding.  Each
+    record is a little-endian uint32 `[index, status, length]` header followed by `length` bytes,
+    which are the encoded chunk if `status` is 200, or a UTF-8 error message otherwise.
+
+    Unlike responses of `SubvolumeHandler`, the chunks of a POST response cannot be revalidated
+    against, or cached by, the HTTP cache of the browser.  The client therefore only uses this
+    endpoint for volumes that enable it with the `batch_requests` option of `LocalVolume`.
+    """
+
+    @tornado.gen.coroutine
+    def post(self, data_format, token, scale_key):
+        vol = self.server.get_volume(token)
         if vol is None:
             self.send_error(404)
             return
-
-        def handle_mesh_result(f):
+        try:
+            requests = []
+            for bounds in json.loads(self.request.body.decode('utf-8')):
+                if len(bounds) != 6:
+                    raise ValueError
+                bounds = [int(x) for x in bounds]
+                requests.append((tuple(bounds[0::2]), tuple(bounds[1::2])))
+        except (ValueError, TypeError):
+            self.send_error(400, message='Invalid batch request.')
+            return
+        if not requests:
+            self.finish()
+            return
+        self.set_header('Content-type', 'application/octet-stream')
+        wait_iterator = tornado.gen.WaitIterator(*[
+            self.wait_for(
+                self.server.submit_encoded_subvolume(
+                    vol, data_format, start, end, scale_key=scale_key))
+            for start, end in requests
+        ])
+        while not wait_iterator.done():
             try:
-                encoded_mesh = f.result()
-            except local_volume.MeshImplementationNotAvailable:
-                self.send_error(501, message='Mesh implementation not available')
-                return
-            except local_volume.MeshesNotSupportedForVolume:
-                self.send_error(405, message='Meshes not supported for volume')
-                return
-            except local_volume.InvalidObjectIdForMesh:
-                self.send_error(404, message='Mesh not available for specified object id')
-                return
+                data, _ = yield wait_iterator.next()
+                status = 200
             except ValueError as e:
-                self.send_error(400, message=e.args[0])
+                data = e.args[0].encode('utf-8')
+                status = 400
+            else:
+                self.record_response_bytes(data, data_format)
+            self.write(_batch_record_header.pack(wait_iterator.current_index, status, len(data)))
+            self.write(data)
+            if wait_iterator.done():
+                break
+            try:
+                # Waits for the records to be sent before writing more, as other chunks finish.
+                yield self.flush()
+            except tornado.iostream.StreamClosedError:
                 return
+        self.finish()
 
-            self.set_header('Content-type', 'application/octet-stream')
-            self.finish(encoded_mesh)
 
-        self.server.executor.submit(vol.get_object_mesh, object_id).add_done_callback(
-            lambda f: self.server.ioloop.add_callback(lambda: handle_mesh_result(f)))
+class MeshHandler(BaseRequestHandler):
+    @tornado.gen.coroutine
+    def get(self, key, object_id):
+        object_id = int(object_id)
+        vol = self.server.get_volume(key)
+        if vol is None:
+            self.send_error(404)
+            return
+        if self.check_volume_cache(vol):
+            return
+        try:
+            encoded_mesh = yield self.wait_for(self.server.submit(vol.get_object_mesh, object_id))
+        except local_volume.MeshImplementationNotAvailable:
+            self.send_error(501, message='Mesh implementation not available')
+            return
+        except local_volume.MeshesNotSupportedForVolume:
+            self.send_error(405, message='Meshes not supported for volume')
+            return
+        except local_volume.InvalidObjectIdForMesh:
+            self.send_error(404, message='Mesh not available for specified object id')
+            return
+        except ValueError as e:
+            self.send_error(400, message=e.args[0])
+            return
+        self.set_header('Content-type', 'application/octet-stream')
+        self.record_response_bytes(encoded_mesh, 'mesh')
+        yield self.finish_data(encoded_mesh)
 
 
 class SkeletonHandler(BaseRequestHandler):
-    @tornado.web.asynchronous
+    @tornado.gen.coroutine
     def get(self, key, object_id):
         object_id = int(object_id)
         vol = self.server.get_volume(key)
         if vol is None:
             self.send_error(404)
+            return
         if vol.skeletons is None:
             self.send_error(405, message='Skeletons not supported for volume')
             return
-
-        def handle_result(f):
+        tolerance = self.get_argument('tolerance', None)
+        if tolerance is not None:
             try:
-                encoded_skeleton = f.result()
-            except:
-                self.send_error(500, message=e.args[0])
+                tolerance = float(tolerance)
+            except ValueError:
+                self.send_error(400, message='Invalid tolerance')
                 return
-            if encoded_skeleton is None:
-                self.send_error(404, message='Skeleton not available for specified object id')
-                return
-            self.set_header('Content-type', 'application/octet-stream')
-            self.finish(encoded_skeleton)
+        if self.check_volume_cache(vol):
+            return
 
         def get_encoded_skeleton(skeletons, object_id):
-            skeleton = skeletons.get_skeleton(object_id)
-            if skeleton is None:
-                return None
-            return skeleton.encode(skeletons)
+            if hasattr(skeletons, 'get_encoded_skeleton'):
+                encoded_skeleton = skeletons.get_encoded_skeleton(object_id, tolerance)
+            else:
+                # Duck-typed sources need only implement `get_skeleton`.
+                skeleton = skeletons.get_skeleton(object_id)
+                if skeleton is None:
+                    return None
+                encoded_skeleton = skeleton.encode(skeletons)
+            if encoded_skeleton is not None and not isinstance(encoded_skeleton, bytes):
+                # Tornado only accepts bytes, not other buffers such as memoryview.
+                encoded_skeleton = bytes(encoded_skeleton)
+            return encoded_skeleton
+
+        try:
+            encoded_skeleton = yield self.wait_for(
+                self.server.submit(get_encoded_skeleton, vol.skeletons, object_id))
+        except tornado.web.Finish:
+            # The client disconnected.
+            raise
+        except Exception as e:
+            self.send_error(500, message=str(e))
+            return
+        if encoded_skeleton is None:
+            self.send_error(404, message='Skeleton not available for specified object id')
+            return
+        self.set_header('Content-type', 'application/octet-stream')
+        self.record_response_bytes(encoded_skeleton, 'skeleton')
+        yield self.finish_data(encoded_skeleton)
+
+
+class SegmentStatisticsHandler(BaseRequestHandler):
+    """Returns the segment statistics of a volume as JSON.
+
+    The optional `ids` query parameter specifies a comma-separated list of segment ids to include;
+    by default, all segments are included.
+    """
+
+    @tornado.gen.coroutine
+    def get(self, key):
+        vol = self.server.get_volume(key)
+        if vol is None:
+            self.send_error(404)
+            return
+        segment_ids = self.get_query_argument('ids', None)
+        if segment_ids is not None:
+            try:
+                segment_ids = [int(x) for x in segment_ids.split(',') if x]
+            except ValueError:
+                self.send_error(400, message='Invalid segment ids')
+                return
+        if self.check_volume_cache(vol):
+            return
+
+        def get_encoded_statistics():
+            statistics = vol.get_segment_statistics()
+            return json.dumps(statistics.to_json(segment_ids)).encode('utf-8')
+
+        try:
+            data = yield self.wait_for(self.server.submit(get_encoded_statistics))
+        except local_volume.SegmentStatisticsNotSupportedForVolume:
+            self.send_error(405, message='Segment statistics not supported for volume')
+            return
+        except OverflowError:
+            self.send_error(400, message='Invalid segment ids')
+            return
+        self.set_header('Content-type', 'application/json')
+        self.record_response_bytes(data, 'json')
+        yield self.finish_data(data)
+
 
-        self.server.executor.submit(
-            get_encoded_skeleton, vol.skeletons, object_id).add_done_callback(
-                lambda f: self.server.ioloop.add_callback(lambda: handle_result(f)))
+class PointsHandler(BaseRequestHandler):
+    """Serves the points of a `LocalPointList` as little-endian float32 `[x, y, z]` triples."""
+
+    @tornado.gen.coroutine
+    def get(self, key):
+        points = self.server.get_point_list(key)
+        if points is None:
+            self.send_error(404)
+            return
+        if self.check_volume_cache(points):
+            return
+        data = yield self.wait_for(self.server.submit(points.to_bytes))
+        self.set_header('Content-type', 'application/octet-stream')
+        self.record_response_bytes(data, 'points')
+        yield self.finish_data(data)
+
+
+class MetricsHandler(BaseRequestHandler):
+    def get(self):
+        self.set_header('Content-type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.set_header('Cache-Control', 'no-cache')
+        self.finish(metrics.to_prometheus_text().encode('utf-8'))
 
 
 global_server = None
 
 
+def _get_executor_queue_depth():
+    server = global_server
+    if server is None:
+        return 0
+    return server.pending_tasks
+
+
+metrics.registry.register(
+    metrics.Gauge('neuroglancer_executor_queue_depth',
+                  'Number of tasks submitted to the server thread pool that have not started.',
+                  _get_executor_queue_depth))
+
+
 def set_static_content_source(*args, **kwargs):
     global global_static_content_source
     global_static_content_source = static.get_static_content_source(*args, **kwargs)
@@ -230,6 +603,46 @@ def set_server_bind_address(bind_address='127.0.0.1', bind_port=0):
     global_server_args = dict(bind_address=bind_address, bind_port=bind_port)
 
 
+def set_chunk_encoding_processes(num_processes=None):
+    """Sets the number of worker processes used to encode `LocalVolume` chunks.
+
+    By default, chunks are encoded by a thread pool in the server process, which limits throughput
+    to roughly one core for the parts of the encoding that hold the GIL.
+
+    @param num_processes: Number of worker processes, or None to use one per core.  Specify 0 to
+        encode chunks in the server process.
+    """
+    global global_chunk_encoding_processes
+    global_chunk_encoding_processes = num_processes
+    if global_server is not None:
+        global_server.set_chunk_encoding_processes(num_processes)
+
+
+def set_chunk_prefetch(enabled=True, **kwargs):
+    """Enables or disables speculative encoding of the chunks likely to be requested next.
+
+    When enabled, after each chunk request the neighboring chunks in the same plane and the chunks of
+    the next finer scale are encoded while the server is otherwise idle.
+
+    @param kwargs: Additional options passed to `prefetch.ChunkPrefetcher`, such as
+        `max_cache_bytes`.
+    """
+    global global_chunk_prefetch_options
+    global_chunk_prefetch_options = kwargs if enabled else None
+    if global_server is not None:
+        global_server.set_chunk_prefetch_options(global_chunk_prefetch_options)
+
+
+def get_chunk_prefetch_stats():
+    """Returns the request and prefetch counts of the chunk prefetcher, or None if disabled.
+
+    See `prefetch.ChunkPrefetcher.stats`.
+    """
+    if global_server is None or global_server.chunk_prefetcher is None:
+        return None
+    return global_server.chunk_prefetcher.stats()
+
+
 def is_server_running():
     return global_server is not None
 
@@ -242,11 +655,8 @@ def stop():
     """
     global global_server
     if global_server is not None:
-        ioloop = global_server.ioloop
-        def stop_ioloop():
-            ioloop.stop()
-            ioloop.close()
-        global_server.ioloop.add_callback(stop_ioloop)
+        global_server.set_chunk_encoding_processes(0)
+        global_server.ioloop.add_callback(global_server.ioloop.stop)
         global_server = None
 
 
@@ -260,7 +670,13 @@ def start():
         ioloop = tornado.ioloop.IOLoop()
         ioloop.make_current()
         global_server = Server(ioloop=ioloop, **global_server_args)
-        thread = threading.Thread(target=ioloop.start)
+
+        def run_ioloop():
+            ioloop.start()
+            # The loop can only be closed once it is no longer running.
+            ioloop.close()
+
+        thread = threading.Thread(target=run_ioloop)
         thread.daemon = True
         thread.start()
 
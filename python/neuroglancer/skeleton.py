@@ -15,44 +15,231 @@
 from __future__ import absolute_import
 
 import collections
-import io
+import json
+import mmap
+import os
+import shutil
 import struct
+import tempfile
 
 import numpy as np
 import six
 
+from . import lru_cache
+
+
+DEFAULT_ENCODED_CACHE_BYTES = 64 * 1024 * 1024
+
+_header = struct.Struct('<II')
+
+
+def _as_buffer(array):
+    """Returns a bytes-like view of a C-contiguous array that can be passed to `bytes.join`."""
+    if six.PY2:
+        return array.tobytes()
+    return array
+
 
 class Skeleton(object):
     def __init__(self, vertex_positions, edges, vertex_attributes=None):
-        self.vertex_positions = np.array(vertex_positions, dtype='<f4')
-        self.edges = np.array(edges, dtype='<u4')
+        self.vertex_positions = np.asarray(vertex_positions, dtype='<f4')
+        self.edges = np.asarray(edges, dtype='<u4')
         self.vertex_attributes = vertex_attributes
 
     def encode(self, source=None):
-        result = io.BytesIO()
-        edges = self.edges
-        vertex_positions = self.vertex_positions
-        vertex_attributes = self.vertex_attributes
-        result.write(struct.pack('<II', vertex_positions.shape[0], edges.shape[0] // 2))
-        result.write(vertex_positions.tobytes())
-        if source and len(source.vertex_attributes) > 0:
-            for name, info in six.iteritems(source.vertex_attributes):
-
-                attribute = np.array(vertex_attributes[name],
-                                     np.dtype(info.data_type).newbyteorder('<'))
-                expected_shape = (vertex_positions.shape[0], info.num_components)
-                if (attribute.shape[0] != expected_shape[0] or
-                        attribute.size != np.prod(expected_shape)):
+        vertex_positions = np.ascontiguousarray(self.vertex_positions)
+        edges = np.ascontiguousarray(self.edges)
+        num_vertices = vertex_positions.shape[0]
+        parts = [_header.pack(num_vertices, edges.size // 2), _as_buffer(vertex_positions)]
+        if source is not None:
+            vertex_attributes = self.vertex_attributes
+            for name, dtype, num_components in _get_vertex_attribute_layout(source):
+                attribute = np.ascontiguousarray(vertex_attributes[name], dtype=dtype)
+                if (attribute.shape[0] != num_vertices or
+                        attribute.size != num_vertices * num_components):
                     raise ValueError('Expected attribute %r to have shape %r, but was: %r' %
-                                     (name, expected_shape, attribute.shape))
-                result.write(attribute.tobytes())
-        result.write(edges.tobytes())
-        return result.getvalue()
+                                     (name, (num_vertices, num_components), attribute.shape))
+                parts.append(_as_buffer(attribute))
+        parts.append(_as_buffer(edges))
+        return b''.join(parts)
+
+
+def decode(data, source=None):
+    """Decodes a skeleton in the format produced by `Skeleton.encode`.
+
+    @param source: SkeletonSource specifying the vertex attributes, or `None` if there are no
+        vertex attributes.
+    """
+    num_vertices, num_edges = _header.unpack_from(data, 0)
+    offset = _header.size
+    vertex_positions = np.frombuffer(data, dtype='<f4', count=num_vertices * 3, offset=offset)
+    offset += vertex_positions.nbytes
+    vertex_attributes = None
+    if source is not None:
+        vertex_attributes = dict()
+        for name, dtype, num_components in _get_vertex_attribute_layout(source):
+            attribute = np.frombuffer(data, dtype=dtype, count=num_vertices * num_components,
+                                      offset=offset)
+            offset += attribute.nbytes
+            vertex_attributes[name] = attribute.reshape(num_vertices, num_components)
+    edges = np.frombuffer(data, dtype='<u4', count=num_edges * 2, offset=offset)
+    return Skeleton(vertex_positions.reshape(num_vertices, 3), edges.reshape(num_edges, 2),
+                    vertex_attributes)
+
+
+def _normalize_edges(edges):
+    """Returns the sorted, unique, undirected edges, excluding self loops."""
+    edges = np.sort(edges, axis=1)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    if len(edges) == 0:
+        return edges
+    return np.unique(edges, axis=0)
+
+
+def _label_chains(num_vertices, edges, is_chain):
+    """Labels the connected components of the subgraph induced by the `is_chain` vertices.
+
+    Each vertex is labeled with the smallest vertex index in its component, computed by minimum label
+    propagation with pointer jumping.
+    """
+    labels = np.arange(num_vertices)
+    chain_edges = edges[is_chain[edges[:, 0]] & is_chain[edges[:, 1]]]
+    a = chain_edges[:, 0]
+    b = chain_edges[:, 1]
+    while True:
+        new_labels = labels.copy()
+        edge_labels = np.minimum(labels[a], labels[b])
+        np.minimum.at(new_labels, a, edge_labels)
+        np.minimum.at(new_labels, b, edge_labels)
+        new_labels = new_labels[new_labels]
+        if np.array_equal(new_labels, labels):
+            return labels
+        labels = new_labels
+
+
+def _segment_distance(p, a, b):
+    """Returns the distances from the points `p` to the line segments from `a` to `b`."""
+    ab = b - a
+    ap = p - a
+    length_squared = np.einsum('ij,ij->i', ab, ab)
+    t = np.einsum('ij,ij->i', ap, ab) / np.where(length_squared > 0, length_squared, 1)
+    t = np.clip(t, 0, 1)
+    return np.linalg.norm(ap - t[:, np.newaxis] * ab, axis=1)
+
+
+def simplify(skeleton, tolerance):
+    """Returns a simplified copy of `skeleton`.
+
+    Endpoints, branch points and isolated vertices are always kept.  Within each unbranched chain,
+    vertices that fall in the same cell of a grid of size `tolerance` are collapsed to a single
+    vertex, with the mean position and vertex attributes.  Then chain vertices that lie within
+    `tolerance` of the segment joining their two neighbors are removed, in rounds, until no such
+    vertices remain.
+
+    @param tolerance: Tolerance in the units of the vertex positions.
+    """
+    positions = np.asarray(skeleton.vertex_positions, dtype=np.float64).reshape(-1, 3)
+    edges = _normalize_edges(np.asarray(skeleton.edges, dtype=np.int64).reshape(-1, 2))
+    num_vertices = positions.shape[0]
+    if num_vertices == 0:
+        return skeleton
+    is_chain = np.bincount(edges.ravel(), minlength=num_vertices) == 2
+
+    # Collapse chain vertices to a grid.  Vertices that are not part of a chain are labeled with
+    # their own index, and therefore each form a separate cluster.
+    keys = np.empty((num_vertices, 4), dtype=np.int64)
+    keys[:, 0] = _label_chains(num_vertices, edges, is_chain)
+    keys[:, 1:] = np.floor(positions / tolerance)
+    cluster = np.unique(keys, axis=0, return_inverse=True)[1].ravel()
+    num_clusters = int(cluster.max()) + 1
+    counts = np.bincount(cluster, minlength=num_clusters).astype(np.float64)
+
+    def get_cluster_means(values):
+        values = np.asarray(values)
+        flat_values = values.reshape(num_vertices, -1).astype(np.float64)
+        means = np.empty((num_clusters, flat_values.shape[1]))
+        for i in range(flat_values.shape[1]):
+            means[:, i] = np.bincount(cluster, flat_values[:, i], minlength=num_clusters) / counts
+        if np.issubdtype(values.dtype, np.integer):
+            means = np.round(means)
+        return means.astype(values.dtype).reshape((num_clusters, ) + values.shape[1:])
+
+    positions = get_cluster_means(positions)
+    vertex_attributes = None
+    if skeleton.vertex_attributes is not None:
+        vertex_attributes = dict((name, get_cluster_means(values))
+                                 for name, values in six.iteritems(skeleton.vertex_attributes))
+    edges = _normalize_edges(cluster[edges])
+    protected = np.zeros(num_clusters, dtype=bool)
+    protected[cluster[~is_chain]] = True
+
+    # Remove nearly collinear chain vertices.  In each round, an independent set of removable
+    # vertices is removed, chosen using a pseudo-random priority so that long straight chains are
+    # removed in a logarithmic number of rounds.
+    priority = (np.arange(num_clusters, dtype=np.uint64) * np.uint64(2654435761)) & np.uint64(
+        0xffffffff)
+    alive = np.ones(num_clusters, dtype=bool)
+    while len(edges):
+        degree = np.bincount(edges.ravel(), minlength=num_clusters)
+        candidates = np.nonzero((degree == 2) & ~protected)[0]
+        if len(candidates) == 0:
+            break
+        neighbor_order = np.argsort(edges.ravel(), kind='mergesort')
+        neighbors = edges[:, ::-1].ravel()[neighbor_order]
+        first = (np.cumsum(degree) - degree)[candidates]
+        a = neighbors[first]
+        b = neighbors[first + 1]
+        is_close = _segment_distance(positions[candidates], positions[a], positions[b]) <= tolerance
+        candidates = candidates[is_close]
+        if len(candidates) == 0:
+            break
+        a = a[is_close]
+        b = b[is_close]
+        is_removable = np.zeros(num_clusters, dtype=bool)
+        is_removable[candidates] = True
+        p = priority[candidates]
+        selected = ((~is_removable[a] | (p > priority[a])) & (~is_removable[b] | (p > priority[b])))
+        removed = candidates[selected]
+        alive[removed] = False
+        edges = edges[alive[edges[:, 0]] & alive[edges[:, 1]]]
+        edges = _normalize_edges(
+            np.concatenate([edges, np.stack([a[selected], b[selected]], axis=1)]))
+
+    new_index = np.cumsum(alive) - 1
+    if vertex_attributes is not None:
+        vertex_attributes = dict(
+            (name, values[alive]) for name, values in six.iteritems(vertex_attributes))
+    return Skeleton(positions[alive], new_index[edges], vertex_attributes)
+
+
+def _get_vertex_attribute_layout(source):
+    get_layout = getattr(source, 'get_vertex_attribute_layout', None)
+    if get_layout is not None:
+        return get_layout()
+    # Sources that do not derive from `SkeletonSource` need only define `vertex_attributes`.
+    return [(name, np.dtype(info.data_type).newbyteorder('<'), info.num_components)
+            for name, info in six.iteritems(getattr(source, 'vertex_attributes', {}))]
 
 
 VertexAttributeInfo = collections.namedtuple('VertexAttributeInfo', ['data_type', 'num_components'])
 
 class SkeletonSource(object):
+    """Source of skeletons, identified by uint64 object ids.
+
+    Subclasses must implement `get_skeleton`, and may override `get_skeletons` to retrieve multiple
+    skeletons more efficiently.
+
+    If `simplification_tolerance` is set, skeletons are simplified with `simplify` before they are
+    encoded.
+
+    If `encoded_cache_bytes` is set, for example to `DEFAULT_ENCODED_CACHE_BYTES`, encoded
+    skeletons are cached, up to that total size.  Call `invalidate` if the skeletons change.  By
+    default nothing is cached, since `get_skeleton` may return different skeletons over time.
+    """
+
+    encoded_cache_bytes = 0
+
+    simplification_tolerance = None
 
     def __init__(self):
         self.vertex_attributes = collections.OrderedDict()
@@ -67,12 +254,236 @@ class SkeletonSource(object):
         """
         raise NotImplementedError
 
+    def get_skeletons(self, object_ids):
+        """Retrieves the skeletons corresponding to a sequence of object ids.
+
+        @returns A list containing, for each object id, the Skeleton object or `None`.
+        """
+        return [self.get_skeleton(object_id) for object_id in object_ids]
+
+    def get_vertex_attribute_layout(self):
+        """Returns a list of `(name, little_endian_dtype, num_components)` tuples.
+
+        The layout is computed once, and recomputed only if `vertex_attributes` changes.
+        """
+        key = tuple(six.iteritems(self.vertex_attributes))
+        cached = self.__dict__.get('_vertex_attribute_layout')
+        if cached is None or cached[0] != key:
+            layout = [(name, np.dtype(info.data_type).newbyteorder('<'), info.num_components)
+                      for name, info in key]
+            cached = self._vertex_attribute_layout = (key, layout)
+        return cached[1]
+
+    def _get_encoded_cache(self):
+        cache = self.__dict__.get('_encoded_cache')
+        if cache is None:
+            cache = self._encoded_cache = lru_cache.LruCache(self.encoded_cache_bytes)
+        return cache
+
+    def _get_tolerance(self, tolerance):
+        if tolerance is None:
+            tolerance = self.simplification_tolerance
+        return tolerance or None
+
+    def get_encoded_skeleton(self, object_id, tolerance=None):
+        """Returns the encoded skeleton for `object_id`, or `None` if there is no skeleton.
+
+        @param tolerance: Simplification tolerance.  Defaults to `simplification_tolerance`.  If 0,
+            the skeleton is not simplified.
+        """
+        return self.get_encoded_skeletons([object_id], tolerance)[0]
+
+    def get_encoded_skeletons(self, object_ids, tolerance=None):
+        """Returns a list of encoded skeletons (or `None`) for a sequence of object ids.
+
+        Skeletons that are not cached are retrieved with a single call to `get_skeletons`.  Encoded
+        skeletons are cached separately for each simplification tolerance.
+        """
+        tolerance = self._get_tolerance(tolerance)
+        cache = self._get_encoded_cache()
+        keys = [(object_id, tolerance) for object_id in object_ids]
+        results = [cache.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            skeletons = self.get_skeletons([object_ids[i] for i in missing])
+            for i, skeleton in zip(missing, skeletons):
+                if skeleton is None:
+                    continue
+                if tolerance is not None:
+                    skeleton = simplify(skeleton, tolerance)
+                encoded = skeleton.encode(self)
+                cache.set(keys[i], encoded)
+                results[i] = encoded
+        return results
+
+    def invalidate(self):
+        """Discards all cached encoded skeletons."""
+        self._get_encoded_cache().clear()
+
     def get_vertex_attributes_spec(self):
         temp = collections.OrderedDict()
         for k, v in six.iteritems(self.vertex_attributes):
             temp[k] = dict(dataType=np.dtype(v.data_type).name, numComponents=v.num_components)
         return temp
 
+# Skeleton file layout (all integers little endian):
+#
+#   magic (8 bytes), number of skeletons n (uint64), length of vertex attributes spec (uint64)
+#   vertex attributes spec: JSON, padded with spaces to a multiple of 8 bytes
+#   object ids: n uint64, sorted
+#   record offsets, relative to the start of the file: n uint64
+#   record sizes: n uint64
+#   records in the `Skeleton.encode` format
+SKELETON_FILE_MAGIC = b'NGSKEL01'
+
+_file_header = struct.Struct('<8sQQ')
+
+
+class SkeletonFileWriter(object):
+    """Writes a skeleton file for use with `SkeletonFileSource`.
+
+    Skeletons may be added in any order.  Encoded skeletons are written to a temporary file as they
+    are added, so that only the index is kept in memory; the skeleton file is written by `close`.
+
+    Example:
+
+        with SkeletonFileWriter('skeletons.bin', vertex_attributes) as writer:
+            for object_id, skeleton in skeletons:
+                writer.add(object_id, skeleton)
+
+    @param vertex_attributes: OrderedDict mapping attribute names to `VertexAttributeInfo`.
+    """
+
+    def __init__(self, path, vertex_attributes=None):
+        self.path = path
+        self._source = SkeletonSource()
+        if vertex_attributes is not None:
+            self._source.vertex_attributes.update(vertex_attributes)
+        self._object_ids = []
+        self._sizes = []
+        self._records = tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(path)))
+
+    def add(self, object_id, skeleton):
+        encoded = skeleton.encode(self._source)
+        self._records.write(encoded)
+        self._object_ids.append(object_id)
+        self._sizes.append(len(encoded))
+
+    def close(self):
+        if self._records is None:
+            return
+        records = self._records
+        self._records = None
+        try:
+            object_ids = np.array(self._object_ids, dtype='<u8')
+            sizes = np.array(self._sizes, dtype='<u8')
+            if len(object_ids) != len(np.unique(object_ids)):
+                raise ValueError('Duplicate object ids')
+            spec = json.dumps(self._source.get_vertex_attributes_spec()).encode('utf-8')
+            spec += b' ' * (-len(spec) % 8)
+            num_skeletons = len(object_ids)
+            records_offset = _file_header.size + len(spec) + 3 * 8 * num_skeletons
+            offsets = records_offset + np.cumsum(sizes) - sizes
+            order = np.argsort(object_ids, kind='mergesort')
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, temp_path = tempfile.mkstemp(dir=directory)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(_file_header.pack(SKELETON_FILE_MAGIC, num_skeletons, len(spec)))
+                    f.write(spec)
+                    f.write(object_ids[order].astype('<u8').tobytes())
+                    f.write(offsets[order].astype('<u8').tobytes())
+                    f.write(sizes[order].astype('<u8').tobytes())
+                    records.seek(0)
+                    shutil.copyfileobj(records, f)
+                os.rename(temp_path, self.path)
+            except:
+                os.remove(temp_path)
+                raise
+        finally:
+            records.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self._records.close()
+            self._records = None
+        else:
+            self.close()
+
+
+def write_skeleton_file(path, skeletons, vertex_attributes=None):
+    """Writes a skeleton file from an iterable of `(object_id, skeleton)` pairs."""
+    with SkeletonFileWriter(path, vertex_attributes) as writer:
+        for object_id, skeleton in skeletons:
+            writer.add(object_id, skeleton)
+
+
+class SkeletonFileSource(SkeletonSource):
+    """SkeletonSource backed by a memory-mapped file written by `SkeletonFileWriter`.
+
+    Unless they are simplified, encoded skeletons are returned as slices of the mapped file, without
+    decoding or copying.
+    """
+
+    def __init__(self, path):
+        super(SkeletonFileSource, self).__init__()
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, num_skeletons, spec_length = _file_header.unpack_from(self._mmap, 0)
+        if magic != SKELETON_FILE_MAGIC:
+            raise ValueError('Not a skeleton file: %r' % (path, ))
+        offset = _file_header.size
+        spec = json.loads(self._mmap[offset:offset + spec_length].decode('utf-8'),
+                          object_pairs_hook=collections.OrderedDict)
+        for name, info in six.iteritems(spec):
+            self.vertex_attributes[name] = VertexAttributeInfo(
+                data_type=np.dtype(info['dataType']), num_components=info['numComponents'])
+        offset += spec_length
+        index = np.frombuffer(self._mmap, dtype='<u8', count=3 * num_skeletons, offset=offset)
+        self.object_ids = index[:num_skeletons]
+        self._offsets = index[num_skeletons:2 * num_skeletons]
+        self._sizes = index[2 * num_skeletons:]
+
+    def __len__(self):
+        return len(self.object_ids)
+
+    def _find(self, object_id):
+        if (not isinstance(object_id, six.integer_types + (np.integer, )) or
+                not 0 <= object_id <= 0xffffffffffffffff):
+            return None
+        # Searching for a Python int would compare as float64, which does not distinguish ids above
+        # 2**53.
+        object_id = np.uint64(object_id)
+        i = int(np.searchsorted(self.object_ids, object_id))
+        if i == len(self.object_ids) or self.object_ids[i] != object_id:
+            return None
+        start = int(self._offsets[i])
+        return start, start + int(self._sizes[i])
+
+    def _get_record(self, object_id):
+        r = self._find(object_id)
+        if r is None:
+            return None
+        if six.PY2:
+            return self._mmap[r[0]:r[1]]
+        return memoryview(self._mmap)[r[0]:r[1]]
+
+    def get_encoded_skeletons(self, object_ids, tolerance=None):
+        if self._get_tolerance(tolerance) is not None:
+            return super(SkeletonFileSource, self).get_encoded_skeletons(object_ids, tolerance)
+        return [self._get_record(object_id) for object_id in object_ids]
+
+    def get_skeleton(self, object_id):
+        encoded = self._get_record(object_id)
+        if encoded is None:
+            return None
+        return decode(encoded, self)
+
+
 if __name__ == '__main__':
     # example on how to write an skeleton to disk
     with open('/tmp/3', 'w') as f:
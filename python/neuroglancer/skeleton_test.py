@@ -0,0 +1,198 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for skeleton.py"""
+
+from __future__ import absolute_import
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import numpy as np
+
+from . import skeleton
+
+
+class CountingSkeletonSource(skeleton.SkeletonSource):
+    encoded_cache_bytes = skeleton.DEFAULT_ENCODED_CACHE_BYTES
+
+    def __init__(self, skeletons):
+        super(CountingSkeletonSource, self).__init__()
+        self.vertex_attributes['radius'] = skeleton.VertexAttributeInfo(
+            data_type=np.float32, num_components=1)
+        self.skeletons = skeletons
+        self.requested_ids = []
+
+    def get_skeletons(self, object_ids):
+        self.requested_ids.append(list(object_ids))
+        return [self.skeletons.get(object_id) for object_id in object_ids]
+
+
+class SkeletonTest(unittest.TestCase):
+    def make_skeleton(self):
+        return skeleton.Skeleton(
+            vertex_positions=[[0, 0, 0], [1, 2, 3], [4, 5, 6]],
+            edges=[[0, 1], [1, 2]],
+            vertex_attributes=dict(radius=np.array([1, 2, 3], dtype='>f4')))
+
+    def test_encode(self):
+        source = CountingSkeletonSource({})
+        encoded = self.make_skeleton().encode(source)
+        self.assertEqual((3, 2), struct.unpack('<II', encoded[:8]))
+        offset = 8
+        positions = np.frombuffer(encoded[offset:offset + 36], dtype='<f4')
+        offset += 36
+        radius = np.frombuffer(encoded[offset:offset + 12], dtype='<f4')
+        offset += 12
+        edges = np.frombuffer(encoded[offset:], dtype='<u4')
+        np.testing.assert_array_equal([0, 0, 0, 1, 2, 3, 4, 5, 6], positions)
+        np.testing.assert_array_equal([1, 2, 3], radius)
+        np.testing.assert_array_equal([0, 1, 1, 2], edges)
+
+    def test_encode_invalid_attribute(self):
+        source = CountingSkeletonSource({})
+        s = self.make_skeleton()
+        s.vertex_attributes['radius'] = np.zeros(2)
+        with self.assertRaises(ValueError):
+            s.encode(source)
+
+    def test_encoded_cache(self):
+        s = self.make_skeleton()
+        source = CountingSkeletonSource({1: s, 2: s})
+        encoded = source.get_encoded_skeletons([1, 3, 2])
+        self.assertEqual([[1, 3, 2]], source.requested_ids)
+        self.assertEqual(s.encode(source), encoded[0])
+        self.assertIsNone(encoded[1])
+        self.assertEqual(encoded[0], encoded[2])
+
+        self.assertEqual(encoded[0], source.get_encoded_skeleton(1))
+        self.assertEqual(encoded[1:], source.get_encoded_skeletons([3, 2]))
+        self.assertEqual([[1, 3, 2], [3]], source.requested_ids)
+
+        source.invalidate()
+        source.get_encoded_skeleton(1)
+        self.assertEqual([[1, 3, 2], [3], [1]], source.requested_ids)
+
+    def test_encoded_cache_disabled_by_default(self):
+        s = self.make_skeleton()
+        source = CountingSkeletonSource({1: s})
+        source.encoded_cache_bytes = skeleton.SkeletonSource.encoded_cache_bytes
+        self.assertEqual(source.get_encoded_skeleton(1), source.get_encoded_skeleton(1))
+        self.assertEqual([[1], [1]], source.requested_ids)
+
+    def test_simplification_cache(self):
+        n = 100
+        positions = np.zeros((n, 3))
+        positions[:, 0] = np.arange(n)
+        s = skeleton.Skeleton(positions, np.stack([np.arange(n - 1), np.arange(1, n)], axis=1),
+                              vertex_attributes=dict(radius=np.ones(n)))
+        source = CountingSkeletonSource({1: s})
+        self.assertEqual(s.encode(source), source.get_encoded_skeleton(1))
+        simplified = source.get_encoded_skeleton(1, tolerance=1)
+        self.assertEqual(skeleton.simplify(s, 1).encode(source), simplified)
+        self.assertEqual((2, 1), struct.unpack('<II', simplified[:8]))
+        source.simplification_tolerance = 1
+        self.assertEqual(simplified, source.get_encoded_skeleton(1))
+        self.assertEqual([[1], [1]], source.requested_ids)
+
+
+class SimplifyTest(unittest.TestCase):
+    def test_keeps_branch_points_and_endpoints(self):
+        # Branch point at vertex 3, and a nearly straight branch through vertex 4.
+        positions = [[0, 0, 0], [1, 0.1, 0], [2, 0, 0], [3, 0, 0], [4, 1, 0], [4, -1, 0],
+                     [5, 2, 0], [10, 10, 10]]
+        edges = [[0, 1], [1, 2], [2, 3], [3, 4], [3, 5], [4, 6]]
+        result = skeleton.simplify(skeleton.Skeleton(positions, edges), 0.5)
+        np.testing.assert_array_equal([[0, 0, 0], [3, 0, 0], [4, -1, 0], [5, 2, 0], [10, 10, 10]],
+                                      result.vertex_positions)
+        np.testing.assert_array_equal([[0, 1], [1, 2], [1, 3]], result.edges)
+
+    def test_grid_collapse(self):
+        # Zig-zag chain, whose vertices are not collinear but lie in two grid cells.
+        positions = [[0, 0, 0], [0.5, 51, 0], [1, 50, 0], [1.5, 51, 0], [12, 50, 0], [12.5, 51, 0],
+                     [13, 50, 0], [20, 0, 0]]
+        edges = [[i, i + 1] for i in range(7)]
+        radius = np.arange(8, dtype=np.float32).reshape(8, 1)
+        result = skeleton.simplify(
+            skeleton.Skeleton(positions, edges, vertex_attributes=dict(radius=radius)), 10)
+        np.testing.assert_allclose([[0, 0, 0], [1, 152. / 3, 0], [12.5, 151. / 3, 0], [20, 0, 0]],
+                                   result.vertex_positions)
+        np.testing.assert_array_equal([[0], [2], [5], [7]], result.vertex_attributes['radius'])
+        np.testing.assert_array_equal([[0, 1], [1, 2], [2, 3]], result.edges)
+
+
+class SkeletonFileTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'skeletons')
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_round_trip(self):
+        vertex_attributes = CountingSkeletonSource({}).vertex_attributes
+        skeletons = dict()
+        for object_id in (2**63 + 5, 7, 3):
+            n = object_id % 5 + 2
+            skeletons[object_id] = skeleton.Skeleton(
+                vertex_positions=np.arange(n * 3).reshape(n, 3) * (object_id % 7),
+                edges=np.stack([np.arange(n - 1), np.arange(1, n)], axis=1),
+                vertex_attributes=dict(radius=np.arange(n).reshape(n, 1)))
+        skeleton.write_skeleton_file(self.path, skeletons.items(), vertex_attributes)
+
+        source = skeleton.SkeletonFileSource(self.path)
+        self.assertEqual(3, len(source))
+        self.assertEqual(list(vertex_attributes.items()), list(source.vertex_attributes.items()))
+        self.assertIsNone(source.get_encoded_skeleton(4))
+        self.assertIsNone(source.get_skeleton(2**64 - 1))
+        for object_id, s in skeletons.items():
+            self.assertEqual(s.encode(source), bytes(source.get_encoded_skeleton(object_id)))
+            decoded = source.get_skeleton(object_id)
+            np.testing.assert_array_equal(s.vertex_positions, decoded.vertex_positions)
+            np.testing.assert_array_equal(s.edges, decoded.edges)
+            np.testing.assert_array_equal(s.vertex_attributes['radius'],
+                                          decoded.vertex_attributes['radius'])
+
+    def test_large_ids(self):
+        object_ids = [2**60 + 1, 2**60 + 2, 2**60 + 3]
+        skeletons = [(object_id, skeleton.Skeleton([[object_id % 7, 0, 0]], []))
+                     for object_id in object_ids]
+        skeleton.write_skeleton_file(self.path, skeletons)
+        source = skeleton.SkeletonFileSource(self.path)
+        for object_id, s in skeletons:
+            self.assertEqual(s.encode(source), bytes(source.get_encoded_skeleton(object_id)))
+            self.assertEqual(
+                s.encode(source), bytes(source.get_encoded_skeleton(np.uint64(object_id))))
+        self.assertIsNone(source.get_encoded_skeleton(2**60))
+        self.assertIsNone(source.get_encoded_skeleton(2**60 + 4))
+        self.assertIsNone(source.get_encoded_skeleton(-1))
+        self.assertIsNone(source.get_encoded_skeleton(float(2**60 + 2)))
+
+    def test_empty(self):
+        skeleton.write_skeleton_file(self.path, [])
+        source = skeleton.SkeletonFileSource(self.path)
+        self.assertEqual(0, len(source))
+        self.assertIsNone(source.get_encoded_skeleton(1))
+
+    def test_duplicate_ids(self):
+        s = skeleton.Skeleton([[0, 0, 0]], [])
+        with self.assertRaises(ValueError):
+            skeleton.write_skeleton_file(self.path, [(1, s), (1, s)])
+        self.assertEqual([], os.listdir(self.temp_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -21,12 +21,16 @@ import six
 
 import sockjs.tornado
 
-from . import trackable_state, viewer_config_state
+from . import lru_cache, trackable_state, viewer_config_state
 from .json_utils import decode_json, encode_json
 
 SOCKET_PATH_REGEX_WITHOUT_GROUP = r'^/socket/(?:[^/]+)'
 SOCKET_PATH_REGEX = r'^/socket/(?P<viewer_token>[^/]+)'
 
+# Maximum number of action sessions without a connection or pending actions that are retained, so
+# that actions resent by clients that reconnect later are still not invoked again.
+MAX_IDLE_ACTION_SESSIONS = 256
+
 class ClientCredentialsHandler(object):
     def __init__(self, io_loop, private_state, config_state, credentials_manager):
         self.private_state = private_state
@@ -103,25 +107,76 @@ class StateHandler(object):
             del self._on_state_changed_callback
 
 
-class SockJSHandler(sockjs.tornado.SockJSConnection):
+class ActionSession(object):
+    """Actions received from a single client, possibly over several connections.
 
-    @property
-    def io_loop(self):
-        return self.session.server.io_loop
+    The client identifies itself by a random session id sent with each `action` message, and
+    resends the actions that have not been acknowledged after it reconnects.
+    """
 
-    def on_open(self, info):
-        server = self.session.server.neuroglancer_server
-        m = re.match(SOCKET_PATH_REGEX, info.path)
-        if m is None:
-          self.close()
-          return
+    def __init__(self):
+        # Id of the last action submitted for invocation, excluding cancelled actions.
+        self.last_submitted_id = -1
+        # Future of a submitted action that has not completed, or None if all have completed.
+        self.last_future = None
+        # Maps the future of each submitted action that may not have completed to its id.
+        self.pending = dict()
+        # Connection that submitted the most recent actions.  Only that connection cancels the
+        # pending actions when it is closed.
+        self.connection = None
 
-        viewer_token = self.viewer_token = m.group('viewer_token')
-        viewer = self.viewer = server.viewers.get(viewer_token)
 
-        if viewer is None:
-            self.close()
+class ActionSessionTable(object):
+    """Maps the session ids of the clients of a server to their `ActionSession` objects.
+
+    Sessions with an open connection or pending actions are always retained.  Other sessions are
+    idle, and only the `max_idle_sessions` most recently used idle sessions are retained, so that
+    the table does not grow with each page load.  Must only be used from the IO loop thread.
+    """
+
+    def __init__(self, max_idle_sessions=MAX_IDLE_ACTION_SESSIONS):
+        self._active = dict()
+        self._idle = lru_cache.LruCache(max_idle_sessions, get_size=lambda session: 1)
+
+    def get(self, key):
+        """Returns the session for `key`, creating it if it does not exist or has been evicted."""
+        session = self._active.get(key)
+        if session is None:
+            session = self._idle.pop(key)
+            if session is None:
+                session = ActionSession()
+            self._active[key] = session
+        return session
+
+    def release(self, key, session):
+        """Marks `session` as idle if it has no connection and no pending actions."""
+        if session.connection is not None or session.pending:
             return
+        if self._active.get(key) is session:
+            del self._active[key]
+            self._idle.set(key, session)
+
+
+class ViewerConnection(object):
+    """Implements the viewer state protocol for a single client connection, independent of the
+    transport.
+
+    @param send_message: Function that sends a JSON-encoded message string to the client.
+    @param action_sessions: `ActionSessionTable` shared by the connections of a server, so that
+        actions resent after a reconnection are not invoked again.  If not specified, actions are
+        only deduplicated within this connection.
+    """
+
+    def __init__(self, viewer, io_loop, send_message, action_sessions=None):
+        self.viewer = viewer
+        self.io_loop = io_loop
+        self._send_message = send_message
+        self.is_open = True
+        if action_sessions is None:
+            action_sessions = ActionSessionTable()
+        self._action_sessions = action_sessions
+        self._action_session = None
+        self._action_session_key = None
 
         private_state = self.private_state = trackable_state.TrackableState(
             viewer_config_state.PrivateState)
@@ -144,7 +199,7 @@ class SockJSHandler(sockjs.tornado.SockJSConnection):
                 if not self.is_open:
                     return
                 message = {'t': 'setState', 'k': key, 's': raw_state, 'g': generation}
-                self.send(encode_json(message))
+                self._send_message(encode_json(message))
 
             handler = StateHandler(
                 state=state,
@@ -156,11 +211,7 @@ class SockJSHandler(sockjs.tornado.SockJSConnection):
         for x in managed_states:
             make_state_handler(**x)
 
-        self.is_open = True
-
     def on_message(self, message_text):
-        if self.viewer is None:
-            return
         try:
             message = decode_json(message_text)
             if isinstance(message, dict):
@@ -174,9 +225,8 @@ class SockJSHandler(sockjs.tornado.SockJSConnection):
                     handler.receive_update(message['s'], six.text_type(message['g']))
                     return
                 if t == 'action':
-                    for action in message['actions']:
-                        self.io_loop.add_callback(self.viewer.actions.invoke, action['action'], action['state'])
-                    self.io_loop.add_callback(self.send, json.dumps({'t': 'ackAction', 'id': message['id']}))
+                    self._invoke_actions(int(message['id']), message['actions'],
+                                         message.get('session'))
         except:
             # import pdb
             # pdb.post_mortem()
@@ -184,11 +234,131 @@ class SockJSHandler(sockjs.tornado.SockJSConnection):
             traceback.print_exc()
             # Ignore malformed JSON
 
-    def on_close(self):
-        viewer = self.viewer
+    def _get_action_session(self, session_id):
+        if session_id is None:
+            # Actions from clients that do not send a session id are only deduplicated within a
+            # single connection.
+            if self._action_session is None:
+                self._action_session = ActionSession()
+            return self._action_session
+        key = (self.viewer.token, session_id)
+        session = self._action_sessions.get(key)
+        self._action_session = session
+        self._action_session_key = key
+        return session
+
+    def _release_action_session(self, session):
+        if self._action_session_key is not None:
+            self._action_sessions.release(self._action_session_key, session)
+
+    def _invoke_actions(self, last_id, actions, session_id=None):
+        """Invokes the actions with ids up to `last_id` that have not already been received.
+
+        The client resends all actions that have not been acknowledged, including after it
+        reconnects, and they are acknowledged only once they have completed.  Actions already
+        received from the same client session, possibly over a previous connection, are not
+        invoked again.
+        """
+        session = self._get_action_session(session_id)
+        session.connection = self
+        first_id = last_id - len(actions) + 1
+        new_actions = actions[max(0, session.last_submitted_id + 1 - first_id):]
+        if new_actions:
+            action_id = last_id - len(new_actions)
+
+            def on_done(f):
+                session.pending.pop(f, None)
+                if session.connection is None:
+                    self._release_action_session(session)
+
+            for action in new_actions:
+                action_id += 1
+                future = self.viewer.actions.submit(action['action'], action['state'])
+                session.pending[future] = action_id
+                future.add_done_callback(lambda f: self.io_loop.add_callback(on_done, f))
+            session.last_submitted_id = last_id
+            session.last_future = future
+        ack_message = json.dumps({'t': 'ackAction', 'id': last_id})
+        future = session.last_future
+        if future is None:
+            self.io_loop.add_callback(self._send_message, ack_message)
+            return
+
+        def send_ack(f):
+            if not f.cancelled():
+                self.io_loop.add_callback(self._send_message, ack_message)
+
+        future.add_done_callback(send_ack)
+
+    def _cancel_actions(self):
+        """Cancels the actions submitted by this connection that have not started.
+
+        They are no longer wanted, and will be resent if the client reconnects.
+        """
+        session = self._action_session
+        if session is None or session.connection is not self:
+            return
+        session.connection = None
+        remaining = []
+        cancelled_ids = []
+        for future, action_id in list(session.pending.items()):
+            if future.cancel():
+                del session.pending[future]
+                cancelled_ids.append(action_id)
+            else:
+                remaining.append((action_id, future))
+        if cancelled_ids:
+            # Actions run in order, so the cancelled actions are the last ones submitted.
+            session.last_submitted_id = min(cancelled_ids) - 1
+            session.last_future = max(remaining)[1] if remaining else None
+        self._release_action_session(session)
+
+    def close(self):
         self.is_open = False
-        if viewer is not None:
-            for state_handler in six.itervalues(self._state_handlers):
-                state_handler.close()
-            self._credentials_handler.close()
-        del self._state_handlers
+        self._cancel_actions()
+        for state_handler in six.itervalues(self._state_handlers):
+            state_handler.close()
+        self._credentials_handler.close()
+
+
+class SockJSHandler(sockjs.tornado.SockJSConnection):
+    """SockJS transport for the viewer state protocol.
+
+    Used by clients for which the WebSocket endpoint (`websocket_handler.WebSocketHandler`) is not
+    reachable.
+    """
+
+    connection = None
+
+    @property
+    def io_loop(self):
+        return self.session.server.io_loop
+
+    def on_open(self, info):
+        server = self.session.server.neuroglancer_server
+        m = re.match(SOCKET_PATH_REGEX, info.path)
+        if m is None:
+          self.close()
+          return
+
+        viewer_token = self.viewer_token = m.group('viewer_token')
+        viewer = self.viewer = server.viewers.get(viewer_token)
+
+        if viewer is None:
+            self.close()
+            return
+
+        self.connection = ViewerConnection(viewer, self.io_loop, self._send_if_open,
+                                           action_sessions=server.action_sessions)
+
+    def _send_if_open(self, message):
+        if self.connection is not None and self.connection.is_open:
+            self.send(message)
+
+    def on_message(self, message_text):
+        if self.connection is not None:
+            self.connection.on_message(message_text)
+
+    def on_close(self):
+        if self.connection is not None:
+            self.connection.close()
@@ -0,0 +1,174 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for sockjs_handler.py"""
+
+from __future__ import absolute_import
+
+import concurrent.futures
+import json
+import unittest
+
+from . import sockjs_handler, trackable_state, viewer_config_state, viewer_state
+
+
+class FakeIoLoop(object):
+    """Queues callbacks until `run` is called."""
+
+    def __init__(self):
+        self.callbacks = []
+
+    def add_callback(self, callback, *args):
+        self.callbacks.append((callback, args))
+
+    def run(self):
+        while self.callbacks:
+            callback, args = self.callbacks.pop(0)
+            callback(*args)
+
+
+class FakeActions(object):
+    """Records submitted actions, whose futures are completed by the test."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, name, state):
+        future = concurrent.futures.Future()
+        self.submitted.append((name, future))
+        return future
+
+
+class FakeViewer(object):
+    def __init__(self):
+        self.token = 'viewer'
+        self.shared_state = trackable_state.TrackableState(viewer_state.ViewerState)
+        self.config_state = trackable_state.TrackableState(viewer_config_state.ConfigState)
+        self.actions = FakeActions()
+
+
+def make_actions(*names):
+    return [dict(action=name, state={}) for name in names]
+
+
+def complete(future):
+    future.set_running_or_notify_cancel()
+    future.set_result(None)
+
+
+class ViewerConnectionActionsTest(unittest.TestCase):
+    def setUp(self):
+        self.viewer = FakeViewer()
+        self.io_loop = FakeIoLoop()
+        self.action_sessions = sockjs_handler.ActionSessionTable(max_idle_sessions=2)
+        self.connections = []
+
+    def tearDown(self):
+        for connection, _ in self.connections:
+            if connection.is_open:
+                connection.close()
+
+    def connect(self):
+        messages = []
+        connection = sockjs_handler.ViewerConnection(
+            self.viewer, self.io_loop, messages.append, action_sessions=self.action_sessions)
+        self.connections.append((connection, messages))
+        return connection, messages
+
+    def get_acks(self, messages):
+        self.io_loop.run()
+        return [m['id'] for m in map(json.loads, messages) if m['t'] == 'ackAction']
+
+    def get_submitted_names(self):
+        return [name for name, _ in self.viewer.actions.submitted]
+
+    def test_resent_ids(self):
+        connection, messages = self.connect()
+        connection._invoke_actions(1, make_actions('a', 'b'), 's')
+        # The client resends 'b', which has not been acknowledged, along with a new action.
+        connection._invoke_actions(2, make_actions('b', 'c'), 's')
+        self.assertEqual(['a', 'b', 'c'], self.get_submitted_names())
+        self.assertEqual([], self.get_acks(messages))
+        for _, future in self.viewer.actions.submitted:
+            complete(future)
+        self.assertEqual([1, 2], self.get_acks(messages))
+
+    def test_cancel_on_close(self):
+        connection, _ = self.connect()
+        connection._invoke_actions(2, make_actions('a', 'b', 'c'), 's')
+        submitted = self.viewer.actions.submitted
+        # 'a' has started, so only 'b' and 'c' are cancelled when the connection closes.
+        submitted[0][1].set_running_or_notify_cancel()
+        connection.close()
+        self.assertTrue(submitted[1][1].cancelled())
+        self.assertTrue(submitted[2][1].cancelled())
+
+        connection, messages = self.connect()
+        connection._invoke_actions(2, make_actions('a', 'b', 'c'), 's')
+        self.assertEqual(['a', 'b', 'c', 'b', 'c'], self.get_submitted_names())
+        submitted[0][1].set_result(None)
+        complete(submitted[3][1])
+        complete(submitted[4][1])
+        self.assertEqual([2], self.get_acks(messages))
+
+    def test_ack_completed_resend(self):
+        connection, _ = self.connect()
+        connection._invoke_actions(0, make_actions('a'), 's')
+        future = self.viewer.actions.submitted[0][1]
+        future.set_running_or_notify_cancel()
+        connection.close()
+        # The action completes after the connection closed, so its acknowledgement was not sent.
+        future.set_result(None)
+        self.io_loop.run()
+
+        connection, messages = self.connect()
+        connection._invoke_actions(0, make_actions('a'), 's')
+        self.assertEqual(['a'], self.get_submitted_names())
+        self.assertEqual([0], self.get_acks(messages))
+
+    def test_without_session_id(self):
+        connection, messages = self.connect()
+        connection._invoke_actions(0, make_actions('a'), None)
+        connection._invoke_actions(1, make_actions('a', 'b'), None)
+        self.assertEqual(['a', 'b'], self.get_submitted_names())
+        connection.close()
+        connection, messages = self.connect()
+        connection._invoke_actions(1, make_actions('a', 'b'), None)
+        self.assertEqual(['a', 'b', 'a', 'b'], self.get_submitted_names())
+
+    def test_idle_sessions_evicted(self):
+        sessions = self.action_sessions
+        for session_id in ['s0', 's1', 's2']:
+            connection, _ = self.connect()
+            connection._invoke_actions(0, make_actions(session_id), session_id)
+            self.viewer.actions.submitted[-1][1].set_running_or_notify_cancel()
+            connection.close()
+        # Sessions with running actions are retained after their connection closes.
+        self.assertEqual(3, len(sessions._active))
+        for _, future in self.viewer.actions.submitted:
+            future.set_result(None)
+        self.io_loop.run()
+        self.assertEqual({}, sessions._active)
+        self.assertIsNone(sessions._idle.get(('viewer', 's0')))
+        self.assertIsNotNone(sessions._idle.get(('viewer', 's2')))
+
+        # A session that is still connected is not evicted.
+        connection, _ = self.connect()
+        connection._invoke_actions(0, make_actions('a'), 's3')
+        complete(self.viewer.actions.submitted[-1][1])
+        self.io_loop.run()
+        self.assertIn(('viewer', 's3'), sessions._active)
+
+
+if __name__ == '__main__':
+    unittest.main()
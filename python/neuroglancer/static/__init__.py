@@ -12,8 +12,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import gzip
+import hashlib
+import io
 import os
 import posixpath
+import threading
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 static_content_filenames = set(['main.bundle.js', 'chunk_worker.bundle.js', 'styles.css', 'index.html'])
 
@@ -25,11 +35,68 @@ mime_type_map = {
 }
 
 
+# Content smaller than this is not worth compressing.
+min_compressed_size = 1024
+
+gzip_compression_level = 9
+
+# Quality 11 is only marginally smaller but much slower to compute.
+brotli_quality = 9
+
+EncodedContent = collections.namedtuple('EncodedContent',
+                                        ['data', 'content_type', 'content_encoding', 'etag'])
+
+
 def guess_mime_type_from_path(path):
     return mime_type_map.get(posixpath.splitext(path)[1], 'application/octet-stream')
 
 
+def parse_accept_encoding(header):
+    """Returns the set of content codings accepted according to an Accept-Encoding header."""
+    encodings = set()
+    for part in header.split(','):
+        params = part.split(';')
+        coding = params[0].strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params[1:]:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    pass
+        if quality > 0:
+            encodings.add(coding)
+    return encodings
+
+
+def compute_etag(data):
+    return '"%s"' % hashlib.sha1(data).hexdigest()
+
+
+def _gzip_compress(data):
+    f = io.BytesIO()
+    # Fixed mtime, so that the output is deterministic.
+    with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=gzip_compression_level, mtime=0) as g:
+        g.write(data)
+    return f.getvalue()
+
+
+def _get_compressors():
+    compressors = []
+    if brotli is not None:
+        compressors.append(('br', lambda data: brotli.compress(data, quality=brotli_quality)))
+    compressors.append(('gzip', _gzip_compress))
+    return compressors
+
+
 class StaticContentSource(object):
+    # Indicates whether the content for a given name never changes, in which case clients may
+    # cache it indefinitely.
+    immutable = False
+
     def get(self, name):
         if name == '':
             name = 'index.html'
@@ -38,6 +105,67 @@ class StaticContentSource(object):
     def get_content(self, name):
         raise NotImplementedError
 
+    def get_encoded(self, name, accepted_encodings=()):
+        """Returns an `EncodedContent` tuple for `name`.
+
+        @param accepted_encodings: Set of content codings, such as 'gzip' or 'br', that the client
+            accepts.  The returned content_encoding is either one of these or None.
+        """
+        data, content_type = self.get(name)
+        return EncodedContent(data=data, content_type=content_type, content_encoding=None,
+                              etag=compute_etag(data))
+
+
+class CachingStaticContentSource(StaticContentSource):
+    """Memoizes the content of another source.
+
+    Compressed variants are computed once, the first time they are requested, and content is
+    treated as immutable.
+    """
+
+    immutable = True
+
+    def __init__(self, source):
+        self.source = source
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        encoded = self.get_encoded(name)
+        return encoded.data, encoded.content_type
+
+    def _get_variants(self, name):
+        variants = self._cache.get(name)
+        if variants is None:
+            data, content_type = self.source.get(name)
+            etag = compute_etag(data)
+            variants = {None: EncodedContent(data=data, content_type=content_type,
+                                             content_encoding=None, etag=etag)}
+            with self._lock:
+                variants = self._cache.setdefault(name, variants)
+        return variants
+
+    def get_encoded(self, name, accepted_encodings=()):
+        variants = self._get_variants(name)
+        identity = variants[None]
+        if len(identity.data) < min_compressed_size:
+            return identity
+        for encoding, compress in _get_compressors():
+            if encoding not in accepted_encodings:
+                continue
+            if encoding not in variants:
+                data = compress(identity.data)
+                if len(data) >= len(identity.data):
+                    variant = identity
+                else:
+                    variant = EncodedContent(data=data, content_type=identity.content_type,
+                                             content_encoding=encoding,
+                                             etag=identity.etag[:-1] + '-' + encoding + '"')
+                with self._lock:
+                    variants.setdefault(encoding, variant)
+            return variants[encoding]
+        return identity
+
 
 class PkgResourcesContentSource(StaticContentSource):
     def get_content(self, name):
@@ -84,7 +212,7 @@ dist_dev_static_content_source = FileSource()
 
 
 def get_default_static_content_source():
-    return PkgResourcesContentSource()
+    return CachingStaticContentSource(PkgResourcesContentSource())
 
 
 def get_static_content_source(source=None, url=None, path=None, file_open=None):
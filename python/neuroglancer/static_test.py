@@ -0,0 +1,69 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for static/__init__.py"""
+
+from __future__ import absolute_import
+
+import gzip
+import io
+import unittest
+
+from . import static
+
+
+class CountingSource(static.StaticContentSource):
+    def __init__(self, content):
+        self.content = content
+        self.num_reads = 0
+
+    def get_content(self, name):
+        self.num_reads += 1
+        return self.content
+
+
+class CachingStaticContentSourceTest(unittest.TestCase):
+    def test_parse_accept_encoding(self):
+        self.assertEqual(
+            set(['gzip', 'br']), static.parse_accept_encoding('gzip, deflate;q=0, br;q=0.5'))
+        self.assertEqual(set(), static.parse_accept_encoding(''))
+
+    def test_memoize(self):
+        content = b'var x = 1;\n' * 1000
+        base = CountingSource(content)
+        source = static.CachingStaticContentSource(base)
+        self.assertEqual((content, 'application/javascript'), source.get('main.bundle.js'))
+        encoded = source.get_encoded('main.bundle.js', set(['gzip']))
+        self.assertEqual('gzip', encoded.content_encoding)
+        self.assertEqual(content, gzip.GzipFile(fileobj=io.BytesIO(encoded.data)).read())
+        self.assertIs(encoded, source.get_encoded('main.bundle.js', set(['gzip'])))
+        identity = source.get_encoded('main.bundle.js')
+        self.assertIsNone(identity.content_encoding)
+        self.assertNotEqual(identity.etag, encoded.etag)
+        self.assertEqual(1, base.num_reads)
+        self.assertEqual('text/html', source.get('')[1])
+
+    def test_small_content_not_compressed(self):
+        source = static.CachingStaticContentSource(CountingSource(b'x'))
+        self.assertIsNone(source.get_encoded('styles.css', set(['gzip'])).content_encoding)
+
+    def test_only_packaged_source_cached(self):
+        self.assertIsInstance(static.get_default_static_content_source(),
+                              static.CachingStaticContentSource)
+        source = static.get_static_content_source(url='http://localhost:8080')
+        self.assertIsInstance(source, static.HttpSource)
+        self.assertFalse(source.immutable)
+
+
+if __name__ == '__main__':
+    unittest.main()
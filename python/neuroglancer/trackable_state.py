@@ -17,6 +17,7 @@ from __future__ import absolute_import
 import contextlib
 import copy
 import threading
+import traceback
 
 from .random_token import make_random_token
 
@@ -24,29 +25,111 @@ from .random_token import make_random_token
 class ConcurrentModificationError(RuntimeError):
     pass
 
+_notification_executor = None
+_notification_executor_lock = threading.Lock()
+
+
+def _get_notification_executor():
+    global _notification_executor
+    with _notification_executor_lock:
+        if _notification_executor is None:
+            import concurrent.futures
+            _notification_executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+        return _notification_executor
+
+
+class _BatchedCallback(object):
+    """Invokes a callback on an executor, coalescing the notifications received while a previous
+    invocation is pending or running into a single further invocation."""
+
+    def __init__(self, callback, executor):
+        self.callback = callback
+        self.executor = executor
+        self._lock = threading.Lock()
+        # True while an invocation is queued on, or running on, the executor.
+        self._scheduled = False
+        # True if notified since the last invocation started.
+        self._pending = False
+        self._removed = False
+
+    def notify(self):
+        with self._lock:
+            if self._removed:
+                return
+            self._pending = True
+            if self._scheduled:
+                return
+            self._scheduled = True
+        executor = self.executor
+        if executor is None:
+            executor = _get_notification_executor()
+        try:
+            executor.submit(self._run)
+        except RuntimeError:
+            # Executor has been shut down.
+            with self._lock:
+                self._scheduled = False
+
+    def remove(self):
+        with self._lock:
+            self._removed = True
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._pending or self._removed:
+                    self._scheduled = False
+                    return
+                self._pending = False
+            try:
+                self.callback()
+            except:
+                traceback.print_exc()
+
+
 class ChangeNotifier(object):
     def __init__(self):
         self.__changed_callbacks = set()
+        self.__batched_callbacks = dict()
         self.change_count = 0
         self.__lock = threading.Lock()
 
-    def add_changed_callback(self, callback):
+    def add_changed_callback(self, callback, batched=False, executor=None):
         """Registers a callback to be invoked when the state changes.
 
-        The callback is invoked immediately with no arguments.  The callback must not block.
+        By default, the callback is invoked immediately with no arguments, by the thread that made
+        the change and while holding the notifier lock.  The callback must not block.
+
+        If `batched` is True, the callback is instead invoked with no arguments on `executor`,
+        which defaults to a thread pool shared by all notifiers, without holding the lock.  Changes
+        made while an invocation is pending or running result in at most one further invocation,
+        and the callback is never invoked concurrently with itself.  Batched callbacks may
+        therefore do real work, such as serializing the state, but should read the current state
+        rather than assume that each change is reported separately.
         """
         with self.__lock:
-            self.__changed_callbacks.add(callback)
+            if batched:
+                if callback not in self.__batched_callbacks:
+                    self.__batched_callbacks[callback] = _BatchedCallback(callback, executor)
+            else:
+                self.__changed_callbacks.add(callback)
 
     def remove_changed_callback(self, callback):
         with self.__lock:
-            self.__changed_callbacks.remove(callback)
+            batched_callback = self.__batched_callbacks.pop(callback, None)
+            if batched_callback is None:
+                self.__changed_callbacks.remove(callback)
+                return
+        batched_callback.remove()
 
     def _dispatch_changed_callbacks(self):
         with self.__lock:
             self.change_count += 1
             for callback in self.__changed_callbacks:
                 callback()
+            batched_callbacks = list(self.__batched_callbacks.values())
+        for batched_callback in batched_callbacks:
+            batched_callback.notify()
 
 class TrackableState(ChangeNotifier):
     def __init__(self, wrapper_type, transform_state=None):
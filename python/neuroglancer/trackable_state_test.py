@@ -0,0 +1,111 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for trackable_state.py"""
+
+from __future__ import absolute_import
+
+import threading
+import unittest
+
+from . import json_wrappers, trackable_state, viewer_state
+
+
+class ChangeNotifierTest(unittest.TestCase):
+    def test_batched_callback(self):
+        notifier = trackable_state.ChangeNotifier()
+        started = threading.Event()
+        release = threading.Event()
+        finished = threading.Event()
+        threads = []
+
+        def callback():
+            threads.append(threading.current_thread())
+            if len(threads) == 1:
+                started.set()
+                release.wait()
+            else:
+                finished.set()
+
+        notifier.add_changed_callback(callback, batched=True)
+        notifier._dispatch_changed_callbacks()
+        started.wait()
+        # Notifications received while the callback is running are coalesced.
+        for _ in range(5):
+            notifier._dispatch_changed_callbacks()
+        release.set()
+        finished.wait()
+        self.assertEqual(2, len(threads))
+        self.assertNotIn(threading.current_thread(), threads)
+        self.assertEqual(6, notifier.change_count)
+
+    def test_remove_batched_callback(self):
+        notifier = trackable_state.ChangeNotifier()
+        calls = []
+        callback = lambda: calls.append(True)
+        notifier.add_changed_callback(callback, batched=True)
+        notifier.remove_changed_callback(callback)
+        notifier._dispatch_changed_callbacks()
+        self.assertEqual([], calls)
+
+
+class ReadonlyStateTest(unittest.TestCase):
+    def _run_threads(self, target, num_threads=8):
+        start = threading.Event()
+        errors = []
+
+        def run():
+            start.wait()
+            try:
+                target()
+            except Exception as e:  # pylint: disable=broad-except
+                errors.append(e)
+
+        threads = [threading.Thread(target=run) for _ in range(num_threads)]
+        for t in threads:
+            t.start()
+        start.set()
+        for t in threads:
+            t.join()
+        self.assertEqual([], errors)
+
+    def test_concurrent_typed_list_access(self):
+        list_type = json_wrappers.typed_list(json_wrappers.text_type)
+        for _ in range(20):
+            x = list_type([u'a', u'b', u'c'], _readonly=True)
+            results = []
+
+            def target():
+                results.append((len(x), list(x), len(x)))
+
+            self._run_threads(target)
+            self.assertEqual([(3, [u'a', u'b', u'c'], 3)] * 8, results)
+
+    def test_concurrent_layer_access(self):
+        state = viewer_state.ViewerState()
+        for i in range(10):
+            state.layers.append(name='layer%d' % i, layer=viewer_state.ImageLayer())
+        json_data = state.to_json()
+        for _ in range(20):
+            layers = viewer_state.ViewerState(json_data, _readonly=True).layers
+            results = []
+
+            def target():
+                results.append([id(layer) for layer in layers])
+
+            self._run_threads(target)
+            self.assertEqual([[id(layer) for layer in layers]] * 8, results)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,9 +14,11 @@
 
 from __future__ import absolute_import
 
+import base64
 import collections
 import json
 import re
+import zlib
 
 from six.moves import urllib
 
@@ -25,61 +27,64 @@ from .json_utils import json_encoder_default
 from .json_wrappers import to_json
 
 SINGLE_QUOTE_STRING_PATTERN = u'(\'(?:[^\'\\\\]|(?:\\\\.))*\')'
-DOUBLE_QUOTE_STRING_PATTERN = u'("(?:[^\'\\\\]|(?:\\\\.))*")'
+DOUBLE_QUOTE_STRING_PATTERN = u'("(?:[^"\\\\]|(?:\\\\.))*")'
 SINGLE_OR_DOUBLE_QUOTE_STRING_PATTERN = SINGLE_QUOTE_STRING_PATTERN + u'|' + DOUBLE_QUOTE_STRING_PATTERN
 DOUBLE_OR_SINGLE_QUOTE_STRING_PATTERN = DOUBLE_QUOTE_STRING_PATTERN + u'|' + SINGLE_QUOTE_STRING_PATTERN
 
+# Patterns matching, within the contents of a string literal, the escape sequences and the quote
+# characters that must be escaped when the literal is converted to use double or single quotes,
+# respectively.
+DOUBLE_QUOTE_PATTERN = re.compile(u'\\\\.|"', re.DOTALL)
+SINGLE_QUOTE_PATTERN = re.compile(u'\\\\.|\'', re.DOTALL)
 
-DOUBLE_QUOTE_PATTERN = u'^((?:[^"\'\\\\]|(?:\\\\.))*)"'
-SINGLE_QUOTE_PATTERN = u'^((?:[^"\'\\\\]|(?:\\\\.))*)\''
+# Matches a single token: a string literal delimited by single or double quotes, or a character that
+# is converted to a comma.  All other characters are copied unchanged.
+_TOKEN_PATTERN = re.compile(SINGLE_OR_DOUBLE_QUOTE_STRING_PATTERN + u'|([&_,])', re.DOTALL)
+
+# Prefix of the compressed fragment encoding produced by `to_url_fragment(compress=True)`: the JSON
+# state, compressed with zlib and encoded as unpadded base64url.  The digit is the format version.
+COMPRESSED_FRAGMENT_PREFIX = u'z1.'
 
 
 def _convert_string_literal(x, quote_initial, quote_replace, quote_search):
+    """Converts a string literal delimited by `quote_initial` into one delimited by `quote_replace`.
+
+    @param quote_search: Compiled `DOUBLE_QUOTE_PATTERN` or `SINGLE_QUOTE_PATTERN`, corresponding to
+        `quote_replace`.
+    """
     if len(x) >= 2 and x[0] == quote_initial and x[-1] == quote_initial:
         inner = x[1:-1]
-        s = quote_replace
-        while inner:
-            m = re.search(quote_search, inner)
-            if m is None:
-                s += inner
-                break
-            s += m.group(1)
-            s += u'\\'
-            s += quote_replace
-            inner = inner[m.end():]
-        s += quote_replace
-        return s
+        if u'\\' not in inner and quote_replace not in inner:
+            return quote_replace + inner + quote_replace
+        escaped_initial = u'\\' + quote_initial
+
+        def replace(m):
+            token = m.group(0)
+            if token == quote_replace:
+                return u'\\' + token
+            if token == escaped_initial:
+                return quote_initial
+            return token
+
+        return quote_replace + quote_search.sub(replace, inner) + quote_replace
     return x
 
 
 def _convert_json_helper(x, desired_comma_char, desired_quote_char):
-    comma_search = u'[&_,]'
     if desired_quote_char == u'"':
         quote_initial = u'\''
         quote_search = DOUBLE_QUOTE_PATTERN
-        string_literal_pattern = SINGLE_OR_DOUBLE_QUOTE_STRING_PATTERN
     else:
         quote_initial = u'"'
         quote_search = SINGLE_QUOTE_PATTERN
-        string_literal_pattern = DOUBLE_OR_SINGLE_QUOTE_STRING_PATTERN
-    s = u''
-    while x:
-        m = re.search(string_literal_pattern, x)
-        if m is None:
-            before = x
-            x = u''
-            replacement = u''
-        else:
-            before = x[:m.start()]
-            x = x[m.end():]
-            original_string = m.group(1)
-            if original_string is not None:
-                replacement = _convert_string_literal(original_string, quote_initial, desired_quote_char, quote_search)
-            else:
-                replacement = m.group(2)
-        s += re.sub(comma_search, desired_comma_char, before)
-        s += replacement
-    return s
+
+    def replace(m):
+        literal = m.group(1) or m.group(2)
+        if literal is None:
+            return desired_comma_char
+        return _convert_string_literal(literal, quote_initial, desired_quote_char, quote_search)
+
+    return _TOKEN_PATTERN.sub(replace, x)
 
 
 def url_safe_to_json(x):
@@ -88,10 +93,25 @@ def url_safe_to_json(x):
 def json_to_url_safe(x):
     return _convert_json_helper(x, u'_', u'\'')
 
+
+def _compress_json(json_string):
+    compressed = zlib.compress(json_string.encode('utf-8'), 9)
+    return COMPRESSED_FRAGMENT_PREFIX + base64.urlsafe_b64encode(compressed).decode('ascii').rstrip(
+        u'=')
+
+
+def _decompress_json(fragment_value):
+    encoded = fragment_value[len(COMPRESSED_FRAGMENT_PREFIX):].encode('ascii')
+    encoded += b'=' * (-len(encoded) % 4)
+    return zlib.decompress(base64.urlsafe_b64decode(encoded)).decode('utf-8')
+
+
 def url_fragment_to_json(fragment_value):
     unquoted = urllib.parse.unquote(fragment_value)
     if unquoted.startswith('!'):
         unquoted = unquoted[1:]
+    if unquoted.startswith(COMPRESSED_FRAGMENT_PREFIX):
+        return _decompress_json(unquoted)
     return url_safe_to_json(unquoted)
 
 
@@ -102,15 +122,23 @@ def parse_url_fragment(fragment_value):
 
 
 def parse_url(url):
+    """Parses the viewer state from a Neuroglancer URL, in either the plain or compressed form."""
     result = urllib.parse.urlparse(url)
     return parse_url_fragment(result.fragment)
 
-def to_url_fragment(state):
+def to_url_fragment(state, compress=False):
+    """Returns the URL fragment, excluding the initial `#!`, representing `state`.
+
+    @param compress: If `True`, the fragment is compressed, which makes it much shorter for states
+        with many segments, but not human-readable.
+    """
     json_string = json.dumps(to_json(state), separators=(u',', u':'), default=json_encoder_default)
+    if compress:
+        return _compress_json(json_string)
     return urllib.parse.quote(json_string, safe=u'~@#$&()*!+=:;,.?/\'')
 
 
 default_neuroglancer_url = u'https://neuroglancer-demo.appspot.com'
 
-def to_url(state, prefix=default_neuroglancer_url):
-    return u'%s#!%s' % (prefix, to_url_fragment(state))
+def to_url(state, prefix=default_neuroglancer_url, compress=False):
+    return u'%s#!%s' % (prefix, to_url_fragment(state, compress=compress))
@@ -16,7 +16,7 @@ from __future__ import absolute_import
 
 import unittest
 
-from . import url_state
+from . import url_state, viewer_state
 
 
 class ConvertStringLiteralTest(unittest.TestCase):
@@ -45,6 +45,31 @@ class UrlSafeToJson(unittest.TestCase):
         self.assertEqual(url_state.url_safe_to_json("""['a'_true]"""), """["a",true]""")
         self.assertEqual(url_state.url_safe_to_json("""['a',true]"""), """["a",true]""")
 
+    def test_quotes(self):
+        self.assertEqual(
+            url_state.url_safe_to_json(u"""{'a\\'b':'x"y_z'_'c':[1_2]}"""),
+            u"""{"a'b":"x\\"y_z","c":[1,2]}""")
+        self.assertEqual(url_state.url_safe_to_json(u'{"a":"b","c":"d"}'), u'{"a":"b","c":"d"}')
+
+    def test_round_trip(self):
+        json_string = u'{"a\\"b":"c\'d_e,f","g":[1,2,"\\u00e9\\\\"]}'
+        url_safe = url_state.json_to_url_safe(json_string)
+        self.assertEqual(u"""{'a"b':'c\\'d_e,f'_'g':[1_2_'\\u00e9\\\\']}""", url_safe)
+        self.assertEqual(json_string, url_state.url_safe_to_json(url_safe))
+
+
+class UrlTest(unittest.TestCase):
+    def test_compressed(self):
+        state = viewer_state.ViewerState()
+        state.layers['a'] = viewer_state.SegmentationLayer(
+            source='precomputed://gs://bucket/path', segments=range(1, 1000))
+        url = url_state.to_url(state)
+        compressed_url = url_state.to_url(state, compress=True)
+        self.assertTrue(compressed_url.startswith(url_state.default_neuroglancer_url + '#!z1.'))
+        self.assertLess(len(compressed_url), len(url) // 2)
+        self.assertEqual(state.to_json(), url_state.parse_url(url).to_json())
+        self.assertEqual(state.to_json(), url_state.parse_url(compressed_url).to_json())
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -14,22 +14,29 @@
 
 from __future__ import absolute_import
 
+import collections
 import contextlib
 import json
-import re
 
 import six
 
-from . import local_volume, trackable_state, viewer_config_state, viewer_state
-from .json_utils import decode_json, encode_json, json_encoder_default
+from . import local_volume, point_list, trackable_state, viewer_config_state, viewer_state
+from .json_utils import decode_json, json_encoder_default
 from .random_token import make_random_token
 
 
 class LocalVolumeManager(trackable_state.ChangeNotifier):
+    """Tracks the LocalVolume and LocalPointList objects referenced by the layers of a viewer state.
+
+    Volumes are added by `register_volume` when a state containing them is encoded, and removed by
+    `update` once no layer references them.
+    """
+
     def __init__(self, token_prefix):
         super(LocalVolumeManager, self).__init__()
         self.volumes = dict()
         self.__token_prefix = token_prefix
+        self.__url_prefix = 'python://' + token_prefix
 
     def register_volume(self, v):
         if v.token not in self.volumes:
@@ -40,15 +47,30 @@ class LocalVolumeManager(trackable_state.ChangeNotifier):
     def get_volume_key(self, v):
         return self.__token_prefix + v.token
 
-    def update(self, json_str):
-        pattern = '|'.join(self.volumes)
-        present_tokens = set()
-        for m in re.finditer(pattern, json_str):
-            present_tokens.add(m.group(0))
-        volumes_to_delete = []
-        for x in self.volumes:
-            if x not in present_tokens:
-                volumes_to_delete.append(x)
+    def get_referenced_tokens(self, raw_state):
+        """Returns a Counter mapping the token of each volume referenced by the layers of `raw_state`
+        to the number of references."""
+        url_prefix = self.__url_prefix
+        tokens = collections.Counter()
+        layers = raw_state.get('layers') if isinstance(raw_state, dict) else None
+        if not isinstance(layers, dict):
+            return tokens
+        for layer in six.itervalues(layers):
+            if not isinstance(layer, dict):
+                continue
+            for value in six.itervalues(layer):
+                if isinstance(value, six.string_types) and value.startswith(url_prefix):
+                    tokens[value[len(url_prefix):]] += 1
+        return tokens
+
+    def update(self, raw_state):
+        """Removes the volumes that are not referenced by the layers of `raw_state`.
+
+        Only the layers are examined, rather than the entire state, so the cost is proportional to
+        the number of layers.
+        """
+        reference_counts = self.get_referenced_tokens(raw_state)
+        volumes_to_delete = [x for x in self.volumes if x not in reference_counts]
         for x in volumes_to_delete:
             del self.volumes[x]
         if volumes_to_delete:
@@ -100,7 +122,7 @@ class ViewerCommonBase(object):
             new_state = new_state.to_json()
 
             def encoder(x):
-                if isinstance(x, local_volume.LocalVolume):
+                if isinstance(x, (local_volume.LocalVolume, point_list.LocalPointList)):
                     return self.volume_manager.register_volume(x)
                 return json_encoder_default(x)
 
@@ -117,7 +139,7 @@ class ViewerBase(ViewerCommonBase):
         self.shared_state = trackable_state.TrackableState(viewer_state.ViewerState,
                                                            self._transform_viewer_state)
         self.shared_state.add_changed_callback(
-            lambda: self.volume_manager.update(encode_json(self.shared_state.raw_state)))
+            lambda: self.volume_manager.update(self.shared_state.raw_state))
 
     @property
     def state(self):
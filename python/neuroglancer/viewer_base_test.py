@@ -0,0 +1,60 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for viewer_base.py"""
+
+from __future__ import absolute_import
+
+import unittest
+
+import numpy as np
+
+from . import local_volume, viewer_base
+
+
+class LocalVolumeManagerTest(unittest.TestCase):
+    def test_update(self):
+        manager = viewer_base.LocalVolumeManager('viewer.')
+        changes = []
+        manager.add_changed_callback(lambda: changes.append(True))
+        a = local_volume.LocalVolume(np.zeros((2, 2, 2), dtype=np.uint8))
+        b = local_volume.LocalVolume(np.zeros((2, 2, 2), dtype=np.uint8))
+        url_a = manager.register_volume(a)
+        url_b = manager.register_volume(b)
+        self.assertEqual('python://viewer.' + a.token, url_a)
+        self.assertEqual(2, len(changes))
+
+        raw_state = {
+            'layers': {
+                'a': {'type': 'image', 'source': url_a},
+                'a2': {'type': 'segmentation', 'source': url_a},
+                'other': {'type': 'image', 'source': 'python://other.' + b.token},
+            },
+        }
+        self.assertEqual({a.token: 2}, dict(manager.get_referenced_tokens(raw_state)))
+        manager.update(raw_state)
+        self.assertEqual([a.token], list(manager.volumes))
+        self.assertEqual(3, len(changes))
+
+        del raw_state['layers']['a']
+        manager.update(raw_state)
+        self.assertEqual([a.token], list(manager.volumes))
+        self.assertEqual(3, len(changes))
+
+        manager.update({})
+        self.assertEqual({}, manager.volumes)
+        self.assertEqual(4, len(changes))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,12 +16,13 @@ from __future__ import absolute_import
 
 import collections
 import numbers
+import threading
 import traceback
 
 import numpy as np
 import six
 
-from . import viewer_state
+from . import metrics, viewer_state
 from .json_utils import decode_json, encode_json, json_encoder_default
 from .json_wrappers import (JsonObjectWrapper, array_wrapper, optional, text_type, typed_set,
                             typed_string_map, wrapped_property)
@@ -56,6 +57,8 @@ class Actions(object):
     def __init__(self, set_config):
         self._action_handlers = dict()
         self._set_config = set_config
+        self._executor = None
+        self._executor_lock = threading.Lock()
 
     def add(self, name, handler):
         self._action_handlers.setdefault(name, set()).add(handler)
@@ -81,11 +84,27 @@ class Actions(object):
         state = ActionState(state)
         handlers = self._action_handlers.get(name)
         if handlers is not None:
-            for handler in handlers:
-                try:
-                    handler(state)
-                except:
-                    traceback.print_exc()
+            with metrics.action_seconds.time(action=name):
+                for handler in handlers:
+                    try:
+                        handler(state)
+                    except:
+                        traceback.print_exc()
+
+    def submit(self, name, state):
+        """Invokes the handlers of action `name` on the action worker thread of this viewer.
+
+        Actions are invoked one at a time, in the order in which they are submitted, so that slow
+        handlers do not block the server.
+
+        @returns A future that is done once the handlers have completed.  Cancelling the future
+            before the action starts prevents it from being invoked.
+        """
+        with self._executor_lock:
+            if self._executor is None:
+                import concurrent.futures
+                self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+            return self._executor.submit(self.invoke, name, state)
 
 EventActionMap = typed_string_map(text_type)
 
@@ -0,0 +1,50 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for viewer_config_state.py"""
+
+from __future__ import absolute_import
+
+import threading
+import unittest
+
+from . import viewer_config_state
+
+
+class ActionsTest(unittest.TestCase):
+    def test_submit_order(self):
+        actions = viewer_config_state.Actions(set_config=lambda names: None)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def slow(s):
+            started.set()
+            release.wait()
+            calls.append('slow')
+
+        actions.add('slow', slow)
+        actions.add('fast', lambda s: calls.append('fast'))
+        first = actions.submit('slow', {})
+        started.wait()
+        second = actions.submit('fast', {})
+        cancelled = actions.submit('fast', {})
+        self.assertTrue(cancelled.cancel())
+        release.set()
+        first.result()
+        second.result()
+        self.assertEqual(['slow', 'fast'], calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -16,15 +16,19 @@
 from __future__ import absolute_import
 
 import collections
+import copy
+import threading
 
 import numpy as np
 import six
 
 from . import local_volume
-from .equivalence_map import EquivalenceMap
+from .equivalence_map import ArrayEquivalenceMap, EquivalenceMap, PersistentEquivalenceMap
 from .json_utils import encode_json_for_repr
 from .json_wrappers import (JsonObjectWrapper, array_wrapper, optional, text_type, typed_list,
-                            typed_set, wrapped_property)
+                            wrapped_property)
+from .point_list import LocalPointList, PointList
+from .segment_set import SegmentSet
 
 __all__ = []
 
@@ -78,6 +82,22 @@ class Layer(JsonObjectWrapper):
     type = wrapped_property('type', optional(text_type))
 
 
+def point_annotation_points(x, _readonly=False):
+    """Wraps the points of a `PointAnnotationLayer`.
+
+    A `LocalPointList` is retained as is, and encoded as a `python://` reference when the state is
+    set on a viewer; such a reference is returned as a string.
+    """
+    if isinstance(x, LocalPointList):
+        return x
+    if isinstance(x, six.string_types):
+        return text_type(x)
+    return PointList(x, _readonly=_readonly)
+
+
+point_annotation_points.supports_readonly = True
+
+
 @export
 class PointAnnotationLayer(Layer):
     __slots__ = ()
@@ -85,7 +105,7 @@ class PointAnnotationLayer(Layer):
     def __init__(self, *args, **kwargs):
         super(PointAnnotationLayer, self).__init__(*args, type='pointAnnotation', **kwargs)
 
-    points = wrapped_property('points', typed_list(array_wrapper(np.float32, 3)))
+    points = wrapped_property('points', point_annotation_points)
 
 
 def volume_source(x):
@@ -109,7 +129,7 @@ class ImageLayer(Layer):
 
 
 def uint64_equivalence_map(obj, _readonly=False):
-    if isinstance(obj, EquivalenceMap):
+    if isinstance(obj, (EquivalenceMap, ArrayEquivalenceMap, PersistentEquivalenceMap)):
         return obj
     if obj is not None:
         obj = [[int(v) for v in group] for group in obj]
@@ -126,7 +146,7 @@ class SegmentationLayer(Layer):
     source = wrapped_property('source', optional(volume_source))
     mesh = wrapped_property('mesh', optional(text_type))
     skeleton = wrapped_property('skeleton', optional(text_type))
-    segments = wrapped_property('segments', typed_set(np.uint64))
+    segments = wrapped_property('segments', SegmentSet)
     equivalences = wrapped_property('equivalences', uint64_equivalence_map)
     hide_segment_zero = hideSegmentZero = wrapped_property('hideSegmentZero', optional(bool, True))
     selected_alpha = selectedAlpha = wrapped_property('selectedAlpha', optional(float, 0.5))
@@ -205,6 +225,13 @@ class ManagedLayer(JsonObjectWrapper):
         return u'ManagedLayer(%s,%s)' % (encode_json_for_repr(self.name),
                                          encode_json_for_repr(self.to_json()))
 
+    def __deepcopy__(self, memo):
+        kwargs = dict()
+        visible = self.visible
+        if visible is not None:
+            kwargs['visible'] = visible
+        return ManagedLayer(self.name, copy.deepcopy(self.layer, memo), **kwargs)
+
     def to_json(self):
         r = self.layer.to_json()
         visible = self.visible
@@ -215,7 +242,12 @@ class ManagedLayer(JsonObjectWrapper):
 
 @export
 class Layers(object):
-    __slots__ = ('_layers', '_readonly')
+    """List of named layers.
+
+    Layers specified as JSON are stored as `(name, json_data)` pairs, and the corresponding
+    `ManagedLayer` wrapper is only constructed when the layer is first accessed.
+    """
+    __slots__ = ('_layers', '_readonly', '_lock')
     supports_readonly = True
 
     def __init__(self, json_data, _readonly=False):
@@ -223,20 +255,41 @@ class Layers(object):
             json_data = collections.OrderedDict()
         self._layers = []
         self._readonly = _readonly
+        self._lock = threading.Lock()
         for k, v in six.iteritems(json_data):
-            self._layers.append(ManagedLayer(k, v, _readonly=_readonly))
+            if isinstance(v, dict):
+                if v.get('type') not in layer_types:
+                    raise ValueError
+                self._layers.append((k, v))
+            else:
+                self._layers.append(ManagedLayer(k, v, _readonly=_readonly))
+
+    def _get_layer(self, i):
+        layer = self._layers[i]
+        if isinstance(layer, tuple):
+            # A readonly state may be shared between threads, so the wrapper is constructed under
+            # `_lock` to ensure that all threads see the same `ManagedLayer`.
+            with self._lock:
+                layer = self._layers[i]
+                if isinstance(layer, tuple):
+                    layer = ManagedLayer(layer[0], layer[1], _readonly=self._readonly)
+                    self._layers[i] = layer
+        return layer
 
     def index(self, k):
         for i, u in enumerate(self._layers):
-            if u.name == k:
+            name = u[0] if isinstance(u, tuple) else u.name
+            if name == k:
                 return i
         return -1
 
     def __getitem__(self, k):
         """Indexes into the list of layers by index, slice, or layer name."""
         if isinstance(k, six.string_types):
-            return self._layers[self.index(k)]
-        return self._layers[k]
+            return self._get_layer(self.index(k))
+        if isinstance(k, slice):
+            return [self._get_layer(i) for i in range(*k.indices(len(self._layers)))]
+        return self._get_layer(k)
 
     def __setitem__(self, k, v):
         if self._readonly:
@@ -295,16 +348,25 @@ class Layers(object):
         return len(self._layers)
 
     def __iter__(self):
-        return iter(self._layers)
+        for i in range(len(self._layers)):
+            yield self._get_layer(i)
 
     def to_json(self):
         r = collections.OrderedDict()
         for x in self._layers:
-            r[x.name] = x.to_json()
+            if isinstance(x, tuple):
+                r[x[0]] = x[1].copy()
+            else:
+                r[x.name] = x.to_json()
         return r
 
+    def __deepcopy__(self, memo):
+        result = Layers(None)
+        result._layers = [copy.deepcopy(x, memo) for x in self._layers]
+        return result
+
     def __repr__(self):
-        return repr(self._layers)
+        return repr(list(self))
 
 
 def layout_specification(x, _readonly=False):
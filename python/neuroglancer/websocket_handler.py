@@ -0,0 +1,64 @@
+# @license
+# Copyright 2017 Google Inc.
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""WebSocket transport for the viewer state protocol.
+
+Messages are JSON, sent as binary frames containing UTF-8 text, which avoids the UTF-8 validation
+of text frames.  Messages are compressed with the permessage-deflate extension if the client
+supports it.
+"""
+
+from __future__ import absolute_import
+
+import tornado.websocket
+
+from .sockjs_handler import ViewerConnection
+
+WEBSOCKET_PATH_REGEX = r'^/websocket/(?P<viewer_token>[^/]+)$'
+
+
+class WebSocketHandler(tornado.websocket.WebSocketHandler):
+    def initialize(self, server):
+        self.server = server
+        self.connection = None
+
+    def get_compression_options(self):
+        # Enables permessage-deflate with the default options.
+        return {}
+
+    def open(self, viewer_token):
+        viewer = self.server.viewers.get(viewer_token)
+        if viewer is None:
+            self.close()
+            return
+        self.connection = ViewerConnection(viewer, self.server.ioloop, self._send_message,
+                                           action_sessions=self.server.action_sessions)
+
+    def _send_message(self, message):
+        if self.connection is None or not self.connection.is_open:
+            return
+        try:
+            self.write_message(message.encode('utf-8'), binary=True)
+        except tornado.websocket.WebSocketClosedError:
+            pass
+
+    def on_message(self, message):
+        if self.connection is None:
+            return
+        if isinstance(message, bytes):
+            message = message.decode('utf-8')
+        self.connection.on_message(message)
+
+    def on_close(self):
+        if self.connection is not None:
+            self.connection.close()
@@ -118,6 +118,7 @@ setup(
     ],
     extras_require={
         ":python_version<'3.2'": ['futures'],
+        'brotli': ['brotli'],
     },
     ext_modules=[
         Extension(
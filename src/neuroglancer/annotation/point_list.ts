@@ -55,6 +55,17 @@ export class AnnotationPointList {
     this.changed.dispatch();
   }
 
+  /**
+   * Replaces the points with those in `data`, which contains `[x, y, z]` triples.
+   */
+  setPoints(data: Float32Array) {
+    const {points} = this;
+    points.resize(data.length - data.length % 3);
+    points.data.set(data.subarray(0, points.length));
+    ++this.generation;
+    this.changed.dispatch();
+  }
+
   restoreState(obj: any) {
     try {
       if (Array.isArray(obj)) {
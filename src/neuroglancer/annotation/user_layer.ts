@@ -18,22 +18,46 @@ import {AnnotationPointListLayer, PerspectiveViewAnnotationPointListLayer, Slice
 import {AnnotationPointList} from 'neuroglancer/annotation/point_list';
 import {UserLayer, UserLayerDropdown} from 'neuroglancer/layer';
 import {LayerListSpecification, registerLayerType} from 'neuroglancer/layer_specification';
+import {StatusMessage} from 'neuroglancer/status';
 import {WatchableValue} from 'neuroglancer/trackable_value';
 import {vec3} from 'neuroglancer/util/geom';
+import {openHttpRequest, sendHttpRequest} from 'neuroglancer/util/http_request';
 import {PointListWidget} from 'neuroglancer/widget/point_list_widget';
 
 require('./user_layer.css');
 
 const LAYER_TYPE = 'pointAnnotation';
 
+const PYTHON_POINTS_URL_PREFIX = 'python://';
+
 export class AnnotationPointListUserLayer extends UserLayer {
   selectedIndex = new WatchableValue<number|null>(null);
   layer = new AnnotationPointListLayer(
       this.manager.chunkManager, new AnnotationPointList(), this.manager.voxelSize,
       this.selectedIndex);
+
+  /**
+   * Reference to points served by the Python server, which is retained in the state until the
+   * points are modified.
+   */
+  pointsUrl: string|undefined;
+  private pointsUrlGeneration = -1;
+
+  /**
+   * True while the points referenced by `pointsUrl` are being retrieved.  The reference is retained
+   * in the state even if points are added in the meantime, since they would otherwise replace the
+   * points that have not yet been retrieved.  Once retrieved, the added points are appended.
+   */
+  private pointsLoading = false;
+
   constructor(public manager: LayerListSpecification, x: any) {
     super([]);
-    this.layer.pointList.restoreState(x['points']);
+    const points = x['points'];
+    if (typeof points === 'string') {
+      this.loadPoints(points);
+    } else {
+      this.layer.pointList.restoreState(points);
+    }
     this.registerDisposer(this.layer.pointList.changed.add(() => {
       this.specificationChanged.dispatch();
     }));
@@ -45,9 +69,64 @@ export class AnnotationPointListUserLayer extends UserLayer {
       this.selectedIndex.value = typeof value === 'number' ? value : null;
     }));
   }
+
+  private loadPoints(url: string) {
+    if (!url.startsWith(PYTHON_POINTS_URL_PREFIX)) {
+      throw new Error(`Unsupported points URL: ${JSON.stringify(url)}`);
+    }
+    const {pointList} = this.layer;
+    this.pointsUrl = url;
+    this.pointsUrlGeneration = pointList.generation;
+    this.pointsLoading = true;
+    const key = url.substring(PYTHON_POINTS_URL_PREFIX.length);
+    const request = sendHttpRequest(openHttpRequest(`/neuroglancer/points/${key}`), 'arraybuffer');
+    StatusMessage
+        .forPromise(request, {
+          initialMessage: `Retrieving points ${url}.`,
+          delay: true,
+          errorPrefix: `Error retrieving points ${url}: `,
+        })
+        .then(
+            response => {
+              if (this.wasDisposed || this.pointsUrl !== url) {
+                return;
+              }
+              this.pointsLoading = false;
+              let points = new Float32Array(response);
+              if (pointList.generation !== this.pointsUrlGeneration) {
+                // Points were added while loading, so the state can no longer refer to `url`.
+                const added = pointList.points.view;
+                const merged = new Float32Array(points.length + added.length);
+                merged.set(points);
+                merged.set(added, points.length);
+                points = merged;
+                this.pointsUrlGeneration = -1;
+              } else {
+                // `setPoints` increments the generation and then dispatches the change
+                // notification, at which point the state must still refer to `url`.
+                this.pointsUrlGeneration = pointList.generation + 1;
+              }
+              pointList.setPoints(points);
+            },
+            () => {
+              // The error is reported by the status message.  The reference is retained in the
+              // state unless points were added.
+              if (!this.wasDisposed && this.pointsUrl === url) {
+                this.pointsLoading = false;
+                this.specificationChanged.dispatch();
+              }
+            });
+  }
+
   toJSON() {
     let x: any = {'type': LAYER_TYPE};
-    x['points'] = this.layer.pointList.toJSON();
+    const {pointList} = this.layer;
+    if (this.pointsUrl !== undefined &&
+        (this.pointsLoading || pointList.generation === this.pointsUrlGeneration)) {
+      x['points'] = this.pointsUrl;
+    } else {
+      x['points'] = pointList.toJSON();
+    }
     return x;
   }
 
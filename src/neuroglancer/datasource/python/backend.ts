@@ -24,10 +24,10 @@ import {decodeJpegChunk} from 'neuroglancer/sliceview/backend_chunk_decoders/jpe
 import {decodeNdstoreNpzChunk} from 'neuroglancer/sliceview/backend_chunk_decoders/ndstoreNpz';
 import {decodeRawChunk} from 'neuroglancer/sliceview/backend_chunk_decoders/raw';
 import {VolumeChunk, VolumeChunkSource} from 'neuroglancer/sliceview/volume/backend';
-import {CancellationToken} from 'neuroglancer/util/cancellation';
+import {CANCELED, CancellationToken, CancellationTokenSource} from 'neuroglancer/util/cancellation';
 import {DATA_TYPE_BYTES} from 'neuroglancer/util/data_type';
 import {convertEndian16, convertEndian32, Endianness} from 'neuroglancer/util/endian';
-import {openHttpRequest, sendHttpRequest} from 'neuroglancer/util/http_request';
+import {HttpError, openHttpRequest, sendHttpJsonPostRequest, sendHttpRequest} from 'neuroglancer/util/http_request';
 import {registerSharedObject} from 'neuroglancer/worker_rpc';
 
 let chunkDecoders = new Map<VolumeChunkEncoding, ChunkDecoder>();
@@ -35,26 +35,154 @@ chunkDecoders.set(VolumeChunkEncoding.NPZ, decodeNdstoreNpzChunk);
 chunkDecoders.set(VolumeChunkEncoding.JPEG, decodeJpegChunk);
 chunkDecoders.set(VolumeChunkEncoding.RAW, decodeRawChunk);
 
+/**
+ * Maximum number of chunks requested in a single batch request.  Since the response is only
+ * decoded once it is complete, smaller batches allow chunks to be displayed sooner.
+ */
+const MAX_CHUNKS_PER_BATCH = 32;
+
+/**
+ * Byte length of the `[index, status, length]` header of each record in a batch response.
+ */
+const BATCH_RECORD_HEADER_BYTES = 12;
+
+interface PendingChunkRequest {
+  // [startX, endX, startY, endY, startZ, endZ]
+  bounds: number[];
+  cancellationToken: CancellationToken;
+  resolve: (response: ArrayBuffer) => void;
+  reject: (error: any) => void;
+}
+
 @registerSharedObject() export class PythonVolumeChunkSource extends
 (WithParameters(VolumeChunkSource, VolumeChunkSourceParameters)) {
   chunkDecoder = chunkDecoders.get(this.parameters['encoding'])!;
   encoding = VolumeChunkEncoding[this.parameters.encoding].toLowerCase();
+  private pendingRequests: PendingChunkRequest[] = [];
+  private flushScheduled = false;
 
   download(chunk: VolumeChunk, cancellationToken: CancellationToken) {
-    let {parameters} = this;
-    let path = `/neuroglancer/${this.encoding}/${parameters.key}/${parameters.scaleKey}`;
+    let bounds: number[] = [];
     {
       // chunkPosition must not be captured, since it will be invalidated by the next call to
       // computeChunkBounds.
       let chunkPosition = this.computeChunkBounds(chunk);
       let {chunkDataSize} = chunk;
       for (let i = 0; i < 3; ++i) {
-        path += `/${chunkPosition[i]},${chunkPosition[i] + chunkDataSize![i]}`;
+        bounds.push(chunkPosition[i], chunkPosition[i] + chunkDataSize![i]);
       }
     }
-    return sendHttpRequest(openHttpRequest(path), 'arraybuffer', cancellationToken)
+    return new Promise<ArrayBuffer>((resolve, reject) => {
+             const request = {bounds, cancellationToken, resolve, reject};
+             if (!this.parameters.batchRequests) {
+               this.sendSingleRequest(request);
+               return;
+             }
+             // Requests made by the chunk queue manager within the same task are combined into
+             // batches.
+             this.pendingRequests.push(request);
+             if (!this.flushScheduled) {
+               this.flushScheduled = true;
+               setTimeout(() => this.flushRequests(), 0);
+             }
+           })
         .then(response => this.chunkDecoder(chunk, response));
   }
+
+  private flushRequests() {
+    this.flushScheduled = false;
+    const requests = this.pendingRequests.filter(request => {
+      if (request.cancellationToken.isCanceled) {
+        request.reject(CANCELED);
+        return false;
+      }
+      return true;
+    });
+    this.pendingRequests = [];
+    const numBatches = Math.ceil(requests.length / MAX_CHUNKS_PER_BATCH);
+    for (let i = 0; i < numBatches; ++i) {
+      // Distribute the requests evenly among the batches.
+      const begin = Math.floor(i * requests.length / numBatches);
+      const end = Math.floor((i + 1) * requests.length / numBatches);
+      const batch = requests.slice(begin, end);
+      if (batch.length === 1) {
+        this.sendSingleRequest(batch[0]);
+      } else {
+        this.sendBatchRequest(batch);
+      }
+    }
+  }
+
+  private sendSingleRequest(request: PendingChunkRequest) {
+    let {parameters} = this;
+    let path = `/neuroglancer/${this.encoding}/${parameters.key}/${parameters.scaleKey}`;
+    const {bounds} = request;
+    for (let i = 0; i < 3; ++i) {
+      path += `/${bounds[2 * i]},${bounds[2 * i + 1]}`;
+    }
+    sendHttpRequest(openHttpRequest(path), 'arraybuffer', request.cancellationToken)
+        .then(request.resolve, request.reject);
+  }
+
+  private sendBatchRequest(requests: PendingChunkRequest[]) {
+    const {parameters} = this;
+    const path = `/neuroglancer/batch/${this.encoding}/${parameters.key}/${parameters.scaleKey}`;
+    const xhr = openHttpRequest(path, 'POST');
+
+    // The batch request is aborted once all of the individual requests are canceled.
+    const batchCancellationToken = new CancellationTokenSource();
+    let numRemaining = requests.length;
+    const unregisterHandlers = requests.map(request => request.cancellationToken.add(() => {
+      request.reject(CANCELED);
+      if (--numRemaining === 0) {
+        batchCancellationToken.cancel();
+      }
+    }));
+    const unregisterAll = () => {
+      for (const unregister of unregisterHandlers) {
+        unregister();
+      }
+    };
+
+    sendHttpJsonPostRequest(
+        xhr, requests.map(request => request.bounds), 'arraybuffer', batchCancellationToken)
+        .then(
+            response => {
+              unregisterAll();
+              const dv = new DataView(response);
+              const received = new Array<boolean>(requests.length);
+              let offset = 0;
+              while (offset + BATCH_RECORD_HEADER_BYTES <= response.byteLength) {
+                const index = dv.getUint32(offset, true);
+                const status = dv.getUint32(offset + 4, true);
+                const length = dv.getUint32(offset + 8, true);
+                offset += BATCH_RECORD_HEADER_BYTES;
+                const request = requests[index];
+                if (request !== undefined) {
+                  received[index] = true;
+                  if (status === 200) {
+                    request.resolve(response.slice(offset, offset + length));
+                  } else {
+                    request.reject(new HttpError(
+                        'POST', path, status,
+                        String.fromCharCode(...new Uint8Array(response, offset, length))));
+                  }
+                }
+                offset += length;
+              }
+              requests.forEach((request, index) => {
+                if (!received[index]) {
+                  request.reject(new HttpError('POST', path, 500, 'Incomplete batch response'));
+                }
+              });
+            },
+            error => {
+              unregisterAll();
+              for (const request of requests) {
+                request.reject(error);
+              }
+            });
+  }
 }
 
 export function decodeFragmentChunk(chunk: FragmentChunk, response: ArrayBuffer) {
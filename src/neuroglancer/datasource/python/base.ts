@@ -29,6 +29,10 @@ export class PythonSourceParameters {
 export class VolumeChunkSourceParameters extends PythonSourceParameters {
   scaleKey: string;
   encoding: VolumeChunkEncoding;
+  /**
+   * Whether chunks are requested in batches.  Batched chunks are not cached by the browser.
+   */
+  batchRequests: boolean;
 
   static RPC_ID = 'python/VolumeChunkSource';
 }
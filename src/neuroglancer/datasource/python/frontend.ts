@@ -31,7 +31,7 @@ import {MultiscaleVolumeChunkSource as GenericMultiscaleVolumeChunkSource, Volum
 import {Borrowed, Owned} from 'neuroglancer/util/disposable';
 import {mat4, vec3} from 'neuroglancer/util/geom';
 import {openHttpRequest, sendHttpRequest} from 'neuroglancer/util/http_request';
-import {parseArray, parseFixedLengthArray, verify3dDimensions, verify3dScale, verify3dVec, verifyEnumString, verifyObject, verifyObjectAsMap, verifyObjectProperty, verifyPositiveInt, verifyString} from 'neuroglancer/util/json';
+import {parseArray, parseFixedLengthArray, verify3dDimensions, verify3dScale, verify3dVec, verifyEnumString, verifyObject, verifyObjectAsMap, verifyObjectProperty, verifyOptionalBoolean, verifyPositiveInt, verifyString} from 'neuroglancer/util/json';
 import {getObjectId} from 'neuroglancer/util/object_id';
 
 interface PythonChunkSource extends ChunkSource {
@@ -100,6 +100,7 @@ export class MultiscaleVolumeChunkSource implements GenericMultiscaleVolumeChunk
   encoding: VolumeChunkEncoding;
   scales: ScaleInfo[][];
   generation: number;
+  batchRequests: boolean;
 
   // TODO(jbms): Properly handle reference counting of `dataSource`.
   constructor(public dataSource: Borrowed<PythonDataSource>, public chunkManager: ChunkManager, public key: string, public response: any) {
@@ -111,6 +112,8 @@ export class MultiscaleVolumeChunkSource implements GenericMultiscaleVolumeChunk
     this.encoding =
       verifyObjectProperty(response, 'encoding', x => verifyEnumString(x, VolumeChunkEncoding));
     this.generation = verifyObjectProperty(response, 'generation', x => x);
+    this.batchRequests =
+        verifyObjectProperty(response, 'batchRequests', verifyOptionalBoolean) || false;
     let maxVoxelsPerChunkLog2 = verifyObjectProperty(
         response, 'maxVoxelsPerChunkLog2',
         x => x === undefined ? DEFAULT_MAX_VOXELS_PER_CHUNK_LOG2 : verifyPositiveInt(x));
@@ -175,7 +178,7 @@ export class MultiscaleVolumeChunkSource implements GenericMultiscaleVolumeChunk
   }
 
   getSources(volumeSourceOptions: VolumeSourceOptions) {
-    let {numChannels, dataType, volumeType, encoding} = this;
+    let {numChannels, dataType, volumeType, encoding, batchRequests} = this;
     // Clip based on the bounds of the first scale.
     const baseScale = this.scales[0][0];
     let upperClipBound = vec3.multiply(vec3.create(), baseScale.voxelSize, baseScale.sizeInVoxels);
@@ -195,7 +198,7 @@ export class MultiscaleVolumeChunkSource implements GenericMultiscaleVolumeChunk
         spec,
         dataSource: this.dataSource,
         generation: this.generation,
-        parameters: {key: this.key, scaleKey: scaleInfo.key, encoding: encoding}
+        parameters: {key: this.key, scaleKey: scaleInfo.key, encoding, batchRequests}
       });
     }));
   }
@@ -16,16 +16,81 @@
 
 import {AtomicStateClient} from 'neuroglancer/python_integration/atomic_state_client';
 import {RefCounted} from 'neuroglancer/util/disposable';
+import {getRandomHexString} from 'neuroglancer/util/random';
 import {Trackable} from 'neuroglancer/util/trackable';
 import SockJS from 'sockjs-client';
 import {StatusMessage} from 'neuroglancer/status';
 
-function getServerConnectionURL() {
+function getViewerToken() {
   const match = window.location.pathname.match(/^\/v\/([^\/]+)/);
   if (match === null) {
     throw new Error('Failed to determine token from URL.');
   }
-  return `${window.location.origin}/socket/${match[1]}`;
+  return match[1];
+}
+
+function getServerConnectionURL() {
+  return `${window.location.origin}/socket/${getViewerToken()}`;
+}
+
+function getWebSocketURL() {
+  const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+  return `${protocol}//${window.location.host}/websocket/${getViewerToken()}`;
+}
+
+/**
+ * Common interface of the WebSocket and SockJS transports.
+ */
+interface Socket {
+  send(message: string): void;
+  close(): void;
+}
+
+const textEncoder = new TextEncoder();
+const textDecoder = new TextDecoder();
+
+/**
+ * Connects using a WebSocket, over which messages are sent as binary frames containing UTF-8 JSON.
+ */
+function openWebSocket(
+    url: string, onopen: () => void, onclose: (opened: boolean) => void,
+    onmessage: (message: string) => void): Socket {
+  const socket = new WebSocket(url);
+  socket.binaryType = 'arraybuffer';
+  let opened = false;
+  socket.onopen = () => {
+    opened = true;
+    onopen();
+  };
+  socket.onclose = () => {
+    onclose(opened);
+  };
+  socket.onmessage = e => {
+    const {data} = e;
+    onmessage(typeof data === 'string' ? data : textDecoder.decode(new Uint8Array(data)));
+  };
+  return {
+    send: (message: string) => socket.send(textEncoder.encode(message)),
+    close: () => socket.close(),
+  };
+}
+
+function openSockJS(
+    url: string, onopen: () => void, onclose: (opened: boolean) => void,
+    onmessage: (message: string) => void): Socket {
+  const socket = new SockJS(url, {transports: ['websocket', 'xhr-streaming']});
+  let opened = false;
+  socket.onopen = () => {
+    opened = true;
+    onopen();
+  };
+  socket.onclose = () => {
+    onclose(opened);
+  };
+  socket.onmessage = e => {
+    onmessage(e.data);
+  };
+  return socket;
 }
 
 const defaultReconnectionDelay = 1000;
@@ -33,7 +98,12 @@ const defaultReconnectionDelay = 1000;
 const updateDelayMilliseconds = 100;
 
 export class ServerConnection extends RefCounted {
-  socket: typeof SockJS.prototype|undefined;
+  socket: Socket|undefined;
+  /**
+   * Set to true when a WebSocket connection fails to open, after which SockJS is used instead as
+   * long as SockJS connections succeed.
+   */
+  useSockJS = false;
   reconnectionDelay = defaultReconnectionDelay;
   waitingToReconnect: number = -1;
   isOpen = false;
@@ -45,10 +115,16 @@ export class ServerConnection extends RefCounted {
   private actionQueue: {action: string, state: any}[] = [];
   private nextActionId = 0;
   private lastActionAcknowledged = -1;
+  /**
+   * Identifies the actions sent by this client across reconnections, so that the server does not
+   * invoke again the actions that it received over a previous connection.
+   */
+  private actionSessionId = getRandomHexString();
 
   constructor(
       public sharedState: Trackable|undefined, public privateState: Trackable, public configState: Trackable,
-      public url: string = getServerConnectionURL()) {
+      public url: string = getServerConnectionURL(),
+      public webSocketUrl: string = getWebSocketURL()) {
     super();
     const statesToUpdate = [
       {key: 'p', state: privateState, receiveUpdates: false, sendUpdates: 0},
@@ -97,8 +173,7 @@ export class ServerConnection extends RefCounted {
   private connect() {
     this.status.setText('Connecting to Python server');
     this.status.setVisible(true);
-    const socket = this.socket = new SockJS(this.url, {transports: ['websocket', 'xhr-streaming']});
-    socket.onopen = () => {
+    const onopen = () => {
       this.isOpen = true;
       this.reconnectionDelay = defaultReconnectionDelay;
       this.status.setVisible(false);
@@ -107,57 +182,88 @@ export class ServerConnection extends RefCounted {
       }
       this.flushActionQueue();
     };
-    socket.onclose = () => {
-      this.isOpen = false;
-      const {reconnectionDelay} = this;
-      for (const client of this.updateClients.values()) {
-        client.connected = false;
-      }
-      const reconnectTime = Date.now() + reconnectionDelay;
-      this.status.setVisible(true);
-      const updateStatus = (remaining: number) => {
-        this.status.setText(
-            `Disconnected from Python server.  ` +
-            `Retrying in ${Math.ceil(remaining / 1000)} seconds.`);
-      };
-      this.waitingToReconnect = setInterval(() => {
-        const remaining = reconnectTime - Date.now();
-        if (remaining < 0) {
-          clearInterval(this.waitingToReconnect);
-          this.waitingToReconnect = -1;
+    const onmessage = (message: string) => this.handleMessage(message);
+    if (this.useSockJS) {
+      this.socket = openSockJS(this.url, onopen, opened => {
+        if (!opened) {
+          // The server may be unreachable, rather than only WebSocket connections to it.  Try a
+          // WebSocket connection again when reconnecting.
+          this.useSockJS = false;
+        }
+        this.handleClose();
+      }, onmessage);
+    } else {
+      this.socket = openWebSocket(this.webSocketUrl, onopen, opened => {
+        if (!opened && this.socket !== undefined) {
+          // Fall back to SockJS, e.g. if a proxy does not support WebSocket connections.
+          this.useSockJS = true;
           this.connect();
-        } else {
-          updateStatus(remaining);
+          return;
         }
-      }, 1000);
-      updateStatus(reconnectionDelay);
-      this.reconnectionDelay = Math.min(30 * 1000, reconnectionDelay * 2);
+        this.handleClose();
+      }, onmessage);
+    }
+  }
+
+  private handleClose() {
+    if (this.socket === undefined) {
+      // Disposed.
+      return;
+    }
+    this.isOpen = false;
+    const {reconnectionDelay} = this;
+    for (const client of this.updateClients.values()) {
+      client.connected = false;
+    }
+    const reconnectTime = Date.now() + reconnectionDelay;
+    this.status.setVisible(true);
+    const updateStatus = (remaining: number) => {
+      this.status.setText(
+          `Disconnected from Python server.  ` +
+          `Retrying in ${Math.ceil(remaining / 1000)} seconds.`);
     };
-    socket.onmessage = e => {
-      const x = JSON.parse(e.data);
-      if (typeof x !== 'object' || Array.isArray(x)) {
-        throw new Error('Invalid message received over server connection.');
+    this.waitingToReconnect = setInterval(() => {
+      const remaining = reconnectTime - Date.now();
+      if (remaining < 0) {
+        clearInterval(this.waitingToReconnect);
+        this.waitingToReconnect = -1;
+        this.connect();
+      } else {
+        updateStatus(remaining);
       }
-      switch (x['t']) {
-        case 'setState': {
-          const updateClient = this.updateClients.get(x['k']);
-          if (updateClient === undefined) {
-            throw new Error(`Invalid state key: ${JSON.stringify(x['k'])}`);
-          }
-          updateClient.setState(x['s'], x['g']);
-          break;
+    }, 1000);
+    updateStatus(reconnectionDelay);
+    this.reconnectionDelay = Math.min(30 * 1000, reconnectionDelay * 2);
+  }
+
+  private handleMessage(message: string) {
+    const x = JSON.parse(message);
+    if (typeof x !== 'object' || Array.isArray(x)) {
+      throw new Error('Invalid message received over server connection.');
+    }
+    switch (x['t']) {
+      case 'setState': {
+        const updateClient = this.updateClients.get(x['k']);
+        if (updateClient === undefined) {
+          throw new Error(`Invalid state key: ${JSON.stringify(x['k'])}`);
         }
-        case 'ackAction': {
-          const lastId = parseInt(x['id'], 10);
-          if (lastId < this.lastActionAcknowledged || lastId >= this.nextActionId) {
-            throw new Error('Invalid action acknowledged message');
-          }
-          this.actionQueue.splice(0, lastId - this.lastActionAcknowledged);
-          this.lastActionAcknowledged = lastId;
+        updateClient.setState(x['s'], x['g']);
+        break;
+      }
+      case 'ackAction': {
+        const lastId = parseInt(x['id'], 10);
+        if (lastId >= this.nextActionId) {
+          throw new Error('Invalid action acknowledged message');
+        }
+        if (lastId <= this.lastActionAcknowledged) {
+          // Actions resent after a reconnection may be acknowledged more than once.
           break;
         }
+        this.actionQueue.splice(0, lastId - this.lastActionAcknowledged);
+        this.lastActionAcknowledged = lastId;
+        break;
       }
-    };
+    }
   }
 
   private flushActionQueue() {
@@ -165,7 +271,9 @@ export class ServerConnection extends RefCounted {
     if (actionQueue.length === 0) {
       return;
     }
-    this.send('action', {id: this.nextActionId - 1, actions: actionQueue});
+    this.send(
+        'action',
+        {id: this.nextActionId - 1, actions: actionQueue, session: this.actionSessionId});
   }
 
   sendActionNotification(action: string, state: any) {
@@ -15,6 +15,7 @@
  */
 
 import debounce from 'lodash/debounce';
+import {inflate} from 'pako';
 import {WatchableValue} from 'neuroglancer/trackable_value';
 import {RefCounted} from 'neuroglancer/util/disposable';
 import {urlSafeParse, urlSafeStringify, verifyObject} from 'neuroglancer/util/json';
@@ -24,6 +25,25 @@ import {getCachedJson, Trackable} from 'neuroglancer/util/trackable';
  * @file Implements a binding between a Trackable value and the URL hash state.
  */
 
+/**
+ * Prefix of a compressed state string: the JSON state compressed with zlib, encoded as unpadded
+ * base64url.  Must match COMPRESSED_FRAGMENT_PREFIX in python/neuroglancer/url_state.py.
+ */
+const COMPRESSED_STATE_PREFIX = 'z1.';
+
+function parseStateString(s: string) {
+  if (!s.startsWith(COMPRESSED_STATE_PREFIX)) {
+    return urlSafeParse(s);
+  }
+  const binary =
+      atob(s.substring(COMPRESSED_STATE_PREFIX.length).replace(/-/g, '+').replace(/_/g, '/'));
+  const compressed = new Uint8Array(binary.length);
+  for (let i = 0; i < binary.length; ++i) {
+    compressed[i] = binary.charCodeAt(i);
+  }
+  return JSON.parse(inflate(compressed, {to: 'string'}));
+}
+
 /**
  * An instance of this class manages a binding between a Trackable value and the URL hash state.
  * The binding is initialized in the constructor, and is removed when dispose is called.
@@ -86,7 +106,7 @@ export class UrlHashBinding extends RefCounted {
         s = s.slice(3);
         // Firefox always %-encodes the URL even if it is not typed that way.
         s = decodeURI(s);
-        let state = urlSafeParse(s);
+        let state = parseStateString(s);
         verifyObject(state);
         this.root.restoreState(state);
         this.prevStateString = undefined;
@@ -98,7 +118,7 @@ export class UrlHashBinding extends RefCounted {
         }
         this.prevStateString = s;
         this.root.reset();
-        let state = urlSafeParse(s);
+        let state = parseStateString(s);
         verifyObject(state);
         this.root.restoreState(state);
       } else {